@@ -4,6 +4,7 @@ Miivvy Backend - Main Flask Application with Firebase
 from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
+import logging
 import os
 
 # Load environment variables
@@ -13,6 +14,14 @@ def create_app():
     """Application factory pattern for Flask app"""
     app = Flask(__name__)
 
+    # Structured JSON logs through a background writer, with correlation IDs
+    from middleware.structured_logging import init_logging
+    init_logging(app)
+
+    # orjson-backed JSON encoding (falls back to the stdlib encoder)
+    from services.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
@@ -20,25 +29,52 @@ def create_app():
     # Enable CORS
     CORS(app, resources={r"/*": {"origins": "*"}})
 
+    # gzip/brotli response compression
+    from middleware.compression import init_compression
+    init_compression(app)
+
+    # Firestore operation accounting per route and user
+    from services.cost_accounting import init_cost_accounting
+    init_cost_accounting(app)
+
+    # Per-request profiling (only when PROFILING_ENABLED=1)
+    from middleware.profiling import init_profiling
+    init_profiling(app)
+
     # Initialize Firebase
     from firebase.config import initialize_firebase
     try:
         initialize_firebase()
     except Exception as e:
-        print(f"⚠️  Warning: Firebase initialization failed: {e}")
-        print("    The app will start but Firebase features won't work.")
-        print("    Please configure Firebase credentials to use full functionality.")
+        logging.getLogger(__name__).warning(
+            'Firebase initialization failed; the app will start but Firebase features '
+            "won't work until credentials are configured: %s", e
+        )
 
     # Register blueprints
     from routes.webhook import webhook_bp
     from routes.analyze import analyze_bp
     from routes.logs import logs_bp
     from routes.shortcuts import shortcuts_bp
+    from routes.metrics import metrics_bp
+    from routes.stream import stream_bp
+    from routes.detections import detections_bp
+    from routes.settings import settings_bp
+    from routes.sessions import sessions_bp
+    from routes.timeline import timeline_bp
+    from routes.feed import feed_bp
 
     app.register_blueprint(webhook_bp, url_prefix='/api')
     app.register_blueprint(analyze_bp, url_prefix='/api')
     app.register_blueprint(logs_bp, url_prefix='/api')
     app.register_blueprint(shortcuts_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    app.register_blueprint(stream_bp, url_prefix='/api')
+    app.register_blueprint(detections_bp, url_prefix='/api')
+    app.register_blueprint(settings_bp, url_prefix='/api')
+    app.register_blueprint(sessions_bp, url_prefix='/api')
+    app.register_blueprint(timeline_bp, url_prefix='/api')
+    app.register_blueprint(feed_bp, url_prefix='/api')
 
     # Health check endpoint
     @app.route('/')
@@ -50,6 +86,17 @@ def create_app():
             'features': ['firebase', 'firestore', 'openai']
         }
 
+    # Readiness: 503 until the instance has warmed up (see services.warmup)
+    from services.warmup import warmup, WARMUP_ON_STARTUP
+
+    @app.route('/ready')
+    def readiness_check():
+        warmup.start()
+        return warmup.status(), 200 if warmup.ready else 503
+
+    if WARMUP_ON_STARTUP:
+        warmup.start()
+
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,249 @@
+"""
+Benchmark harness for the API hot paths
+
+Runs entirely in-process against create_app() with stubbed Firebase
+(see benchmarks.stubs), measuring throughput and p50/p95/p99 latency for
+every route at several concurrency levels. Results are written as JSON
+so runs from different commits can be diffed with benchmarks.compare.
+
+Usage (from backend/):
+    uv run python -m benchmarks.bench_api --requests 500 --concurrency 1,4,8 \\
+        --output bench-results.json
+    uv run python -m benchmarks.bench_api --storage sqlite --scenarios webhook,logs
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.stats import summarize
+
+BENCH_USER = 'bench-user'
+AUTH_HEADERS = {'Authorization': f'Bearer {BENCH_USER}'}
+BATCH_SIZE = 20
+_BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# (method, path, request kwargs)
+RequestSpec = Tuple[str, str, dict]
+
+
+def _event(i: int) -> dict:
+    return {
+        'user_id': BENCH_USER,
+        'app_name': ('line', 'instagram', 'x')[i % 3],
+        'event_type': ('opened', 'closed')[i % 2],
+        'timestamp': (_BASE_TIME + timedelta(seconds=i)).isoformat(),
+    }
+
+
+def _webhook(i: int) -> RequestSpec:
+    # Offset far past the seeded events so every request is a new event
+    return 'POST', '/api/webhook', {'json': _event(10_000_000 + i)}
+
+
+def _webhook_batch(i: int) -> RequestSpec:
+    first = 20_000_000 + i * BATCH_SIZE
+    return 'POST', '/api/webhook/batch', {
+        'json': {'events': [_event(first + n) for n in range(BATCH_SIZE)]}
+    }
+
+
+def _logs(i: int) -> RequestSpec:
+    return 'GET', '/api/logs?limit=100', {'headers': AUTH_HEADERS}
+
+
+def _analyze(i: int) -> RequestSpec:
+    return 'POST', '/api/analyze', {'json': {}, 'headers': AUTH_HEADERS}
+
+
+def _shortcuts_generate(i: int) -> RequestSpec:
+    return 'POST', '/api/shortcuts/generate', {'json': {
+        'app_id': 'line',
+        'user_id': BENCH_USER,
+        'webhook_url': 'https://example.invalid/api/webhook',
+    }}
+
+
+def _shortcuts_base64(i: int) -> RequestSpec:
+    return 'GET', f'/api/shortcuts/base64/line/{BENCH_USER}', {}
+
+
+def _shortcuts_download(i: int) -> RequestSpec:
+    return 'GET', f'/api/shortcuts/download/line/{BENCH_USER}', {}
+
+
+def _shortcuts_info(i: int) -> RequestSpec:
+    return 'GET', '/api/shortcuts/info/line', {}
+
+
+def _shortcuts_url(i: int) -> RequestSpec:
+    return 'GET', f'/api/shortcuts/url/line/{BENCH_USER}', {}
+
+
+SCENARIOS: Dict[str, Callable[[int], RequestSpec]] = {
+    'webhook': _webhook,
+    'webhook_batch': _webhook_batch,
+    'logs': _logs,
+    'analyze': _analyze,
+    'shortcuts_generate': _shortcuts_generate,
+    'shortcuts_base64': _shortcuts_base64,
+    'shortcuts_download': _shortcuts_download,
+    'shortcuts_info': _shortcuts_info,
+    'shortcuts_url': _shortcuts_url,
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def prepare_environment(storage: str) -> None:
+    """Configure env vars and install the Firebase stubs before the app is imported"""
+    from benchmarks import stubs
+
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    os.environ['STORAGE_BACKEND'] = 'sqlite' if storage == 'sqlite' else 'firestore'
+    if storage == 'sqlite':
+        os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(prefix='miivvy-bench-'), 'bench.db'))
+    stubs.install()
+
+
+class Harness:
+    """Owns the app under test and resets its state between runs"""
+
+    def __init__(self, storage: str, seed_logs: int):
+        prepare_environment(storage)
+        from app import create_app
+        from database.storage import get_storage
+
+        self.storage_name = storage
+        self.seed_logs = seed_logs
+        self.app = create_app()
+        self.storage = get_storage()
+
+    def reset(self) -> None:
+        """Drop all bench data and reseed the user's log history"""
+        from benchmarks import stubs
+        from routes.analyze import analysis_flight
+        from services.idempotency import recent_events
+
+        if self.storage_name == 'sqlite':
+            self.storage.delete_user_data(BENCH_USER)
+        else:
+            stubs.firestore_client.reset()
+        recent_events._cache.clear()
+        analysis_flight.clear()
+
+        entries = [(None, _event(i)) for i in range(self.seed_logs)]
+        for start in range(0, len(entries), 500):
+            self.storage.save_logs(entries[start:start + 500])
+
+    def run(self, build: Callable[[int], RequestSpec], requests: int, concurrency: int,
+            warmup: int) -> Dict[str, object]:
+        """Issue requests with the given concurrency and summarize the results"""
+        local = threading.local()
+        counter = itertools.count()
+        latencies: List[float] = []
+        errors = 0
+        lock = threading.Lock()
+
+        def one(_):
+            nonlocal errors
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = self.app.test_client()
+            method, path, kwargs = build(next(counter))
+            started = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors += 1
+
+        for _ in range(warmup):
+            one(None)
+        latencies.clear()
+        errors = 0
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - started
+
+        return summarize(latencies, wall, errors)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark Miivvy API hot paths in-process')
+    parser.add_argument('--requests', type=int, default=300, help='requests per scenario and concurrency level')
+    parser.add_argument('--concurrency', default='1,4,8', help='comma-separated concurrency levels')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenario names')
+    parser.add_argument('--storage', choices=['memory', 'sqlite'], default='memory',
+                        help='stubbed in-memory Firestore or the SQLite backend')
+    parser.add_argument('--seed-logs', type=int, default=1000, help='log events seeded before each run')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests before each run')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    harness = Harness(args.storage, args.seed_logs)
+    results = []
+    for name in scenarios:
+        for concurrency in levels:
+            harness.reset()
+            summary = harness.run(SCENARIOS[name], args.requests, concurrency, args.warmup)
+            summary.update({'scenario': name, 'concurrency': concurrency})
+            results.append(summary)
+            latency = summary['latency_ms']
+            print(
+                f"{name:<20} c={concurrency:<3} {summary['throughput_rps']:>9.1f} req/s  "
+                f"p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms  "
+                f"errors={summary['errors']}",
+                file=sys.stderr,
+            )
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'storage': args.storage,
+            'requests': args.requests,
+            'seed_logs': args.seed_logs,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Sustained ingest load test for the two log layouts
+
+Drives POST /api/webhook in-process (stubbed Firebase, see
+benchmarks.stubs) at a fixed offered rate for many users, once per
+LOGS_LAYOUT, and reports achieved throughput, latency and the write rate
+each sequential index range receives.
+
+The stub doesn't throttle, so the number to watch is the peak writes/s
+into a single index range: Firestore sustains roughly 500 writes/s into
+one range of monotonically increasing values (the `timestamp` index of a
+collection). In the flat layout every event lands in the same range; in
+the user layout each user has their own.
+
+Usage (from backend/):
+    uv run python -m benchmarks.bench_ingest --rate 2000 --seconds 10 --users 500
+    uv run python -m benchmarks.bench_ingest --layouts user --concurrency 32 --output ingest.json
+"""
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from benchmarks.bench_api import _git_commit, prepare_environment
+from benchmarks.stats import summarize
+
+# Sustained writes/s Firestore handles into one sequential index range
+RANGE_CEILING = 500
+
+APPS = ('line', 'instagram', 'x', 'facebook', 'tiktok', 'discord')
+
+
+def hot_ranges(docs: Dict[str, Dict], ceiling: int) -> Dict[str, object]:
+    """Per-second write counts of every logs collection, from created_at"""
+    per_second: Counter = Counter()
+    ranges = set()
+    for path, data in docs.items():
+        parent, _, _ = path.rpartition('/')
+        if parent.rsplit('/', 1)[-1] != 'logs':
+            continue
+        ranges.add(parent)
+        per_second[(parent, int(data['created_at'].timestamp()))] += 1
+    peak = max(per_second.values(), default=0)
+    return {
+        'index_ranges': len(ranges),
+        'peak_range_writes_per_second': peak,
+        'seconds_over_ceiling': sum(1 for count in per_second.values() if count > ceiling),
+    }
+
+
+def run_layout(app, storage, layout: str, users: int, rate: float, seconds: float,
+               concurrency: int, ceiling: int) -> Dict[str, object]:
+    """Offer rate events/s for seconds with one layout and summarize"""
+    from benchmarks import stubs
+    from services.idempotency import recent_events
+
+    stubs.firestore_client.reset()
+    recent_events._cache.clear()
+    backend = getattr(storage, 'backend', storage)  # Unwrap CoalescingStorage
+    backend.logs_layout = layout
+    backend.read_legacy_logs = False
+
+    total = int(rate * seconds)
+    base = datetime.now(timezone.utc)
+    counter = itertools.count()
+    local = threading.local()
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def one(_):
+        nonlocal errors
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        i = next(counter)
+        # Pace to the offered rate instead of running flat out
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        event = {
+            'user_id': f'load-user-{i % users}',
+            'app_name': APPS[i % len(APPS)],
+            'event_type': ('opened', 'closed')[(i // users) % 2],
+            'timestamp': (base + timedelta(microseconds=i)).isoformat(),
+        }
+        sent = time.perf_counter()
+        response = client.post('/api/webhook', json=event)
+        elapsed = time.perf_counter() - sent
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    summary = summarize(latencies, wall, errors)
+    with stubs.firestore_client._lock:
+        docs = dict(stubs.firestore_client._docs)
+    summary.update(hot_ranges(docs, ceiling))
+    summary.update({'layout': layout, 'offered_rps': rate, 'users': users})
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Sustained ingest load test per log layout')
+    parser.add_argument('--layouts', default='flat,user', help='comma-separated: flat,user')
+    parser.add_argument('--rate', type=float, default=1500, help='offered events per second')
+    parser.add_argument('--seconds', type=float, default=5, help='duration per layout')
+    parser.add_argument('--users', type=int, default=300, help='distinct users sending events')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--ceiling', type=int, default=RANGE_CEILING,
+                        help='sustained writes/s per sequential index range')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    layouts = [layout.strip() for layout in args.layouts.split(',') if layout.strip()]
+    unknown = [layout for layout in layouts if layout not in ('flat', 'user')]
+    if unknown:
+        parser.error(f"unknown layouts: {', '.join(unknown)}")
+
+    prepare_environment('memory')
+    from app import create_app
+    from database.storage import get_storage
+
+    app = create_app()
+    storage = get_storage()
+    results = []
+    for layout in layouts:
+        summary = run_layout(
+            app, storage, layout, args.users, args.rate, args.seconds, args.concurrency, args.ceiling
+        )
+        results.append(summary)
+        latency = summary['latency_ms']
+        print(
+            f"{layout:<5} {summary['throughput_rps']:>8.1f} events/s (offered {args.rate:.0f})  "
+            f"p50={latency['p50']:.2f}ms p99={latency['p99']:.2f}ms errors={summary['errors']}  "
+            f"ranges={summary['index_ranges']} peak/range={summary['peak_range_writes_per_second']}/s "
+            f"(ceiling {args.ceiling}/s, {summary['seconds_over_ceiling']} range-seconds over)",
+            file=sys.stderr,
+        )
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'rate': args.rate,
+            'seconds': args.seconds,
+            'users': args.users,
+            'concurrency': args.concurrency,
+            'ceiling': args.ceiling,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Microbenchmark for JSON encoding of log responses
+
+Encodes a /api/logs-shaped response of N Firestore-like logs (created_at
+as a timezone-aware datetime) with:
+
+- flask_default: the previous path, isoformat() on every record in
+  _log_from_doc and then Flask's DefaultJSONProvider
+- stdlib: services.json_provider without orjson
+- orjson: services.json_provider with orjson (skipped if not installed)
+
+No app, storage or network is involved; only encoding is timed.
+
+Usage (from backend/):
+    uv run python -m benchmarks.bench_json --sizes 1000,10000 --repeat 20
+    uv run python -m benchmarks.bench_json --output json-bench.json
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from benchmarks.bench_api import _git_commit
+from benchmarks.stats import percentile
+
+APPS = ('line', 'instagram', 'x', 'facebook', 'tiktok', 'discord')
+
+
+def make_logs(count: int) -> List[Dict[str, Any]]:
+    """Logs as FirestoreHelper returns them"""
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            'id': f'{i:020x}',
+            'user_id': 'bench-user',
+            'app_name': APPS[i % len(APPS)],
+            'event_type': ('opened', 'closed')[i % 2],
+            'timestamp': (base + timedelta(seconds=i)).isoformat(),
+            'created_at': base + timedelta(seconds=i, microseconds=1234),
+        }
+        for i in range(count)
+    ]
+
+
+def encoders(app) -> Dict[str, Callable[[List[Dict[str, Any]]], bytes]]:
+    from flask.json.provider import DefaultJSONProvider
+
+    from services import json_provider
+
+    flask_default = DefaultJSONProvider(app)
+
+    def old_path(logs):
+        converted = []
+        for log in logs:
+            log = dict(log)
+            log['created_at'] = log['created_at'].isoformat()
+            converted.append(log)
+        body = {'logs': converted, 'count': len(converted)}
+        return (flask_default.dumps(body) + '\n').encode('utf-8')
+
+    def provider(use_orjson):
+        def encode(logs):
+            json_provider.use_orjson = use_orjson
+            return json_provider.dumps_bytes({'logs': logs, 'count': len(logs)}, sort_keys=True) + b'\n'
+        return encode
+
+    result = {'flask_default': old_path, 'stdlib': provider(False)}
+    if json_provider.orjson is not None:
+        result['orjson'] = provider(True)
+    return result
+
+
+def run(encode, logs, repeat: int) -> Dict[str, object]:
+    encode(logs)  # Warm up
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode(logs)
+        timings.append(time.perf_counter() - started)
+        size = len(body)
+    ordered = sorted(timings)
+    return {
+        'payload_bytes': size,
+        'ms': {
+            'min': round(ordered[0] * 1000, 3),
+            'p50': round(percentile(ordered, 50) * 1000, 3),
+            'p95': round(percentile(ordered, 95) * 1000, 3),
+        },
+        'logs_per_second': round(len(logs) / percentile(ordered, 50)),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='JSON encoding microbenchmark for log payloads')
+    parser.add_argument('--sizes', default='1000,10000', help='comma-separated log counts')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    from flask import Flask
+
+    from services import json_provider
+
+    app = Flask(__name__)
+    configured = json_provider.use_orjson
+    results = []
+    try:
+        for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+            logs = make_logs(size)
+            baseline = None
+            for name, encode in encoders(app).items():
+                summary = run(encode, logs, args.repeat)
+                summary.update({'encoder': name, 'logs': size})
+                baseline = baseline or summary['ms']['p50']
+                summary['speedup'] = round(baseline / summary['ms']['p50'], 2)
+                results.append(summary)
+                print(
+                    f"{size:>6} logs  {name:<14} p50={summary['ms']['p50']:>8.2f}ms "
+                    f"{summary['logs_per_second']:>10} logs/s  {summary['payload_bytes']:>9} bytes  "
+                    f"x{summary['speedup']:.2f}",
+                    file=sys.stderr,
+                )
+    finally:
+        json_provider.use_orjson = configured
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Compare two benchmark result files
+
+Usage (from backend/):
+    uv run python -m benchmarks.compare baseline.json current.json --threshold 10
+
+Exits with status 1 if any scenario's throughput drops, or its p95 latency
+grows, by more than the threshold percentage.
+"""
+import argparse
+import json
+import sys
+
+
+def _index(report):
+    return {(r['scenario'], r['concurrency']): r for r in report['results']}
+
+
+def _change(old: float, new: float) -> float:
+    return (new - old) / old * 100.0 if old else 0.0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Diff two benchmark JSON reports')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed regression in percent')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"baseline {baseline['meta'].get('commit')}  ->  current {current['meta'].get('commit')}")
+    regressions = 0
+    old_results = _index(baseline)
+    for key, new in sorted(_index(current).items()):
+        old = old_results.get(key)
+        if old is None:
+            continue
+        rps = _change(old['throughput_rps'], new['throughput_rps'])
+        p95 = _change(old['latency_ms']['p95'], new['latency_ms']['p95'])
+        regressed = rps < -args.threshold or p95 > args.threshold
+        regressions += regressed
+        print(
+            f"{key[0]:<20} c={key[1]:<3} throughput {rps:+7.1f}%  p95 {p95:+7.1f}%"
+            + ('  REGRESSION' if regressed else '')
+        )
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
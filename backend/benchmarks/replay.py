@@ -0,0 +1,308 @@
+"""
+Replay captured webhook traffic
+
+Replays capture files written with TRAFFIC_CAPTURE=1 (see
+services.traffic_capture) against create_app() in-process, with stubbed
+Firebase like the other benchmarks, or against a running server with
+--url. Requests keep their captured order and relative timing, scaled by
+--speed (1x = real time, 10x = ten times faster, max = back to back), so
+bursts, retry storms and idle stretches come back as they happened.
+
+Reports achieved throughput and latency overall and per endpoint, how far
+requests fell behind their schedule, and how many got a different status
+than in production. The JSON report has the same layout as bench_api, so
+two replays can be diffed with benchmarks.compare.
+
+Usage (from backend/):
+    uv run python -m benchmarks.replay captures/*.ndjson.gz --speed 10x --concurrency 8
+    uv run python -m benchmarks.replay captures/ --speed max --storage sqlite --output replay.json
+    uv run python -m benchmarks.replay capture.ndjson.gz --url http://localhost:8080 --speed 1x
+"""
+import argparse
+import glob
+import gzip
+import http.client
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.bench_api import _git_commit, prepare_environment
+from benchmarks.stats import percentile, summarize
+
+PATHS = {'e': '/api/webhook', 'b': '/api/webhook/batch'}
+SCENARIO_NAMES = {'e': 'replay_webhook', 'b': 'replay_webhook_batch'}
+
+
+def _capture_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.ndjson.gz'))))
+        else:
+            files.extend(sorted(glob.glob(path)) or [path])
+    return files
+
+
+def load_records(files: List[str]) -> List[Dict[str, Any]]:
+    """
+    Read capture files into one list ordered by arrival time
+
+    Each record gets 'at', its absolute arrival time (epoch seconds).
+    """
+    records = []
+    for path in files:
+        started = None
+        pending = []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'v' in record:
+                    started = record['started']
+                else:
+                    pending.append(record)
+        if started is None:
+            raise ValueError(f'{path}: no capture header')
+        for record in pending:
+            record['at'] = started + record['t']
+        records.extend(pending)
+    records.sort(key=lambda record: record['at'])
+    return records
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """'max' -> None (no pacing); '10x' or '10' -> 10.0"""
+    value = value.strip().lower()
+    if value == 'max':
+        return None
+    speed = float(value[:-1] if value.endswith('x') else value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError('speed must be positive')
+    return speed
+
+
+def rebase_timestamps(records: List[Dict[str, Any]]) -> None:
+    """Shift event timestamps so the capture ends now (keeps analysis windows realistic)"""
+    latest = None
+    for record in records:
+        for event in _events(record):
+            parsed = _parse_timestamp(event.get('timestamp'))
+            if parsed is not None and (latest is None or parsed > latest):
+                latest = parsed
+    if latest is None:
+        return
+    shift = datetime.now(timezone.utc) - latest
+    for record in records:
+        for event in _events(record):
+            parsed = _parse_timestamp(event.get('timestamp'))
+            if parsed is not None:
+                event['timestamp'] = (parsed + shift).isoformat()
+
+
+def _events(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    body = record.get('b')
+    if record['k'] == 'e':
+        return [body] if isinstance(body, dict) else []
+    events = body.get('events') if isinstance(body, dict) else None
+    return [event for event in events or [] if isinstance(event, dict)]
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class InProcessTarget:
+    """Sends requests to create_app() through per-thread test clients"""
+
+    def __init__(self, storage: str):
+        prepare_environment(storage)
+        from app import create_app
+        self.app = create_app()
+        self._local = threading.local()
+
+    def send(self, path: str, body: bytes, headers: Dict[str, str]) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(path, data=body, headers=headers)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPTarget:
+    """Sends requests to a running server over per-thread keep-alive connections"""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self._local = threading.local()
+
+    def send(self, path: str, body: bytes, headers: Dict[str, str]) -> int:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(self.netloc, timeout=30)
+        try:
+            connection.request('POST', self.prefix + path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+def replay(target, records: List[Dict[str, Any]], speed: Optional[float],
+           concurrency: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Replay records against target
+
+    Returns:
+        (overall summary, per-endpoint summaries)
+    """
+    first = records[0]['at'] if records else 0.0
+    latencies: Dict[str, List[float]] = {kind: [] for kind in PATHS}
+    lags: List[float] = []
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    mismatches = 0
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def one(record: Dict[str, Any]) -> None:
+        nonlocal mismatches
+        kind = record['k']
+        scheduled = started + (record['at'] - first) / speed if speed else None
+        if scheduled is not None:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        headers = {'Content-Type': 'application/json'}
+        if record.get('i'):
+            headers['Idempotency-Key'] = record['i']
+        body = json.dumps(record.get('b')).encode('utf-8')
+
+        sent = time.perf_counter()
+        try:
+            status = target.send(PATHS[kind], body, headers)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - sent
+        with lock:
+            latencies[kind].append(elapsed)
+            if scheduled is not None:
+                lags.append(max(0.0, sent - scheduled))
+            statuses[str(status)] += 1
+            if status is None or status >= 500:
+                errors[kind] += 1
+            if status != record.get('s'):
+                mismatches += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, records))
+    wall = time.perf_counter() - started
+
+    every = [latency for values in latencies.values() for latency in values]
+    overall = summarize(every, wall, sum(errors.values()))
+    lags.sort()
+    overall.update({
+        'scenario': 'replay',
+        'concurrency': concurrency,
+        'captured_seconds': round(records[-1]['at'] - first, 3) if records else 0.0,
+        'statuses': dict(sorted(statuses.items())),
+        'status_mismatches': mismatches,
+        'schedule_lag_ms': {
+            'p50': round(percentile(lags, 50) * 1000, 3),
+            'p95': round(percentile(lags, 95) * 1000, 3),
+            'max': round(lags[-1] * 1000, 3) if lags else 0.0,
+        } if speed else None,
+    })
+    per_endpoint = []
+    for kind, values in latencies.items():
+        if values:
+            summary = summarize(values, wall, errors[kind])
+            summary.update({'scenario': SCENARIO_NAMES[kind], 'concurrency': concurrency})
+            per_endpoint.append(summary)
+    return overall, per_endpoint
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Replay captured webhook traffic')
+    parser.add_argument('captures', nargs='+', help='capture files, globs or directories')
+    parser.add_argument('--speed', type=parse_speed, default=parse_speed('1x'),
+                        help='1x (real time), Nx (N times faster) or max (default: 1x)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent requests in flight')
+    parser.add_argument('--url', help='replay against this server instead of create_app() in-process')
+    parser.add_argument('--storage', choices=['memory', 'sqlite'], default='memory',
+                        help='in-process storage: stubbed in-memory Firestore or SQLite')
+    parser.add_argument('--limit', type=int, help='replay only the first N requests')
+    parser.add_argument('--rebase-timestamps', action='store_true',
+                        help='shift event timestamps so the capture ends now')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    files = _capture_files(args.captures)
+    if not files:
+        parser.error('no capture files found')
+    records = load_records(files)
+    if args.limit is not None:
+        records = records[:args.limit]
+    if not records:
+        parser.error('the captures contain no requests')
+    if args.rebase_timestamps:
+        rebase_timestamps(records)
+
+    target = HTTPTarget(args.url) if args.url else InProcessTarget(args.storage)
+    overall, per_endpoint = replay(target, records, args.speed, args.concurrency)
+
+    latency = overall['latency_ms']
+    print(
+        f"replayed {overall['requests']} requests ({overall['captured_seconds']:.1f}s captured) "
+        f"in {overall['wall_seconds']:.1f}s: {overall['throughput_rps']:.1f} req/s  "
+        f"p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms  "
+        f"errors={overall['errors']} status_mismatches={overall['status_mismatches']}",
+        file=sys.stderr,
+    )
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'target': args.url or f'in-process ({args.storage})',
+            'captures': files,
+            'speed': 'max' if args.speed is None else f'{args.speed:g}x',
+        },
+        'results': [overall] + per_endpoint,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Latency and throughput statistics shared by the benchmark tools
+"""
+import math
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], wall_seconds: float, errors: int = 0) -> Dict[str, object]:
+    """
+    Summarize one benchmark run
+
+    Args:
+        latencies: Per-request latencies in seconds
+        wall_seconds: Wall-clock duration of the whole run
+        errors: Number of failed requests
+
+    Returns:
+        Dictionary with request counts, throughput and latency percentiles (ms)
+    """
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        'requests': count,
+        'errors': errors,
+        'wall_seconds': round(wall_seconds, 4),
+        'throughput_rps': round(count / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        'latency_ms': {
+            'mean': round(sum(ordered) / count * 1000, 3) if count else 0.0,
+            'p50': round(percentile(ordered, 50) * 1000, 3),
+            'p95': round(percentile(ordered, 95) * 1000, 3),
+            'p99': round(percentile(ordered, 99) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3) if count else 0.0,
+        },
+    }
@@ -0,0 +1,437 @@
+"""
+In-memory stand-ins for firebase_admin and google-cloud-firestore
+
+install() registers fake modules in sys.modules so create_app() runs fully
+offline: Firestore is a thread-safe in-memory document store, ID tokens
+are accepted as "<uid>" (or "<uid>:admin" for the admin claim), and
+Storage keeps blobs in a dict. Call install() before importing anything
+from the app.
+"""
+import sys
+import threading
+import types
+import uuid
+from typing import Any, Dict, List, Optional
+
+
+class AlreadyExists(Exception):
+    """Stand-in for google.api_core.exceptions.AlreadyExists"""
+
+
+class NotFound(Exception):
+    """Stand-in for google.api_core.exceptions.NotFound"""
+
+
+class FieldFilter:
+    def __init__(self, field_path: str, op_string: str, value: Any):
+        self.field_path = field_path
+        self.op_string = op_string
+        self.value = value
+
+
+class FieldPath:
+    @staticmethod
+    def document_id() -> str:
+        return '__name__'
+
+
+_OPS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    """set(merge=True): nested maps are merged and Increment is applied"""
+    for key, value in data.items():
+        if isinstance(value, Increment):
+            current = target.get(key)
+            target[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            target[key] = dict(target[key])
+            _merge(target[key], value)
+        elif isinstance(value, dict):
+            target[key] = {}
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+class DocumentSnapshot:
+    def __init__(self, reference: 'DocumentReference', data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class DocumentReference:
+    def __init__(self, client: 'Client', path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name: str) -> 'CollectionReference':
+        return CollectionReference(self._client, f'{self.path}/{name}')
+
+    def get(self, *args, **kwargs) -> DocumentSnapshot:
+        with self._client._lock:
+            data = self._client._docs.get(self.path)
+            self._client.reads += 1
+            return DocumentSnapshot(self, dict(data) if data is not None else None)
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        with self._client._lock:
+            if merge:
+                _merge(self._client._docs.setdefault(self.path, {}), data)
+            else:
+                self._client._docs[self.path] = dict(data)
+            self._client.writes += 1
+
+    def create(self, data: Dict[str, Any]) -> None:
+        with self._client._lock:
+            if self.path in self._client._docs:
+                raise AlreadyExists(f'Document already exists: {self.path}')
+            self._client._docs[self.path] = dict(data)
+            self._client.writes += 1
+
+    def update(self, data: Dict[str, Any]) -> None:
+        with self._client._lock:
+            if self.path not in self._client._docs:
+                raise NotFound(f'No document to update: {self.path}')
+            self._client._docs[self.path].update(data)
+            self._client.writes += 1
+
+    def delete(self) -> None:
+        with self._client._lock:
+            self._client._docs.pop(self.path, None)
+            self._client.deletes += 1
+
+
+class Query:
+    def __init__(self, client: 'Client', parent_path: str, group: bool = False,
+                 filters=(), orders=(), limit_count=None, cursor=None, fields=None):
+        self._client = client
+        self._parent_path = parent_path
+        self._group = group
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit_count
+        self._cursor = cursor
+        self._fields = fields
+
+    def _copy(self, **changes) -> 'Query':
+        state = dict(
+            filters=self._filters, orders=self._orders, limit_count=self._limit,
+            cursor=self._cursor, fields=self._fields,
+        )
+        state.update(changes)
+        return Query(self._client, self._parent_path, self._group, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None) -> 'Query':
+        condition = filter or FieldFilter(field_path, op_string, value)
+        return self._copy(filters=self._filters + [condition])
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING') -> 'Query':
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count: int) -> 'Query':
+        return self._copy(limit_count=count)
+
+    def start_after(self, values) -> 'Query':
+        return self._copy(cursor=values)
+
+    def select(self, field_paths) -> 'Query':
+        return self._copy(fields=list(field_paths))
+
+    def _matches_parent(self, path: str) -> bool:
+        parent, _, _ = path.rpartition('/')
+        if self._group:
+            return parent.rsplit('/', 1)[-1] == self._parent_path
+        return parent == self._parent_path
+
+    @staticmethod
+    def _value(snapshot: DocumentSnapshot, field: str) -> Any:
+        if field == '__name__':
+            return snapshot.reference.path
+        return snapshot._data.get(field)
+
+    def _cursor_values(self) -> List[Any]:
+        values = self._cursor
+        if isinstance(values, DocumentSnapshot):
+            return [self._value(values, field) for field, _ in self._orders]
+        if isinstance(values, dict):
+            resolved = []
+            for field, _ in self._orders:
+                value = values[field]
+                if field == '__name__':
+                    value = value.path if isinstance(value, DocumentReference) else f'{self._parent_path}/{value}'
+                resolved.append(value)
+            return resolved
+        return list(values)
+
+    def stream(self, *args, **kwargs):
+        with self._client._lock:
+            snapshots = [
+                DocumentSnapshot(DocumentReference(self._client, path), dict(data))
+                for path, data in self._client._docs.items()
+                if self._matches_parent(path)
+            ]
+
+        for condition in self._filters:
+            op = _OPS[condition.op_string]
+            snapshots = [
+                s for s in snapshots
+                if op(self._value(s, condition.field_path), condition.value)
+            ]
+
+        for field, direction in reversed(self._orders):
+            snapshots = [s for s in snapshots if self._value(s, field) is not None]
+            snapshots.sort(key=lambda s: self._value(s, field), reverse=(direction == 'DESCENDING'))
+
+        if self._cursor is not None:
+            cursor = self._cursor_values()
+
+            def after_cursor(snapshot):
+                for (field, direction), bound in zip(self._orders, cursor):
+                    value = self._value(snapshot, field)
+                    if value == bound:
+                        continue
+                    return value < bound if direction == 'DESCENDING' else value > bound
+                return False
+
+            snapshots = [s for s in snapshots if after_cursor(s)]
+
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+
+        if self._fields is not None:
+            for snapshot in snapshots:
+                snapshot._data = {k: v for k, v in snapshot._data.items() if k in self._fields}
+
+        with self._client._lock:
+            self._client.reads += max(1, len(snapshots))
+            self._client.queries += 1
+        return iter(snapshots)
+
+    def get(self, *args, **kwargs) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    def __init__(self, client: 'Client', path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, f'{self._parent_path}/{document_id or uuid.uuid4().hex[:20]}')
+
+    def list_documents(self, *args, **kwargs) -> List[DocumentReference]:
+        # Like Firestore, includes "missing" documents that only have subcollections
+        prefix = self._parent_path + '/'
+        with self._client._lock:
+            ids = {path[len(prefix):].split('/', 1)[0] for path in self._client._docs if path.startswith(prefix)}
+        return [DocumentReference(self._client, prefix + doc_id) for doc_id in sorted(ids)]
+
+
+class WriteBatch:
+    def __init__(self, client: 'Client'):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(('set', reference, data, merge))
+
+    def create(self, reference, data):
+        self._ops.append(('create', reference, data, False))
+
+    def update(self, reference, data):
+        self._ops.append(('update', reference, data, False))
+
+    def delete(self, reference):
+        self._ops.append(('delete', reference, None, False))
+
+    def commit(self):
+        with self._client._lock:
+            for op, reference, _, _ in self._ops:
+                if op == 'create' and reference.path in self._client._docs:
+                    raise AlreadyExists(f'Document already exists: {reference.path}')
+            for op, reference, data, merge in self._ops:
+                if op == 'set':
+                    reference.set(data, merge=merge)
+                elif op == 'create':
+                    reference.create(data)
+                elif op == 'update':
+                    reference.set(data, merge=True)
+                else:
+                    reference.delete()
+        return []
+
+
+class Client:
+    """Thread-safe in-memory Firestore client"""
+
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self.reads = self.writes = self.deletes = self.queries = 0
+
+    def collection(self, name: str) -> CollectionReference:
+        return CollectionReference(self, name)
+
+    def collection_group(self, name: str) -> Query:
+        return Query(self, name, group=True)
+
+    def document(self, path: str) -> DocumentReference:
+        return DocumentReference(self, path)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._docs.clear()
+            self.reads = self.writes = self.deletes = self.queries = 0
+
+
+class Blob:
+    def __init__(self, bucket: 'Bucket', name: str):
+        self._bucket = bucket
+        self.name = name
+
+    @property
+    def size(self) -> Optional[int]:
+        data = self._bucket._blobs.get(self.name)
+        return len(data) if data is not None else None
+
+    def exists(self, *args, **kwargs) -> bool:
+        return self.name in self._bucket._blobs
+
+    def upload_from_string(self, data, content_type=None, **kwargs) -> None:
+        self._bucket._blobs[self.name] = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+
+    def download_as_bytes(self, *args, **kwargs) -> bytes:
+        if self.name not in self._bucket._blobs:
+            raise NotFound(f'No such object: {self.name}')
+        return self._bucket._blobs[self.name]
+
+    def delete(self, *args, **kwargs) -> None:
+        self._bucket._blobs.pop(self.name, None)
+
+    def generate_signed_url(self, *args, **kwargs) -> str:
+        return f'https://storage.example.invalid/{self._bucket.name}/{self.name}?signed=1'
+
+
+class Bucket:
+    def __init__(self, name: str = 'stub-bucket'):
+        self.name = name
+        self._blobs: Dict[str, bytes] = {}
+
+    def blob(self, name: str) -> Blob:
+        return Blob(self, name)
+
+    def list_blobs(self, prefix: str = '', **kwargs) -> List[Blob]:
+        return [Blob(self, name) for name in sorted(self._blobs) if name.startswith(prefix)]
+
+
+class InvalidIdTokenError(ValueError):
+    pass
+
+
+class ExpiredIdTokenError(InvalidIdTokenError):
+    pass
+
+
+def verify_id_token(id_token: str, *args, **kwargs) -> Dict[str, Any]:
+    """Accept "<uid>" or "<uid>:admin"; tokens starting with "invalid" fail"""
+    if not id_token or id_token.startswith('invalid'):
+        raise InvalidIdTokenError('Invalid stub token')
+    uid, _, role = id_token.partition(':')
+    claims = {'uid': uid, 'email': f'{uid}@example.invalid'}
+    if role == 'admin':
+        claims['admin'] = True
+    return claims
+
+
+firestore_client = Client()
+storage_bucket = Bucket()
+
+
+def _module(name: str, _package: bool = False, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    if _package or '.' not in name:
+        module.__path__ = []
+    return module
+
+
+def install() -> None:
+    """Register the stub modules (idempotent)"""
+    if getattr(sys.modules.get('firebase_admin'), '_miivvy_stub', False):
+        return
+
+    credentials = _module('firebase_admin.credentials', Certificate=lambda cert: cert)
+    firestore = _module('firebase_admin.firestore', client=lambda app=None: firestore_client)
+    auth = _module(
+        'firebase_admin.auth',
+        verify_id_token=verify_id_token,
+        InvalidIdTokenError=InvalidIdTokenError,
+        ExpiredIdTokenError=ExpiredIdTokenError,
+    )
+    storage = _module('firebase_admin.storage', bucket=lambda name=None, app=None: storage_bucket)
+    firebase_admin = _module(
+        'firebase_admin',
+        _miivvy_stub=True,
+        _apps={},
+        initialize_app=lambda *args, **kwargs: None,
+        get_app=lambda name='[DEFAULT]': None,
+        credentials=credentials,
+        firestore=firestore,
+        auth=auth,
+        storage=storage,
+    )
+
+    google = _module('google')
+    api_core = _module('google.api_core', _package=True)
+    exceptions = _module('google.api_core.exceptions', AlreadyExists=AlreadyExists, NotFound=NotFound)
+    cloud = _module('google.cloud', _package=True)
+    firestore_v1 = _module(
+        'google.cloud.firestore_v1',
+        FieldFilter=FieldFilter,
+        FieldPath=FieldPath,
+        Increment=Increment,
+        Client=Client,
+    )
+
+    sys.modules.update({
+        'firebase_admin': firebase_admin,
+        'firebase_admin.credentials': credentials,
+        'firebase_admin.firestore': firestore,
+        'firebase_admin.auth': auth,
+        'firebase_admin.storage': storage,
+        'google': google,
+        'google.api_core': api_core,
+        'google.api_core.exceptions': exceptions,
+        'google.cloud': cloud,
+        'google.cloud.firestore_v1': firestore_v1,
+    })
@@ -0,0 +1,174 @@
+"""
+Storage backend interface
+
+Every persistence operation the API needs goes through these methods, so
+routes work the same against Firestore (firebase.firestore_helper) or the
+local SQLite backend (database.sqlite_backend).
+"""
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class StorageBackend(ABC):
+    """Abstract storage backend"""
+
+    # ============ Logs ============
+
+    @abstractmethod
+    def save_log(self, log_data: Dict[str, Any]) -> str:
+        """Save an app usage log and return its ID"""
+
+    @abstractmethod
+    def save_log_once(self, log_data: Dict[str, Any], doc_id: str) -> bool:
+        """Save a log under doc_id unless it exists; return True if created"""
+
+    @abstractmethod
+    def save_logs(self, entries: List[Tuple[Optional[str], Dict[str, Any]]]) -> List[Tuple[str, bool]]:
+        """Save many logs; entries are (doc_id or None, log_data) pairs"""
+
+    @abstractmethod
+    def get_logs(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        app_name: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Return a user's logs, newest first"""
+
+    @abstractmethod
+    def get_logs_page(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 500,
+        descending: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Return one page of a user's logs ordered by (timestamp, id)
+
+        after is the (timestamp, id) of the last log of the previous page
+        (keyset pagination), so every page costs a single indexed query no
+        matter how deep into the history it is.
+        """
+
+    def iter_logs(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        page_size: int = 500,
+        descending: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """Walk a user's logs page by page, holding one page in memory"""
+        while True:
+            page = self.get_logs_page(user_id, start_date, end_date, after, page_size, descending)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = (page[-1]['timestamp'], page[-1]['id'])
+
+    @abstractmethod
+    def get_oldest_log(self, before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the oldest log of any user (optionally with timestamp < before)"""
+
+    @abstractmethod
+    def delete_logs(self, user_id: str, log_ids: List[str]) -> int:
+        """Delete a user's logs by ID in bulk and return how many were deleted"""
+
+    @abstractmethod
+    def get_active_user_ids(self, since: str) -> List[str]:
+        """Return the sorted IDs of users with logs at or after since"""
+
+    # ============ Log Rollups ============
+
+    @abstractmethod
+    def save_log_rollup(self, user_id: str, month: str, rollup: Dict[str, Any]) -> None:
+        """Save (replace) the summary of a user's compacted logs for a YYYY-MM month"""
+
+    @abstractmethod
+    def get_log_rollups(self, user_id: str) -> List[Dict[str, Any]]:
+        """Return all of a user's monthly rollups, oldest first"""
+
+    # ============ Sessions ============
+
+    @abstractmethod
+    def save_sessions(self, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Save (replace) many (session_id, session) records in bulk"""
+
+    @abstractmethod
+    def get_sessions(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        app_name: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Return a user's sessions that started within the range, newest first"""
+
+    # ============ Analyses ============
+
+    def new_analysis_id(self) -> str:
+        """Generate an ID for save_analysis before the write happens"""
+        return uuid.uuid4().hex[:20]
+
+    @abstractmethod
+    def save_analysis(self, user_id: str, analysis_data: Dict[str, Any], analysis_id: Optional[str] = None) -> str:
+        """Save an analysis result (under analysis_id if given) and return its ID"""
+
+    @abstractmethod
+    def save_analyses(self, entries: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Save many (user_id, analysis_data) results in bulk and return their IDs"""
+
+    @abstractmethod
+    def get_latest_analysis(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the most recent analysis for a user, or None"""
+
+    # ============ Detections ============
+
+    @abstractmethod
+    def save_detection(self, user_id: str, detection: Dict[str, Any]) -> str:
+        """Save a rule-engine detection and return its ID"""
+
+    @abstractmethod
+    def get_detections(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return a user's detections, newest first"""
+
+    # ============ User Settings ============
+
+    @abstractmethod
+    def save_user_settings(self, user_id: str, settings: Dict[str, Any]) -> None:
+        """Merge settings into the user's settings document"""
+
+    @abstractmethod
+    def get_user_settings(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return a user's settings, or None"""
+
+    @abstractmethod
+    def get_users_sharing_with(self, viewer_id: str) -> List[str]:
+        """Return the sorted IDs of users whose settings list viewer_id in shared_with"""
+
+    # ============ Baselines ============
+
+    @abstractmethod
+    def increment_user_baseline(self, user_id: str, counters: Dict[str, Dict[str, float]]) -> None:
+        """Atomically add {group: {key: amount}} to the user's baseline counters"""
+
+    @abstractmethod
+    def get_user_baseline(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return a user's baseline counters, or None"""
+
+    # ============ Utility ============
+
+    def warmup(self) -> None:
+        """Open connections ahead of the first request (no-op by default)"""
+
+    @abstractmethod
+    def delete_user_data(self, user_id: str) -> Dict[str, int]:
+        """Delete all data for a user, archived log segments included, and return per-collection counts"""
@@ -0,0 +1,51 @@
+"""
+Storage wrapper that coalesces concurrent identical reads
+
+Wraps any StorageBackend: while a read is in flight, identical reads
+(same method and arguments) wait for it and get a copy of its result
+instead of issuing their own query. Nothing is cached after the read
+returns, so results are never staler than the in-flight query.
+Writes and everything else pass straight through.
+"""
+from typing import Any
+
+from database.base import StorageBackend
+from services.single_flight import SingleFlight
+
+COALESCED_READS = (
+    'get_logs',
+    'get_logs_page',
+    'get_log_rollups',
+    'get_sessions',
+    'get_latest_analysis',
+    'get_detections',
+    'get_user_settings',
+    'get_users_sharing_with',
+    'get_user_baseline',
+)
+
+
+class CoalescingStorage:
+    """StorageBackend proxy with single-flight reads"""
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+        self.flight = SingleFlight()
+        for name in COALESCED_READS:
+            setattr(self, name, self._coalesced(name, getattr(backend, name)))
+
+    def _coalesced(self, name: str, method):
+        def read(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return method(*args, **kwargs)
+            return self.flight.do(key, lambda: method(*args, **kwargs))
+
+        read.__name__ = name
+        read.__doc__ = method.__doc__
+        return read
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
@@ -0,0 +1,531 @@
+"""
+SQLite storage backend for self-hosting, local development and benchmarks
+
+Uses WAL mode so readers never block the writer, one connection per
+thread (sqlite3 connections must not be shared across threads), constant
+SQL strings so the module's statement cache reuses compiled statements,
+and single-transaction batched inserts.
+"""
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.base import StorageBackend
+from models.event import utc_now_timestamp
+from services.archive import delete_user_archives
+from services.settings_cache import settings_cache
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    app_name TEXT,
+    event_type TEXT,
+    timestamp TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_logs_user_timestamp ON logs (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_user_app_timestamp ON logs (user_id, app_name, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp);
+
+CREATE TABLE IF NOT EXISTS log_rollups (
+    user_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, month)
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    app_name TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT,
+    duration_seconds REAL,
+    end_reason TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_start ON sessions (user_id, start);
+
+CREATE TABLE IF NOT EXISTS user_baselines (
+    user_id TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_user_created ON analyses (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS detections (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_detections_user_created ON detections (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+_LOG_COLUMNS = ('user_id', 'app_name', 'event_type', 'timestamp')
+
+_INSERT_LOG = (
+    'INSERT INTO logs (id, user_id, app_name, event_type, timestamp, created_at, extra) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+_INSERT_LOG_ONCE = (
+    'INSERT OR IGNORE INTO logs (id, user_id, app_name, event_type, timestamp, created_at, extra) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+_SELECT_LOGS = 'SELECT id, user_id, app_name, event_type, timestamp, created_at, extra FROM logs WHERE user_id = ?'
+
+_SELECT_OLDEST_LOG = (
+    'SELECT id, user_id, app_name, event_type, timestamp, created_at, extra FROM logs '
+    'WHERE timestamp < ? ORDER BY timestamp LIMIT 1'
+)
+_DELETE_LOG = 'DELETE FROM logs WHERE id = ? AND user_id = ?'
+_SELECT_ACTIVE_USERS = 'SELECT DISTINCT user_id FROM logs WHERE timestamp >= ? ORDER BY user_id'
+
+_UPSERT_ROLLUP = (
+    'INSERT INTO log_rollups (user_id, month, updated_at, data) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT(user_id, month) DO UPDATE SET updated_at = excluded.updated_at, data = excluded.data'
+)
+_SELECT_ROLLUPS = 'SELECT month, updated_at, data FROM log_rollups WHERE user_id = ? ORDER BY month'
+
+_UPSERT_SESSION = (
+    'INSERT OR REPLACE INTO sessions (id, user_id, app_name, start, end, duration_seconds, end_reason, created_at) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+_SELECT_SESSIONS = (
+    'SELECT id, user_id, app_name, start, end, duration_seconds, end_reason FROM sessions WHERE user_id = ?'
+)
+_SESSION_COLUMNS = ('id', 'user_id', 'app_name', 'start', 'end', 'duration_seconds', 'end_reason')
+
+_INSERT_ANALYSIS = 'INSERT INTO analyses (id, user_id, created_at, data) VALUES (?, ?, ?, ?)'
+_SELECT_LATEST_ANALYSIS = (
+    'SELECT id, created_at, data FROM analyses WHERE user_id = ? ORDER BY created_at DESC LIMIT 1'
+)
+
+_INSERT_DETECTION = 'INSERT INTO detections (id, user_id, created_at, data) VALUES (?, ?, ?, ?)'
+_SELECT_DETECTIONS = (
+    'SELECT id, created_at, data FROM detections WHERE user_id = ? ORDER BY created_at DESC LIMIT ?'
+)
+
+_SELECT_BASELINE = 'SELECT updated_at, data FROM user_baselines WHERE user_id = ?'
+_UPSERT_BASELINE = (
+    'INSERT INTO user_baselines (user_id, updated_at, data) VALUES (?, ?, ?) '
+    'ON CONFLICT(user_id) DO UPDATE SET updated_at = excluded.updated_at, data = excluded.data'
+)
+
+_SELECT_SETTINGS = 'SELECT updated_at, data FROM user_settings WHERE user_id = ?'
+_SELECT_SHARING_USERS = (
+    'SELECT user_id FROM user_settings WHERE EXISTS '
+    "(SELECT 1 FROM json_each(user_settings.data, '$.shared_with') WHERE value = ?) ORDER BY user_id"
+)
+_UPSERT_SETTINGS = (
+    'INSERT INTO user_settings (user_id, updated_at, data) VALUES (?, ?, ?) '
+    'ON CONFLICT(user_id) DO UPDATE SET updated_at = excluded.updated_at, data = excluded.data'
+)
+
+
+def _new_id() -> str:
+    """20-character random ID, the same length as Firestore auto IDs"""
+    return uuid.uuid4().hex[:20]
+
+
+class SQLiteStorage(StorageBackend):
+    """StorageBackend implementation on a local SQLite database"""
+
+    def __init__(self, path: str = 'miivvy.db'):
+        """
+        Args:
+            path: Database file path
+        """
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=256, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            self._local.conn = conn
+        return conn
+
+    # ============ Logs ============
+
+    @staticmethod
+    def _log_row(doc_id: str, log_data: Dict[str, Any], created_at: str) -> tuple:
+        if 'timestamp' not in log_data:
+            log_data['timestamp'] = utc_now_timestamp()
+        extra = {k: v for k, v in log_data.items() if k not in _LOG_COLUMNS and k != 'created_at'}
+        return (
+            doc_id,
+            log_data.get('user_id'),
+            log_data.get('app_name'),
+            log_data.get('event_type'),
+            log_data['timestamp'],
+            created_at,
+            json.dumps(extra, default=str) if extra else None,
+        )
+
+    @staticmethod
+    def _log_from_row(row: tuple) -> Dict[str, Any]:
+        doc_id, user_id, app_name, event_type, timestamp, created_at, extra = row
+        log = json.loads(extra) if extra else {}
+        log.update({
+            'user_id': user_id,
+            'app_name': app_name,
+            'event_type': event_type,
+            'timestamp': timestamp,
+            'created_at': created_at,
+            'id': doc_id,
+        })
+        return log
+
+    def save_log(self, log_data: Dict[str, Any]) -> str:
+        doc_id = _new_id()
+        self._conn().execute(_INSERT_LOG, self._log_row(doc_id, log_data, utc_now_timestamp()))
+        return doc_id
+
+    def save_log_once(self, log_data: Dict[str, Any], doc_id: str) -> bool:
+        cursor = self._conn().execute(
+            _INSERT_LOG_ONCE, self._log_row(doc_id, log_data, utc_now_timestamp())
+        )
+        return cursor.rowcount == 1
+
+    def save_logs(self, entries: List[Tuple[Optional[str], Dict[str, Any]]]) -> List[Tuple[str, bool]]:
+        created_at = utc_now_timestamp()
+        conn = self._conn()
+        results: List[Tuple[str, bool]] = []
+        plain_rows = []
+
+        conn.execute('BEGIN')
+        try:
+            for doc_id, log_data in entries:
+                if doc_id:
+                    cursor = conn.execute(_INSERT_LOG_ONCE, self._log_row(doc_id, log_data, created_at))
+                    results.append((doc_id, cursor.rowcount == 1))
+                else:
+                    new_id = _new_id()
+                    plain_rows.append(self._log_row(new_id, log_data, created_at))
+                    results.append((new_id, True))
+            if plain_rows:
+                conn.executemany(_INSERT_LOG, plain_rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        return results
+
+    def get_logs(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        app_name: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        sql = _SELECT_LOGS
+        params: List[Any] = [user_id]
+        if app_name:
+            sql += ' AND app_name = ?'
+            params.append(app_name)
+        if start_date:
+            sql += ' AND timestamp >= ?'
+            params.append(start_date)
+        if end_date:
+            sql += ' AND timestamp <= ?'
+            params.append(end_date)
+        sql += ' ORDER BY timestamp DESC LIMIT ?'
+        params.append(limit)
+
+        return [self._log_from_row(row) for row in self._conn().execute(sql, params)]
+
+    def get_logs_page(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 500,
+        descending: bool = False
+    ) -> List[Dict[str, Any]]:
+        sql = _SELECT_LOGS
+        params: List[Any] = [user_id]
+        if start_date:
+            sql += ' AND timestamp >= ?'
+            params.append(start_date)
+        if end_date:
+            sql += ' AND timestamp <= ?'
+            params.append(end_date)
+        if after:
+            sql += ' AND (timestamp, id) < (?, ?)' if descending else ' AND (timestamp, id) > (?, ?)'
+            params.extend(after)
+        sql += ' ORDER BY timestamp DESC, id DESC LIMIT ?' if descending else ' ORDER BY timestamp, id LIMIT ?'
+        params.append(limit)
+
+        return [self._log_from_row(row) for row in self._conn().execute(sql, params)]
+
+    def get_oldest_log(self, before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # '~' sorts after every ISO8601 timestamp, so no bound means "any"
+        row = self._conn().execute(_SELECT_OLDEST_LOG, (before or '~',)).fetchone()
+        return self._log_from_row(row) if row else None
+
+    def delete_logs(self, user_id: str, log_ids: List[str]) -> int:
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            deleted = conn.executemany(_DELETE_LOG, [(log_id, user_id) for log_id in log_ids]).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return deleted
+
+    def get_active_user_ids(self, since: str) -> List[str]:
+        return [row[0] for row in self._conn().execute(_SELECT_ACTIVE_USERS, (since,))]
+
+    # ============ Log Rollups ============
+
+    def save_log_rollup(self, user_id: str, month: str, rollup: Dict[str, Any]) -> None:
+        rollup['user_id'] = user_id
+        rollup['month'] = month
+        updated_at = datetime.now(timezone.utc)
+        rollup['updated_at'] = updated_at
+
+        data = {k: v for k, v in rollup.items() if k != 'updated_at'}
+        self._conn().execute(
+            _UPSERT_ROLLUP,
+            (user_id, month, updated_at.isoformat(timespec='microseconds'), json.dumps(data, default=str))
+        )
+
+    def get_log_rollups(self, user_id: str) -> List[Dict[str, Any]]:
+        rollups = []
+        for month, updated_at, data in self._conn().execute(_SELECT_ROLLUPS, (user_id,)):
+            rollup = json.loads(data)
+            rollup['updated_at'] = updated_at
+            rollups.append(rollup)
+        return rollups
+
+    # ============ Sessions ============
+
+    def save_sessions(self, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        created_at = utc_now_timestamp()
+        rows = [
+            (session_id, session['user_id'], session['app_name'], session['start'], session['end'],
+             session['duration_seconds'], session['end_reason'], created_at)
+            for session_id, session in entries
+        ]
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(_UPSERT_SESSION, rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_sessions(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        app_name: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        sql = _SELECT_SESSIONS
+        params: List[Any] = [user_id]
+        if app_name:
+            sql += ' AND app_name = ?'
+            params.append(app_name)
+        if start_date:
+            sql += ' AND start >= ?'
+            params.append(start_date)
+        if end_date:
+            sql += ' AND start <= ?'
+            params.append(end_date)
+        sql += ' ORDER BY start DESC LIMIT ?'
+        params.append(limit)
+
+        return [dict(zip(_SESSION_COLUMNS, row)) for row in self._conn().execute(sql, params)]
+
+    # ============ Analyses ============
+
+    def save_analysis(self, user_id: str, analysis_data: Dict[str, Any], analysis_id: Optional[str] = None) -> str:
+        analysis_data['user_id'] = user_id
+        created_at = datetime.now(timezone.utc)
+        analysis_data['created_at'] = created_at
+
+        doc_id = analysis_id or _new_id()
+        data = {k: v for k, v in analysis_data.items() if k != 'created_at'}
+        self._conn().execute(
+            _INSERT_ANALYSIS,
+            (doc_id, user_id, created_at.isoformat(timespec='microseconds'), json.dumps(data, default=str))
+        )
+        return doc_id
+
+    def save_analyses(self, entries: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        created_at = datetime.now(timezone.utc)
+        ids = []
+        rows = []
+        for user_id, analysis_data in entries:
+            analysis_data['user_id'] = user_id
+            analysis_data['created_at'] = created_at
+            doc_id = _new_id()
+            data = {k: v for k, v in analysis_data.items() if k != 'created_at'}
+            rows.append((doc_id, user_id, created_at.isoformat(timespec='microseconds'), json.dumps(data, default=str)))
+            ids.append(doc_id)
+
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(_INSERT_ANALYSIS, rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return ids
+
+    def get_latest_analysis(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(_SELECT_LATEST_ANALYSIS, (user_id,)).fetchone()
+        if row is None:
+            return None
+
+        doc_id, created_at, data = row
+        analysis = json.loads(data)
+        analysis['id'] = doc_id
+        analysis['created_at'] = created_at
+        return analysis
+
+    # ============ Detections ============
+
+    def save_detection(self, user_id: str, detection: Dict[str, Any]) -> str:
+        detection['user_id'] = user_id
+        created_at = datetime.now(timezone.utc)
+        detection['created_at'] = created_at
+
+        doc_id = _new_id()
+        data = {k: v for k, v in detection.items() if k != 'created_at'}
+        self._conn().execute(
+            _INSERT_DETECTION,
+            (doc_id, user_id, created_at.isoformat(timespec='microseconds'), json.dumps(data, default=str))
+        )
+        return doc_id
+
+    def get_detections(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        detections = []
+        for doc_id, created_at, data in self._conn().execute(_SELECT_DETECTIONS, (user_id, limit)):
+            detection = json.loads(data)
+            detection['id'] = doc_id
+            detection['created_at'] = created_at
+            detections.append(detection)
+        return detections
+
+    # ============ User Settings ============
+
+    def save_user_settings(self, user_id: str, settings: Dict[str, Any]) -> None:
+        updated_at = datetime.now(timezone.utc)
+        settings['updated_at'] = updated_at
+
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(_SELECT_SETTINGS, (user_id,)).fetchone()
+            merged = json.loads(row[1]) if row else {}
+            merged.update({k: v for k, v in settings.items() if k != 'updated_at'})
+            conn.execute(
+                _UPSERT_SETTINGS,
+                (user_id, updated_at.isoformat(timespec='microseconds'), json.dumps(merged, default=str))
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        settings_cache.invalidate(user_id)
+
+    def get_user_settings(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(_SELECT_SETTINGS, (user_id,)).fetchone()
+        if row is None:
+            return None
+
+        settings = json.loads(row[1])
+        settings['updated_at'] = row[0]
+        return settings
+
+    def get_users_sharing_with(self, viewer_id: str) -> List[str]:
+        return [row[0] for row in self._conn().execute(_SELECT_SHARING_USERS, (viewer_id,))]
+
+    # ============ Baselines ============
+
+    def increment_user_baseline(self, user_id: str, counters: Dict[str, Dict[str, float]]) -> None:
+        conn = self._conn()
+        # IMMEDIATE takes the write lock before reading, so concurrent
+        # increments from other connections are serialized, not lost
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(_SELECT_BASELINE, (user_id,)).fetchone()
+            data = json.loads(row[1]) if row else {}
+            for group, values in counters.items():
+                target = data.setdefault(group, {})
+                for key, amount in values.items():
+                    target[key] = target.get(key, 0) + amount
+            conn.execute(_UPSERT_BASELINE, (user_id, utc_now_timestamp(), json.dumps(data)))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_user_baseline(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(_SELECT_BASELINE, (user_id,)).fetchone()
+        if row is None:
+            return None
+
+        baseline = json.loads(row[1])
+        baseline['updated_at'] = row[0]
+        return baseline
+
+    # ============ Utility ============
+
+    def delete_user_data(self, user_id: str) -> Dict[str, int]:
+        # Compacted log segments go first; their rollups stay until this succeeds
+        archives = delete_user_archives(user_id)
+
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            counts = {
+                'logs': conn.execute('DELETE FROM logs WHERE user_id = ?', (user_id,)).rowcount,
+                'log_rollups': conn.execute('DELETE FROM log_rollups WHERE user_id = ?', (user_id,)).rowcount,
+                'sessions': conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,)).rowcount,
+                'analyses': conn.execute('DELETE FROM analyses WHERE user_id = ?', (user_id,)).rowcount,
+                'detections': conn.execute('DELETE FROM detections WHERE user_id = ?', (user_id,)).rowcount,
+                'settings': conn.execute('DELETE FROM user_settings WHERE user_id = ?', (user_id,)).rowcount,
+                'baselines': conn.execute('DELETE FROM user_baselines WHERE user_id = ?', (user_id,)).rowcount,
+            }
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        settings_cache.invalidate(user_id)
+        counts['archives'] = archives
+        return counts
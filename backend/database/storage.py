@@ -0,0 +1,60 @@
+"""
+Storage backend selection
+
+STORAGE_BACKEND chooses the implementation:
+- firestore (default): Cloud Firestore via FirestoreHelper
+- sqlite: local SQLite database at SQLITE_PATH (no Firebase needed)
+
+The shared instance from get_storage() coalesces concurrent identical
+reads (database.coalescing) unless STORAGE_COALESCE_READS=0.
+"""
+import os
+import threading
+from typing import Optional
+
+from database.base import StorageBackend
+
+_storage: Optional[StorageBackend] = None
+_lock = threading.Lock()
+
+
+def create_storage(backend: Optional[str] = None) -> StorageBackend:
+    """
+    Create a new storage backend instance
+
+    Args:
+        backend: Backend name; defaults to the STORAGE_BACKEND env var
+
+    Returns:
+        StorageBackend: New backend instance
+    """
+    backend = (backend or os.getenv('STORAGE_BACKEND', 'firestore')).lower()
+
+    if backend == 'sqlite':
+        from database.sqlite_backend import SQLiteStorage
+        return SQLiteStorage(os.getenv('SQLITE_PATH', 'miivvy.db'))
+
+    if backend == 'firestore':
+        from firebase.firestore_helper import FirestoreHelper
+        return FirestoreHelper()
+
+    raise ValueError(f'Unknown STORAGE_BACKEND: {backend}')
+
+
+def get_storage() -> StorageBackend:
+    """
+    Get the process-wide storage backend, creating it on first use
+
+    Returns:
+        StorageBackend: Shared backend instance
+    """
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                storage = create_storage()
+                if os.getenv('STORAGE_COALESCE_READS', '1') == '1':
+                    from database.coalescing import CoalescingStorage
+                    storage = CoalescingStorage(storage)
+                _storage = storage
+    return _storage
@@ -2,13 +2,17 @@
 Firebase initialization and configuration
 """
 import os
+import re
 import json
+import logging
 import firebase_admin
 from firebase_admin import credentials, firestore, auth, storage
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _initialized = False
 
 def initialize_firebase():
@@ -40,7 +44,6 @@ def initialize_firebase():
 
         # Method 2: Use service account JSON from environment variable
         elif os.getenv('FIREBASE_CREDENTIALS'):
-            print('@'*20)
             cred_dict = json.loads(os.getenv('FIREBASE_CREDENTIALS'))
             cred = credentials.Certificate(cred_dict)
             firebase_admin.initialize_app(cred, {
@@ -54,12 +57,12 @@ def initialize_firebase():
             })
 
         _initialized = True
-        print("✅ Firebase initialized successfully")
+        logger.info('Firebase initialized')
 
         return firestore.client()
 
     except Exception as e:
-        print(f"❌ Firebase initialization failed: {e}")
+        logger.error('Firebase initialization failed: %s', e)
         raise
 
 
@@ -97,3 +100,33 @@ def get_storage_bucket():
     if not _initialized:
         initialize_firebase()
     return storage.bucket()
+
+
+def prefetch_auth_certs(force: bool = False):
+    """
+    Load Google's ID token signing certs into firebase_admin's HTTP cache
+
+    auth.verify_id_token fetches the certs on first use and again whenever
+    the cached copy expires, blocking that request on the network.
+    Fetching them through the verifier's own cached transport ahead of
+    time keeps token verification local.
+
+    Args:
+        force: Bypass the cache and replace the cached certs
+
+    Returns:
+        Optional[int]: Seconds the certs may be cached (Cache-Control
+        max-age), or None if the response doesn't say
+    """
+    from firebase_admin import _token_gen
+
+    if not _initialized:
+        initialize_firebase()
+    # firebase_admin doesn't expose the verifier's transport publicly
+    request = auth._get_client(None)._token_verifier.request
+    headers = {'Cache-Control': 'no-cache'} if force else None
+    response = request(_token_gen.ID_TOKEN_CERT_URI, method='GET', headers=headers)
+    if response.status != 200:
+        raise RuntimeError(f'Fetching ID token certs failed with HTTP {response.status}')
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else None
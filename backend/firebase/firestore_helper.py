@@ -1,17 +1,98 @@
 """
 Firestore helper functions for CRUD operations
+
+Logs are stored in one of two layouts, chosen with LOGS_LAYOUT:
+- flat (default): one top-level `logs` collection
+- user: a subcollection per user, `users/{user_id}/logs`
+
+Timestamps only ever increase, so in the flat layout every write lands at
+the end of the same index range and Firestore throttles sustained ingest
+(roughly 500 writes/s into one sequential range). Per-user subcollections
+give every user their own index range. While migrating to the user layout
+(LOGS_READ_LEGACY=1, the default) reads also query the flat collection
+and merge the two sorted result sets.
 """
+import heapq
+import itertools
+import os
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from google.cloud.firestore_v1 import FieldFilter
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore_v1 import FieldFilter, Increment
+from google.cloud.firestore_v1.field_path import FieldPath
+from database.base import StorageBackend
 from firebase.config import get_firestore_client
+from models.event import utc_now_timestamp
+from services import cost_accounting
+from services.archive import delete_user_archives
+from services.settings_cache import settings_cache
 
 
-class FirestoreHelper:
+class FirestoreHelper(StorageBackend):
     """Helper class for Firestore operations"""
 
-    def __init__(self):
+    # Firestore allows at most 500 writes per batch
+    BATCH_SIZE = 500
+
+    LOGS_LAYOUTS = ('flat', 'user')
+
+    def __init__(self, logs_layout: Optional[str] = None, read_legacy_logs: Optional[bool] = None):
+        """
+        Args:
+            logs_layout: 'flat' or 'user'; defaults to the LOGS_LAYOUT env var
+            read_legacy_logs: In the user layout, also read the flat
+                collection; defaults to the LOGS_READ_LEGACY env var
+        """
         self.db = get_firestore_client()
+        self.logs_layout = (logs_layout or os.getenv('LOGS_LAYOUT', 'flat')).lower()
+        if self.logs_layout not in self.LOGS_LAYOUTS:
+            raise ValueError(f'Unknown LOGS_LAYOUT: {self.logs_layout}')
+        if read_legacy_logs is None:
+            read_legacy_logs = os.getenv('LOGS_READ_LEGACY', '1') == '1'
+        self.read_legacy_logs = self.logs_layout == 'user' and read_legacy_logs
+
+    def _logs(self, user_id: str):
+        """Collection a user's new logs are written to"""
+        if self.logs_layout == 'user':
+            return self.db.collection('users').document(user_id).collection('logs')
+        return self.db.collection('logs')
+
+    def _log_sources(self, user_id: str) -> List[Tuple[Any, Any]]:
+        """(collection, base query) pairs holding a user's logs"""
+        sources = []
+        if self.logs_layout == 'user':
+            collection = self._logs(user_id)
+            sources.append((collection, collection))
+        if self.logs_layout == 'flat' or self.read_legacy_logs:
+            collection = self.db.collection('logs')
+            sources.append((collection, collection.where(filter=FieldFilter('user_id', '==', user_id))))
+        return sources
+
+    def _user_log_collections(self):
+        """Every per-user logs subcollection (user layout only)"""
+        user_refs = list(self.db.collection('users').list_documents())
+        cost_accounting.record_query(len(user_refs))
+        for user_ref in user_refs:
+            yield user_ref.id, user_ref.collection('logs')
+
+    @staticmethod
+    def _stream(query) -> Iterator[Any]:
+        """query.stream(), accounting the query and a read per document"""
+        documents = 0
+        try:
+            for doc in query.stream():
+                documents += 1
+                yield doc
+        finally:
+            cost_accounting.record_query(documents)
+
+    @staticmethod
+    def _merge_logs(results: List[List[Dict[str, Any]]], limit: int, descending: bool) -> List[Dict[str, Any]]:
+        """Merge per-source result lists sorted by (timestamp, id)"""
+        if len(results) == 1:
+            return results[0]
+        merged = heapq.merge(*results, key=lambda log: (log['timestamp'], log['id']), reverse=descending)
+        return list(itertools.islice(merged, limit))
 
     # ============ Logs Collection ============
 
@@ -32,15 +113,91 @@ class FirestoreHelper:
             str: Document ID of the saved log
         """
         if 'timestamp' not in log_data:
-            log_data['timestamp'] = datetime.utcnow().isoformat()
+            log_data['timestamp'] = utc_now_timestamp()
 
         log_data['created_at'] = datetime.utcnow()
 
-        doc_ref = self.db.collection('logs').document()
+        doc_ref = self._logs(log_data['user_id']).document()
         doc_ref.set(log_data)
+        cost_accounting.record(writes=1)
 
         return doc_ref.id
 
+    def save_log_once(self, log_data: Dict[str, Any], doc_id: str) -> bool:
+        """
+        Save app usage log under a deterministic document ID
+
+        Uses a create (not set) so a second write with the same ID fails
+        instead of overwriting, which makes retried events idempotent.
+
+        Args:
+            log_data: Dictionary containing log data (see save_log)
+            doc_id: Deterministic document ID for the event
+
+        Returns:
+            bool: True if the log was created, False if it already existed
+        """
+        if 'timestamp' not in log_data:
+            log_data['timestamp'] = utc_now_timestamp()
+
+        log_data['created_at'] = datetime.utcnow()
+
+        cost_accounting.record(writes=1)
+        try:
+            self._logs(log_data['user_id']).document(doc_id).create(log_data)
+        except AlreadyExists:
+            return False
+
+        return True
+
+    def save_logs(self, entries: List[Tuple[Optional[str], Dict[str, Any]]]) -> List[Tuple[str, bool]]:
+        """
+        Save many app usage logs with batched writes
+
+        Entries with a deterministic document ID are created (not
+        overwritten). If a batch hits an existing document the whole batch
+        is rejected by Firestore, so that batch is retried one by one to
+        find the duplicates.
+
+        Args:
+            entries: List of (doc_id or None, log_data) tuples
+
+        Returns:
+            List of (document ID, created) tuples in input order
+        """
+        now = datetime.utcnow()
+        results: List[Tuple[str, bool]] = []
+
+        for start in range(0, len(entries), self.BATCH_SIZE):
+            chunk = entries[start:start + self.BATCH_SIZE]
+            refs = []
+            batch = self.db.batch()
+            for doc_id, log_data in chunk:
+                if 'timestamp' not in log_data:
+                    log_data['timestamp'] = now.isoformat()
+                log_data['created_at'] = now
+                doc_ref = self._logs(log_data['user_id']).document(doc_id)
+                if doc_id:
+                    batch.create(doc_ref, log_data)
+                else:
+                    batch.set(doc_ref, log_data)
+                refs.append(doc_ref)
+
+            cost_accounting.record(writes=len(refs))
+            try:
+                batch.commit()
+                results.extend((ref.id, True) for ref in refs)
+            except AlreadyExists:
+                for (doc_id, log_data), ref in zip(chunk, refs):
+                    if doc_id:
+                        results.append((doc_id, self.save_log_once(log_data, doc_id)))
+                    else:
+                        ref.set(log_data)
+                        cost_accounting.record(writes=1)
+                        results.append((ref.id, True))
+
+        return results
+
     def get_logs(
         self,
         user_id: str,
@@ -62,39 +219,323 @@ class FirestoreHelper:
         Returns:
             List of log dictionaries
         """
-        query = self.db.collection('logs').where(filter=FieldFilter('user_id', '==', user_id))
+        results = []
+        for _, query in self._log_sources(user_id):
+            if app_name:
+                query = query.where(filter=FieldFilter('app_name', '==', app_name))
+
+            if start_date:
+                query = query.where(filter=FieldFilter('timestamp', '>=', start_date))
+
+            if end_date:
+                query = query.where(filter=FieldFilter('timestamp', '<=', end_date))
+
+            query = (
+                query.order_by('timestamp', direction='DESCENDING')
+                .order_by(FieldPath.document_id(), direction='DESCENDING')
+                .limit(limit)
+            )
+            results.append([self._log_from_doc(doc) for doc in self._stream(query)])
+
+        return self._merge_logs(results, limit, descending=True)
+
+    def get_logs_page(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 500,
+        descending: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve one page of logs ordered by (timestamp, document ID)
+
+        Args:
+            user_id: User ID
+            start_date: Start date (ISO8601 string)
+            end_date: End date (ISO8601 string)
+            after: (timestamp, id) of the last log of the previous page
+            limit: Page size
+            descending: Newest first instead of oldest first
+
+        Returns:
+            List of log dictionaries
+        """
+        direction = 'DESCENDING' if descending else 'ASCENDING'
+        results = []
+        for collection, query in self._log_sources(user_id):
+            if start_date:
+                query = query.where(filter=FieldFilter('timestamp', '>=', start_date))
+
+            if end_date:
+                query = query.where(filter=FieldFilter('timestamp', '<=', end_date))
+
+            query = (
+                query.order_by('timestamp', direction=direction)
+                .order_by(FieldPath.document_id(), direction=direction)
+            )
+
+            if after:
+                query = query.start_after({
+                    'timestamp': after[0],
+                    FieldPath.document_id(): collection.document(after[1]),
+                })
+
+            results.append([self._log_from_doc(doc) for doc in self._stream(query.limit(limit))])
+
+        return self._merge_logs(results, limit, descending)
+
+    def get_oldest_log(self, before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the oldest log across all users
+
+        In the user layout this runs one query per user, so it is meant for
+        batch jobs (compaction), not request handling.
+
+        Args:
+            before: Only consider logs with timestamp < before (ISO8601 string)
+
+        Returns:
+            Log dictionary or None
+        """
+        queries = []
+        if self.logs_layout == 'user':
+            queries.extend(collection for _, collection in self._user_log_collections())
+        if self.logs_layout == 'flat' or self.read_legacy_logs:
+            queries.append(self.db.collection('logs'))
+
+        oldest = None
+        for query in queries:
+            if before:
+                query = query.where(filter=FieldFilter('timestamp', '<', before))
+            for doc in self._stream(query.order_by('timestamp').limit(1)):
+                log = self._log_from_doc(doc)
+                if oldest is None or log['timestamp'] < oldest['timestamp']:
+                    oldest = log
+        return oldest
+
+    def delete_logs(self, user_id: str, log_ids: List[str]) -> int:
+        """
+        Delete a user's logs by document ID using batched writes
+
+        When legacy flat logs are still read alongside the user layout, an
+        ID may live in either collection, so the existing documents are
+        looked up first and only those are deleted.
+
+        Args:
+            user_id: User ID
+            log_ids: Document IDs to delete
+
+        Returns:
+            int: Number of logs deleted
+        """
+        log_ids = list(dict.fromkeys(log_ids))
+        sources = self._log_sources(user_id)
+        if len(sources) == 1:
+            refs = [sources[0][0].document(log_id) for log_id in log_ids]
+        else:
+            refs = []
+            candidates = [collection.document(log_id) for collection, _ in sources for log_id in log_ids]
+            for start in range(0, len(candidates), self.BATCH_SIZE):
+                chunk = candidates[start:start + self.BATCH_SIZE]
+                snapshots = list(self.db.get_all(chunk, field_paths=[]))
+                cost_accounting.record(reads=len(chunk))
+                refs.extend(snapshot.reference for snapshot in snapshots if snapshot.exists)
+
+        for start in range(0, len(refs), self.BATCH_SIZE):
+            batch = self.db.batch()
+            chunk = refs[start:start + self.BATCH_SIZE]
+            for ref in chunk:
+                batch.delete(ref)
+            batch.commit()
+            cost_accounting.record(deletes=len(chunk))
+        return len(refs)
+
+    def get_active_user_ids(self, since: str) -> List[str]:
+        """
+        Get the IDs of users who logged events since a point in time
+
+        In the flat layout this reads one (projected) document per log in
+        the window, so keep the window short (e.g. the last day or week).
+        In the user layout it runs one single-document query per user.
+
+        Args:
+            since: ISO8601 lower bound (inclusive)
+
+        Returns:
+            Sorted list of user IDs
+        """
+        user_ids = set()
+        if self.logs_layout == 'user':
+            for user_id, collection in self._user_log_collections():
+                query = collection.where(filter=FieldFilter('timestamp', '>=', since)).limit(1)
+                if list(self._stream(query.select([]))):
+                    user_ids.add(user_id)
+        if self.logs_layout == 'flat' or self.read_legacy_logs:
+            query = (
+                self.db.collection('logs')
+                .where(filter=FieldFilter('timestamp', '>=', since))
+                .select(['user_id'])
+            )
+            user_ids.update(doc.to_dict().get('user_id') for doc in self._stream(query))
+        return sorted(user_ids - {None})
+
+    def move_legacy_logs(self, page_size: int = 250) -> int:
+        """
+        Move one page of logs from the flat collection to the user layout
+
+        Each log is copied to users/{user_id}/logs under the same ID and
+        deleted from the flat collection in the same batch, so a log is
+        never visible twice or lost.
+
+        Args:
+            page_size: Logs per batch (two writes each, max 250)
+
+        Returns:
+            int: Number of logs moved (0 when the flat collection is empty)
+        """
+        if self.logs_layout != 'user':
+            raise ValueError('Moving logs requires LOGS_LAYOUT=user')
+
+        docs = list(self._stream(self.db.collection('logs').limit(min(page_size, self.BATCH_SIZE // 2))))
+        if not docs:
+            return 0
+
+        batch = self.db.batch()
+        for doc in docs:
+            data = doc.to_dict()
+            batch.set(self._logs(data['user_id']).document(doc.id), data)
+            batch.delete(doc.reference)
+        batch.commit()
+        cost_accounting.record(writes=len(docs), deletes=len(docs))
+        return len(docs)
+
+    @staticmethod
+    def _log_from_doc(doc) -> Dict[str, Any]:
+        log_data = doc.to_dict()
+        log_data['id'] = doc.id
+        # created_at stays a datetime: services.json_provider encodes it
+        # natively, which is far cheaper than an isoformat() per record
+        return log_data
+
+    # ============ Log Rollups Collection ============
+
+    def save_log_rollup(self, user_id: str, month: str, rollup: Dict[str, Any]) -> None:
+        """
+        Save the summary of a user's compacted logs for one month
+
+        Args:
+            user_id: User ID
+            month: Month in YYYY-MM format
+            rollup: Summary dictionary (counts, archive path, ...)
+        """
+        rollup['user_id'] = user_id
+        rollup['month'] = month
+        rollup['updated_at'] = datetime.utcnow()
+
+        self.db.collection('log_rollups').document(f'{user_id}_{month}').set(rollup)
+        cost_accounting.record(writes=1)
+
+    def get_log_rollups(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Get all monthly rollups for a user
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            List of rollup dictionaries, oldest month first
+        """
+        query = (
+            self.db.collection('log_rollups')
+            .where(filter=FieldFilter('user_id', '==', user_id))
+            .order_by('month')
+        )
+
+        rollups = []
+        for doc in self._stream(query):
+            rollup = doc.to_dict()
+            if 'updated_at' in rollup:
+                rollup['updated_at'] = rollup['updated_at'].isoformat()
+            rollups.append(rollup)
+
+        return rollups
+
+    # ============ Sessions Collection ============
+
+    def save_sessions(self, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Save finished app usage sessions with batched writes
 
+        Args:
+            entries: List of (session ID, session) tuples; an existing
+                session with the same ID is replaced
+        """
+        now = datetime.utcnow()
+        for start in range(0, len(entries), self.BATCH_SIZE):
+            chunk = entries[start:start + self.BATCH_SIZE]
+            batch = self.db.batch()
+            for session_id, session in chunk:
+                session['created_at'] = now
+                batch.set(self.db.collection('sessions').document(session_id), session)
+            batch.commit()
+            cost_accounting.record(writes=len(chunk))
+
+    def get_sessions(
+        self,
+        user_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        app_name: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve a user's sessions, newest first
+
+        Args:
+            user_id: User ID
+            start_date: Only sessions starting at or after this (ISO8601 string)
+            end_date: Only sessions starting at or before this (ISO8601 string)
+            app_name: Filter by specific app
+            limit: Maximum number of sessions to return
+
+        Returns:
+            List of session dictionaries
+        """
+        query = self.db.collection('sessions').where(filter=FieldFilter('user_id', '==', user_id))
         if app_name:
             query = query.where(filter=FieldFilter('app_name', '==', app_name))
-
         if start_date:
-            query = query.where(filter=FieldFilter('timestamp', '>=', start_date))
-
+            query = query.where(filter=FieldFilter('start', '>=', start_date))
         if end_date:
-            query = query.where(filter=FieldFilter('timestamp', '<=', end_date))
-
-        query = query.order_by('timestamp', direction='DESCENDING').limit(limit)
+            query = query.where(filter=FieldFilter('start', '<=', end_date))
+        query = query.order_by('start', direction='DESCENDING').limit(limit)
 
-        logs = []
-        for doc in query.stream():
-            log_data = doc.to_dict()
-            log_data['id'] = doc.id
-            # Convert datetime to ISO string if present
-            if 'created_at' in log_data:
-                log_data['created_at'] = log_data['created_at'].isoformat()
-            logs.append(log_data)
+        sessions = []
+        for doc in self._stream(query):
+            session = doc.to_dict()
+            session['id'] = doc.id
+            session.pop('created_at', None)
+            sessions.append(session)
 
-        return logs
+        return sessions
 
     # ============ Analysis Collection ============
 
-    def save_analysis(self, user_id: str, analysis_data: Dict[str, Any]) -> str:
+    def new_analysis_id(self) -> str:
+        """Firestore auto ID for an analysis document, generated client-side"""
+        return self.db.collection('analyses').document().id
+
+    def save_analysis(self, user_id: str, analysis_data: Dict[str, Any], analysis_id: Optional[str] = None) -> str:
         """
         Save AI analysis result
 
         Args:
             user_id: User ID
             analysis_data: Analysis result dictionary
+            analysis_id: Document ID to use (see new_analysis_id); a new
+                auto ID if omitted
 
         Returns:
             str: Document ID
@@ -102,11 +543,40 @@ class FirestoreHelper:
         analysis_data['user_id'] = user_id
         analysis_data['created_at'] = datetime.utcnow()
 
-        doc_ref = self.db.collection('analyses').document()
+        doc_ref = self.db.collection('analyses').document(analysis_id)
         doc_ref.set(analysis_data)
+        cost_accounting.record(writes=1)
 
         return doc_ref.id
 
+    def save_analyses(self, entries: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """
+        Save many analysis results with batched writes
+
+        Args:
+            entries: List of (user_id, analysis_data) tuples
+
+        Returns:
+            List of document IDs in input order
+        """
+        now = datetime.utcnow()
+        collection = self.db.collection('analyses')
+        ids = []
+
+        for start in range(0, len(entries), self.BATCH_SIZE):
+            batch = self.db.batch()
+            chunk = entries[start:start + self.BATCH_SIZE]
+            for user_id, analysis_data in chunk:
+                analysis_data['user_id'] = user_id
+                analysis_data['created_at'] = now
+                doc_ref = collection.document()
+                batch.set(doc_ref, analysis_data)
+                ids.append(doc_ref.id)
+            batch.commit()
+            cost_accounting.record(writes=len(chunk))
+
+        return ids
+
     def get_latest_analysis(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
         Get the most recent analysis for a user
@@ -124,7 +594,7 @@ class FirestoreHelper:
             .limit(1)
         )
 
-        docs = list(query.stream())
+        docs = list(self._stream(query))
         if not docs:
             return None
 
@@ -135,6 +605,56 @@ class FirestoreHelper:
 
         return analysis
 
+    # ============ Detections Collection ============
+
+    def save_detection(self, user_id: str, detection: Dict[str, Any]) -> str:
+        """
+        Save a detection produced by the streaming rule engine
+
+        Args:
+            user_id: User ID
+            detection: Detection dictionary (rule_id, severity, message, ...)
+
+        Returns:
+            str: Document ID
+        """
+        detection['user_id'] = user_id
+        detection['created_at'] = datetime.utcnow()
+
+        doc_ref = self.db.collection('detections').document()
+        doc_ref.set(detection)
+        cost_accounting.record(writes=1)
+
+        return doc_ref.id
+
+    def get_detections(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Get a user's most recent detections
+
+        Args:
+            user_id: User ID
+            limit: Maximum number of detections to return
+
+        Returns:
+            List of detection dictionaries
+        """
+        query = (
+            self.db.collection('detections')
+            .where(filter=FieldFilter('user_id', '==', user_id))
+            .order_by('created_at', direction='DESCENDING')
+            .limit(limit)
+        )
+
+        detections = []
+        for doc in self._stream(query):
+            detection = doc.to_dict()
+            detection['id'] = doc.id
+            if 'created_at' in detection:
+                detection['created_at'] = detection['created_at'].isoformat()
+            detections.append(detection)
+
+        return detections
+
     # ============ User Settings Collection ============
 
     def save_user_settings(self, user_id: str, settings: Dict[str, Any]) -> None:
@@ -149,6 +669,8 @@ class FirestoreHelper:
 
         doc_ref = self.db.collection('user_settings').document(user_id)
         doc_ref.set(settings, merge=True)
+        cost_accounting.record(writes=1)
+        settings_cache.invalidate(user_id)
 
     def get_user_settings(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -162,6 +684,7 @@ class FirestoreHelper:
         """
         doc_ref = self.db.collection('user_settings').document(user_id)
         doc = doc_ref.get()
+        cost_accounting.record(reads=1)
 
         if not doc.exists:
             return None
@@ -172,8 +695,76 @@ class FirestoreHelper:
 
         return settings
 
+    def get_users_sharing_with(self, viewer_id: str) -> List[str]:
+        """
+        Get the users who share their logs with a viewer
+
+        Args:
+            viewer_id: User ID listed in the others' shared_with settings
+
+        Returns:
+            Sorted list of user IDs
+        """
+        query = self.db.collection('user_settings').where(
+            filter=FieldFilter('shared_with', 'array_contains', viewer_id)
+        )
+        return sorted(doc.id for doc in self._stream(query))
+
+    # ============ Baselines Collection ============
+
+    def increment_user_baseline(self, user_id: str, counters: Dict[str, Dict[str, float]]) -> None:
+        """
+        Add to a user's baseline counters with server-side increments
+
+        No read is needed and concurrent updates from several instances
+        never overwrite each other.
+
+        Args:
+            user_id: User ID
+            counters: {group: {key: amount}} to add
+        """
+        data: Dict[str, Any] = {
+            group: {key: Increment(amount) for key, amount in values.items()}
+            for group, values in counters.items()
+        }
+        data['updated_at'] = datetime.utcnow()
+
+        self.db.collection('user_baselines').document(user_id).set(data, merge=True)
+        cost_accounting.record(writes=1)
+
+    def get_user_baseline(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a user's baseline counters
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Baseline dictionary or None
+        """
+        doc = self.db.collection('user_baselines').document(user_id).get()
+        cost_accounting.record(reads=1)
+        if not doc.exists:
+            return None
+
+        baseline = doc.to_dict()
+        if 'updated_at' in baseline:
+            baseline['updated_at'] = baseline['updated_at'].isoformat()
+
+        return baseline
+
     # ============ Utility Methods ============
 
+    def warmup(self) -> None:
+        """
+        Open the Firestore channel with a single document read
+
+        The first call on a new client pays for the gRPC channel and auth
+        token setup; doing it here keeps that off the first request.
+        """
+        self.db.collection('user_settings').document('warmup-probe').get()
+        cost_accounting.record(reads=1)
+
     def delete_user_data(self, user_id: str) -> Dict[str, int]:
         """
         Delete all data for a user (GDPR compliance)
@@ -184,24 +775,64 @@ class FirestoreHelper:
         Returns:
             Dictionary with deletion counts
         """
-        counts = {'logs': 0, 'analyses': 0, 'settings': 0}
+        counts = {
+            'logs': 0, 'log_rollups': 0, 'sessions': 0, 'analyses': 0,
+            'detections': 0, 'settings': 0, 'baselines': 0,
+        }
+
+        # Delete compacted log segments first; their rollups stay until this succeeds
+        counts['archives'] = delete_user_archives(user_id)
 
         # Delete logs
-        logs_query = self.db.collection('logs').where(filter=FieldFilter('user_id', '==', user_id))
-        for doc in logs_query.stream():
+        for _, logs_query in self._log_sources(user_id):
+            for doc in self._stream(logs_query):
+                doc.reference.delete()
+                cost_accounting.record(deletes=1)
+                counts['logs'] += 1
+
+        # Delete rollups of compacted logs
+        rollups_query = self.db.collection('log_rollups').where(filter=FieldFilter('user_id', '==', user_id))
+        for doc in self._stream(rollups_query):
+            doc.reference.delete()
+            cost_accounting.record(deletes=1)
+            counts['log_rollups'] += 1
+
+        # Delete sessions
+        sessions_query = self.db.collection('sessions').where(filter=FieldFilter('user_id', '==', user_id))
+        for doc in self._stream(sessions_query):
             doc.reference.delete()
-            counts['logs'] += 1
+            cost_accounting.record(deletes=1)
+            counts['sessions'] += 1
 
         # Delete analyses
         analyses_query = self.db.collection('analyses').where(filter=FieldFilter('user_id', '==', user_id))
-        for doc in analyses_query.stream():
+        for doc in self._stream(analyses_query):
             doc.reference.delete()
+            cost_accounting.record(deletes=1)
             counts['analyses'] += 1
 
+        # Delete detections
+        detections_query = self.db.collection('detections').where(filter=FieldFilter('user_id', '==', user_id))
+        for doc in self._stream(detections_query):
+            doc.reference.delete()
+            cost_accounting.record(deletes=1)
+            counts['detections'] += 1
+
         # Delete settings
         settings_ref = self.db.collection('user_settings').document(user_id)
+        cost_accounting.record(reads=1)
         if settings_ref.get().exists:
             settings_ref.delete()
+            cost_accounting.record(deletes=1)
             counts['settings'] = 1
+        settings_cache.invalidate(user_id)
+
+        # Delete baseline profile
+        baseline_ref = self.db.collection('user_baselines').document(user_id)
+        cost_accounting.record(reads=1)
+        if baseline_ref.get().exists:
+            baseline_ref.delete()
+            cost_accounting.record(deletes=1)
+            counts['baselines'] = 1
 
         return counts
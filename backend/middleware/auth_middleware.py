@@ -71,6 +71,27 @@ def require_auth(f):
     return decorated_function
 
 
+def require_admin(f):
+    """
+    Decorator to require an authenticated user with the "admin" custom claim
+
+    Use for internal endpoints (metrics, diagnostics). Set the claim with
+    auth.set_custom_user_claims(uid, {'admin': True}).
+    """
+    @wraps(f)
+    @require_auth
+    def decorated_function(*args, **kwargs):
+        if not request.user_claims.get('admin'):
+            return jsonify({
+                'error': 'Forbidden',
+                'message': 'Admin privileges are required'
+            }), 403
+
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
 def optional_auth(f):
     """
     Decorator for endpoints where authentication is optional
@@ -0,0 +1,243 @@
+"""
+HTTP compression for responses and ingest request bodies
+
+Responses: init_compression(app) registers an after_request hook that
+compresses text-like responses (JSON, NDJSON, CSV, ...) with brotli or
+gzip, whichever the client's Accept-Encoding prefers. Buffered responses
+are only compressed from COMPRESS_MIN_BYTES up; streamed responses (the
+log export) are compressed chunk by chunk with a sync flush, so they stay
+chunked and the client can decode every chunk as soon as it arrives.
+Server-Sent Events are never compressed. Brotli needs the optional
+brotli package (uv sync --extra compression); without it only gzip is
+offered.
+
+Requests: the ingest endpoints read their body with read_json_body,
+which also accepts "Content-Encoding: gzip". The decompressed size is
+capped at the endpoint's payload limit, so a small compressed body
+can't expand into something huge (decompression bomb).
+"""
+import os
+import threading
+import zlib
+from typing import Any, Iterable, Iterator, Optional
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', '1') != '0'
+MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+# Brotli's high qualities are far too slow for dynamic responses
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'text/csv',
+    'text/html',
+    'text/plain',
+}
+
+_stats_lock = threading.Lock()
+stats = {'responses': 0, 'streamed': 0, 'bytes_in': 0, 'bytes_out': 0, 'requests_decompressed': 0}
+
+
+class PayloadTooLarge(ValueError):
+    """Raised when a request body (after decompression) exceeds its limit"""
+
+
+class UnsupportedEncoding(ValueError):
+    """Raised for a request Content-Encoding other than gzip or identity"""
+
+
+def _count(**amounts: int) -> None:
+    with _stats_lock:
+        for key, amount in amounts.items():
+            stats[key] += amount
+
+
+def metrics() -> dict:
+    with _stats_lock:
+        snapshot = dict(stats)
+    snapshot['enabled'] = COMPRESSION_ENABLED
+    snapshot['encodings'] = _available_encodings()
+    return snapshot
+
+
+# ============ Responses ============
+
+def _available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+class _GzipStream:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _compressor(encoding: str):
+    return _BrotliStream() if encoding == 'br' else _GzipStream()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a whole body with encoding ('br' or 'gzip')"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    compressor = _compressor(encoding)
+    size_in = size_out = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            out = compressor.compress(chunk)
+            size_in += len(chunk)
+            size_out += len(out)
+            if out:
+                yield out
+        out = compressor.finish()
+        size_out += len(out)
+        yield out
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        _count(bytes_in=size_in, bytes_out=size_out)
+
+
+def negotiate_encoding() -> Optional[str]:
+    """Best encoding this server and the client's Accept-Encoding share"""
+    if not request.headers.get('Accept-Encoding'):
+        return None
+    return request.accept_encodings.best_match(_available_encodings())
+
+
+def compress_response(response):
+    """after_request hook compressing eligible responses"""
+    if (
+        not COMPRESSION_ENABLED
+        or request.method == 'HEAD'
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+        or 'no-transform' in response.headers.get('Cache-Control', '')
+    ):
+        return response
+
+    # The body depends on Accept-Encoding from here on, compressed or not
+    response.vary.add('Accept-Encoding')
+
+    if not response.is_streamed and (response.content_length or 0) < MIN_BYTES:
+        return response
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+        _count(responses=1, streamed=1)
+    else:
+        data = response.get_data()
+        compressed = compress(data, encoding)
+        response.set_data(compressed)
+        _count(responses=1, bytes_in=len(data), bytes_out=len(compressed))
+
+    response.headers['Content-Encoding'] = encoding
+    if response.get_etag()[0]:
+        # A compressed body is a different representation
+        response.set_etag(response.get_etag()[0], weak=True)
+    return response
+
+
+def init_compression(app) -> None:
+    """Register response compression on the app"""
+    app.after_request(compress_response)
+
+
+# ============ Requests ============
+
+def read_json_body(max_bytes: int) -> Any:
+    """
+    Parse the request's JSON body, decompressing it if gzip-encoded
+
+    Bodies without a Content-Length (chunked uploads) are read in full up
+    to the limit, compressed or not.
+
+    Args:
+        max_bytes: Largest accepted body, measured after decompression
+
+    Returns:
+        Parsed JSON, or None if the body is missing, not JSON or corrupt
+        (like request.get_json(silent=True))
+
+    Raises:
+        PayloadTooLarge: The body (compressed or not) exceeds max_bytes
+        UnsupportedEncoding: Content-Encoding is neither gzip nor identity
+    """
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    if (request.content_length or 0) > max_bytes:
+        raise PayloadTooLarge(max_bytes)
+    if encoding == 'identity' and request.content_length is not None:
+        return request.get_json(silent=True)
+    if encoding not in ('identity', 'gzip', 'x-gzip'):
+        raise UnsupportedEncoding(encoding)
+    if not request.is_json:
+        return None
+
+    # Bounded reads on both sides: chunked uploads have no Content-Length,
+    # and max_length stops inflating as soon as the limit is passed
+    raw = request.stream.read(max_bytes + 1)
+    if len(raw) > max_bytes:
+        raise PayloadTooLarge(max_bytes)
+    if encoding == 'identity':
+        try:
+            return current_app.json.loads(raw)
+        except ValueError:
+            return None
+    decompressor = zlib.decompressobj(31)
+    try:
+        body = decompressor.decompress(raw, max_bytes + 1)
+    except zlib.error:
+        return None
+    if len(body) > max_bytes or decompressor.unconsumed_tail:
+        raise PayloadTooLarge(max_bytes)
+    if not decompressor.eof:
+        return None
+    _count(requests_decompressed=1)
+
+    try:
+        return current_app.json.loads(body)
+    except ValueError:
+        return None
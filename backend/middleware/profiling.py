@@ -0,0 +1,259 @@
+"""
+Opt-in profiling of single requests
+
+With PROFILING_ENABLED=1, a request carrying "X-Profile: sample" or
+"X-Profile: cprofile" (plus X-Profile-Token when PROFILING_TOKEN is set)
+is profiled on its own and the result is written to PROFILE_DIR:
+
+- {id}.collapsed: collapsed stacks ("frame;frame;frame value" per line)
+  for flamegraph.pl, speedscope or inferno
+- {id}.prof: pstats dump (cprofile mode only)
+- {id}.alloc.txt: tracemalloc allocation deltas, biggest first
+
+sample mode snapshots the request thread's stack every
+PROFILE_SAMPLE_INTERVAL_MS from a background thread (values are sample
+counts); overhead is low enough for production traffic. cprofile mode
+traces every call (values are microseconds), which is exact but slows
+the request down several times; its stacks are reconstructed from
+caller/callee totals, so deep recursive paths are approximate.
+
+Only one request is profiled at a time, and tracemalloc is process-wide,
+so allocation deltas include concurrent requests. The profile ID is
+returned in the X-Profile-Id response header.
+
+When PROFILING_ENABLED is off no hooks are registered, so unprofiled
+traffic pays nothing.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN_HEADER = 'X-Profile-Token'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+MODES = ('sample', 'cprofile')
+
+# Frames kept per tracemalloc traceback and allocation lines reported
+TRACEMALLOC_FRAMES = 25
+TOP_ALLOCATIONS = 30
+
+# Stacks reconstructed from cProfile stop below this share of the request
+MIN_PATH_FRACTION = 1e-4
+MAX_STACK_DEPTH = 128
+
+_busy = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval from a daemon thread"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> Dict[str, int]:
+        return dict(self.stacks)
+
+
+def collapse_pstats(stats: pstats.Stats) -> Dict[str, int]:
+    """
+    Approximate collapsed stacks (microseconds of self time) from cProfile
+
+    Each function's share under a caller is its cumulative time from that
+    caller over its total cumulative time, the same approximation
+    flameprof and gprof2dot make.
+    """
+    entries = stats.stats
+    callees: Dict[tuple, List[tuple]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+
+    def label(func) -> str:
+        filename, line, name = func
+        return f'{name} ({os.path.basename(filename)}:{line})' if line else name
+
+    stacks: Counter = Counter()
+
+    def walk(func, path: Tuple[str, ...], fraction: float, active: frozenset) -> None:
+        _, _, self_time, total_time, _ = entries[func]
+        path = path + (label(func),)
+        value = int(self_time * fraction * 1e6)
+        if value:
+            stacks[';'.join(path)] += value
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee in callees.get(func, ()):
+            if callee in active:
+                continue
+            callee_total = entries[callee][3]
+            from_here = entries[callee][4][func][3]
+            if not callee_total:
+                continue
+            share = fraction * from_here / callee_total
+            if share >= MIN_PATH_FRACTION:
+                walk(callee, path, share, active | {callee})
+
+    roots = [func for func, entry in entries.items() if not any(c in entries for c in entry[4])]
+    for root in roots:
+        walk(root, (), 1.0, frozenset([root]))
+    return dict(stacks)
+
+
+class RequestProfile:
+    """Profiler state for the request being profiled"""
+
+    def __init__(self, mode: str, interval: float):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.memory_before = tracemalloc.take_snapshot()
+        self.sampler: Optional[StackSampler] = None
+        self.profiler: Optional[cProfile.Profile] = None
+        if mode == 'sample':
+            self.sampler = StackSampler(threading.get_ident(), interval)
+            self.sampler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def finish(self, directory: str, profile_id: str) -> None:
+        """Stop profiling and write the profile files"""
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        elapsed = time.perf_counter() - self.started
+        memory_after = tracemalloc.take_snapshot()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, profile_id)
+        if self.profiler is not None:
+            stats = pstats.Stats(self.profiler)
+            stats.dump_stats(base + '.prof')
+            stacks = collapse_pstats(stats)
+        else:
+            stacks = self.sampler.collapsed()
+        _write_collapsed(base + '.collapsed', stacks)
+
+        # Leave out the profiler's own bookkeeping
+        ignore = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        differences = memory_after.filter_traces(ignore).compare_to(
+            self.memory_before.filter_traces(ignore), 'lineno'
+        )
+        with open(base + '.alloc.txt', 'w') as f:
+            f.write(f'# {profile_id}: {elapsed * 1000:.1f} ms, mode={self.mode}\n')
+            f.write(f'# net allocated: {sum(d.size_diff for d in differences) / 1024:.1f} KiB\n')
+            for difference in differences[:TOP_ALLOCATIONS]:
+                f.write(f'{difference}\n')
+
+
+def _write_collapsed(path: str, stacks: Dict[str, int]) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        for stack, value in sorted(stacks.items()):
+            f.write(f'{stack} {value}\n')
+    os.replace(tmp_path, path)
+
+
+def _profile_id(mode: str) -> str:
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    slug = ''.join(c if c.isalnum() else '_' for c in rule.strip('/')) or 'root'
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    return f'{stamp}-{request.method.lower()}-{slug}-{mode}'
+
+
+def init_profiling(app) -> None:
+    """Register the profiling hooks if PROFILING_ENABLED=1"""
+    if os.getenv('PROFILING_ENABLED', '0') != '1':
+        return
+
+    directory = os.getenv('PROFILE_DIR', './profiles')
+    interval = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5)) / 1000.0
+    token = os.getenv('PROFILING_TOKEN')
+
+    @app.before_request
+    def start_profile():
+        mode = request.headers.get(PROFILE_HEADER, '').strip().lower()
+        if mode not in MODES:
+            return
+        if token and not hmac.compare_digest(request.headers.get(PROFILE_TOKEN_HEADER, ''), token):
+            return
+        # One profiled request at a time; others just run normally
+        if not _busy.acquire(blocking=False):
+            return
+        try:
+            g.request_profile = RequestProfile(mode, interval)
+        except Exception:
+            _busy.release()
+            raise
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return response
+        try:
+            profile_id = _profile_id(profile.mode)
+            profile.finish(directory, profile_id)
+            response.headers[PROFILE_ID_HEADER] = profile_id
+        except Exception as e:
+            logger.warning('Writing profile failed: %s', e)
+        finally:
+            _busy.release()
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc=None):
+        # after_request doesn't run when a request fails hard
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            if profile.profiler is not None:
+                profile.profiler.disable()
+            if profile.sampler is not None:
+                profile.sampler.stop()
+            if profile.started_tracemalloc:
+                tracemalloc.stop()
+            _busy.release()
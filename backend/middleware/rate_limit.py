@@ -0,0 +1,214 @@
+"""
+Token-bucket rate limiting for unauthenticated endpoints
+
+Buckets are keyed by scope (e.g. "user" or "ip") and identifier. The
+limiter talks to a pluggable backend; LocalRateLimitBackend keeps buckets
+in process memory and is used by default. A shared backend (e.g. one
+backed by Memorystore/Redis) only has to implement RateLimitBackend.consume
+to enforce limits across Cloud Run instances.
+"""
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from flask import jsonify, request
+
+
+class RateLimitBackend(ABC):
+    """Interface for token-bucket storage"""
+
+    @abstractmethod
+    def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """
+        Try to take cost tokens from the bucket identified by key
+
+        Args:
+            key: Bucket key
+            rate: Refill rate in tokens per second
+            capacity: Maximum number of tokens (burst size)
+            cost: Number of tokens to take
+
+        Returns:
+            float: 0.0 if the tokens were taken, otherwise the number of
+            seconds until enough tokens will be available
+        """
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    In-process token buckets
+
+    Buckets are spread over a fixed number of lock stripes so concurrent
+    requests for different keys rarely contend, and each stripe holds at
+    most max_keys // stripes buckets (least recently used are dropped, which
+    only ever hands a key a fresh, full bucket).
+    """
+
+    def __init__(self, max_keys: int = 100000, stripes: int = 64):
+        self._stripes = [
+            (threading.Lock(), OrderedDict()) for _ in range(stripes)
+        ]
+        self._per_stripe = max(1, max_keys // stripes)
+
+    def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        lock, buckets = self._stripes[hash(key) % len(self._stripes)]
+        now = time.monotonic()
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+                buckets[key] = bucket = [tokens, now]
+                if len(buckets) > self._per_stripe:
+                    buckets.popitem(last=False)
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                buckets.move_to_end(key)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return 0.0
+            bucket[0] = tokens
+        if rate <= 0 or cost > capacity:
+            return float('inf')
+        return (cost - tokens) / rate
+
+
+class RateLimiter:
+    """
+    Applies per-scope token-bucket limits and records metrics
+
+    Usage:
+        limiter = RateLimiter({'ip': (10.0, 120)})
+        retry_after = limiter.check('ip', '203.0.113.7')
+        if retry_after:
+            return rate_limited_response(retry_after)
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        backend: Optional[RateLimitBackend] = None,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            limits: Mapping of scope -> (rate per second, burst capacity).
+                A rate of 0 disables limiting for that scope.
+            backend: Bucket storage (defaults to LocalRateLimitBackend)
+            enabled: Master switch
+        """
+        self.limits = dict(limits)
+        self.backend = backend or LocalRateLimitBackend()
+        self.enabled = enabled
+        self._metrics_lock = threading.Lock()
+        self._allowed: Dict[str, int] = {scope: 0 for scope in self.limits}
+        self._rejected: Dict[str, int] = {scope: 0 for scope in self.limits}
+        self._backend_errors = 0
+
+    def check(self, scope: str, identifier: str, cost: float = 1.0) -> float:
+        """
+        Take cost tokens for identifier in scope
+
+        Backend failures fail open so a broken shared store never takes the
+        webhook down with it.
+
+        Returns:
+            float: 0.0 if allowed, otherwise seconds the client should wait
+        """
+        limit = self.limits.get(scope)
+        if not self.enabled or not limit or limit[0] <= 0:
+            return 0.0
+
+        rate, capacity = limit
+        try:
+            retry_after = self.backend.consume(f'{scope}:{identifier}', rate, capacity, cost)
+        except Exception:
+            with self._metrics_lock:
+                self._backend_errors += 1
+            return 0.0
+
+        with self._metrics_lock:
+            if retry_after:
+                self._rejected[scope] = self._rejected.get(scope, 0) + 1
+            else:
+                self._allowed[scope] = self._allowed.get(scope, 0) + 1
+        return retry_after
+
+    def capacity(self, scope: str) -> Optional[float]:
+        """
+        Burst size of scope, or None if it isn't limited
+
+        A single check costing more than this can never succeed.
+        """
+        limit = self.limits.get(scope)
+        if not self.enabled or not limit or limit[0] <= 0:
+            return None
+        return limit[1]
+
+    def metrics(self) -> Dict[str, object]:
+        """Snapshot of limiter configuration and counters"""
+        with self._metrics_lock:
+            return {
+                'enabled': self.enabled,
+                'backend': type(self.backend).__name__,
+                'limits': {
+                    scope: {'rate_per_second': rate, 'burst': capacity}
+                    for scope, (rate, capacity) in self.limits.items()
+                },
+                'allowed': dict(self._allowed),
+                'rejected': dict(self._rejected),
+                'backend_errors': self._backend_errors,
+            }
+
+
+def client_ip() -> str:
+    """
+    Best-effort client IP for the current request
+
+    Cloud Run's front end appends the real client address to
+    X-Forwarded-For; TRUSTED_PROXY_COUNT controls how many entries from the
+    right are trusted so a client can't spoof its way into another bucket.
+    """
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    trusted = int(os.getenv('TRUSTED_PROXY_COUNT', 1))
+    if forwarded and trusted > 0:
+        hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+        if len(hops) >= trusted:
+            return hops[-trusted]
+    return request.remote_addr or 'unknown'
+
+
+def rate_limited_response(retry_after: float):
+    """429 response with a Retry-After header (whole seconds, at least 1)"""
+    seconds = 3600 if math.isinf(retry_after) else max(1, math.ceil(retry_after))
+    response = jsonify({
+        'error': 'Too many requests',
+        'message': f'Rate limit exceeded. Retry after {seconds} seconds',
+        'retry_after': seconds
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+def _per_minute(name: str, default: float) -> float:
+    return float(os.getenv(name, default)) / 60.0
+
+
+webhook_limiter = RateLimiter(
+    limits={
+        'user': (
+            _per_minute('WEBHOOK_USER_RATE_PER_MINUTE', 60),
+            float(os.getenv('WEBHOOK_USER_BURST', 30)),
+        ),
+        'ip': (
+            _per_minute('WEBHOOK_IP_RATE_PER_MINUTE', 600),
+            float(os.getenv('WEBHOOK_IP_BURST', 120)),
+        ),
+    },
+    enabled=os.getenv('RATE_LIMIT_ENABLED', '1') != '0',
+)
@@ -0,0 +1,267 @@
+"""
+Structured JSON logging that never blocks request threads
+
+init_logging(app) routes the root logger through a bounded queue: request
+threads only put the record on the queue (dropping it if the queue is
+full) and a background QueueListener formats and writes it to stdout as
+one JSON object per line, which Cloud Logging parses into structured
+entries. Tracebacks are formatted on the writer thread too.
+
+Every record carries the request's correlation ID: the incoming
+X-Request-ID header if it looks sane, else the trace ID of Cloud Run's
+X-Cloud-Trace-Context, else a new random ID. It is echoed back in the
+X-Request-ID response header.
+
+Repetitive warnings and errors are sampled: per logger, message template
+and exception type, the first LOG_SAMPLE_BURST records in each
+LOG_SAMPLE_WINDOW_SECONDS are kept, then one in LOG_SAMPLE_EVERY. The next
+kept record reports how many were skipped in 'sampled_out'.
+
+LOG_LEVEL sets the root level (INFO by default) and LOG_FORMAT=text
+switches to plain lines for local development.
+"""
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from flask import g, request
+
+from services import json_provider
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+TRACE_HEADER = 'X-Cloud-Trace-Context'
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+SAMPLE_WINDOW = float(os.getenv('LOG_SAMPLE_WINDOW_SECONDS', 60))
+SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', 10))
+SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', 100))
+
+# Cloud Logging links entries to traces with this field
+GOOGLE_CLOUD_PROJECT = os.getenv('GOOGLE_CLOUD_PROJECT')
+
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'request_id', 'trace_id', 'sampled_out',
+}
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('trace_id', default=None)
+
+stats = {'queued': 0, 'dropped': 0, 'sampled_out': 0}
+_stats_lock = threading.Lock()
+
+_listener: Optional[QueueListener] = None
+
+
+def _count(key: str, amount: int = 1) -> None:
+    with _stats_lock:
+        stats[key] += amount
+
+
+def metrics() -> Dict[str, object]:
+    with _stats_lock:
+        snapshot = dict(stats)
+    snapshot['level'] = LOG_LEVEL
+    snapshot['queue_size'] = QUEUE_SIZE
+    return snapshot
+
+
+# ============ Handlers and filters ============
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the correlation ID of the current request"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        record.trace_id = _trace_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a burst of each repetitive warning/error, then one in N"""
+
+    def __init__(self, window: float, burst: int, every: int, max_keys: int = 10000):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.every = max(1, every)
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        # key -> [records seen this window, records skipped since the last kept one]
+        self._counts: Dict[Tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg), exc_type)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_start >= self.window or len(self._counts) >= self.max_keys:
+                self._window_start = now
+                self._counts.clear()
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0, 0]
+            counts[0] += 1
+            seen = counts[0]
+            if seen > self.burst and (seen - self.burst) % self.every:
+                counts[1] += 1
+                skipped = None
+            else:
+                skipped, counts[1] = counts[1], 0
+        if skipped is None:
+            _count('sampled_out')
+            return False
+        if skipped:
+            record.sampled_out = skipped
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of waiting when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments here; formatting (and reading source
+        # lines for tracebacks) is left to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            _count('queued')
+        except queue.Full:
+            _count('dropped')
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, in Cloud Logging's structured layout"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'severity': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id and GOOGLE_CLOUD_PROJECT:
+            entry['logging.googleapis.com/trace'] = f'projects/{GOOGLE_CLOUD_PROJECT}/traces/{trace_id}'
+        if getattr(record, 'sampled_out', None):
+            entry['sampled_out'] = record.sampled_out
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json_provider.dumps(entry, default=repr)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain lines for local development, with the correlation ID when there is one"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        request_id = getattr(record, 'request_id', None)
+        return f'{line} [{request_id}]' if request_id else line
+
+
+# ============ Setup ============
+
+def configure_logging() -> None:
+    """Route the root logger through the queue and start the writer thread (once)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(QUEUE_SIZE)
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JSONFormatter())
+
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(SAMPLE_WINDOW, SAMPLE_BURST, SAMPLE_EVERY))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    # Write what is still queued on shutdown
+    atexit.register(_listener.stop)
+
+
+def _request_ids() -> Tuple[str, Optional[str]]:
+    trace_id = None
+    trace = request.headers.get(TRACE_HEADER)
+    if trace:
+        trace_id = trace.split('/', 1)[0] or None
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    if not _REQUEST_ID_PATTERN.match(request_id):
+        request_id = trace_id or uuid.uuid4().hex
+    return request_id, trace_id
+
+
+def _start_request() -> None:
+    request_id, trace_id = _request_ids()
+    g.request_id = request_id
+    g.log_context_tokens = (_request_id.set(request_id), _trace_id.set(trace_id))
+
+
+def _add_request_id(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+def _finish_request(exc=None) -> None:
+    tokens = g.pop('log_context_tokens', None)
+    if tokens is None:
+        return
+    try:
+        _request_id.reset(tokens[0])
+        _trace_id.reset(tokens[1])
+    except ValueError:
+        # Torn down from another context (e.g. a streamed response)
+        _request_id.set(None)
+        _trace_id.set(None)
+
+
+def init_logging(app) -> None:
+    """Configure structured logging and correlation IDs for the app"""
+    configure_logging()
+    app.before_request(_start_request)
+    app.after_request(_add_request_id)
+    app.teardown_request(_finish_request)
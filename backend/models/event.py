@@ -0,0 +1,194 @@
+"""
+App usage event model for the ingest path
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Dict, Optional
+
+
+class EventType(str, Enum):
+    """Kinds of app usage events sent by iOS Shortcuts"""
+    OPENED = 'opened'
+    CLOSED = 'closed'
+    NOTIFICATION = 'notification'
+
+
+class AppName(str, Enum):
+    """Apps that can be monitored (matches MonitoredApp ids in the Flutter app)"""
+    LINE = 'line'
+    INSTAGRAM = 'instagram'
+    X = 'x'
+    FACEBOOK = 'facebook'
+    TIKTOK = 'tiktok'
+    DISCORD = 'discord'
+
+
+# Values older shortcuts and clients still send
+_EVENT_TYPE_ALIASES = {
+    'app_opened': EventType.OPENED,
+    'open': EventType.OPENED,
+    'app_closed': EventType.CLOSED,
+    'close': EventType.CLOSED,
+}
+_APP_NAME_ALIASES = {
+    'twitter': AppName.X,
+}
+
+REQUIRED_FIELDS = ['user_id', 'app_name', 'event_type']
+
+MAX_USER_ID_LENGTH = 128
+MAX_TIMESTAMP_LENGTH = 64
+
+# Upper bounds on request bodies, checked before JSON parsing
+MAX_EVENT_BYTES = 4 * 1024
+MAX_BATCH_EVENTS = 100
+MAX_BATCH_BYTES = 256 * 1024
+
+
+class EventValidationError(ValueError):
+    """Raised when a webhook payload is not a valid app event"""
+
+
+def parse_event_type(value: Any) -> EventType:
+    """Parse an event type (case-insensitive, accepts legacy aliases)"""
+    if isinstance(value, str):
+        key = value.strip().lower()
+        try:
+            return EventType(key)
+        except ValueError:
+            if key in _EVENT_TYPE_ALIASES:
+                return _EVENT_TYPE_ALIASES[key]
+    raise EventValidationError(
+        f"Invalid event_type. Expected one of: {', '.join(e.value for e in EventType)}"
+    )
+
+
+def parse_app_name(value: Any) -> AppName:
+    """Parse an app name (case-insensitive, accepts legacy aliases)"""
+    if isinstance(value, str):
+        key = value.strip().lower()
+        try:
+            return AppName(key)
+        except ValueError:
+            if key in _APP_NAME_ALIASES:
+                return _APP_NAME_ALIASES[key]
+    raise EventValidationError(
+        f"Unsupported app_name. Expected one of: {', '.join(a.value for a in AppName)}"
+    )
+
+
+def normalize_timestamp(value: Any) -> str:
+    """
+    Normalize an ISO8601 timestamp to fixed-width UTC
+
+    Naive timestamps are taken as UTC. The fixed-width output
+    (e.g. 2025-01-20T12:00:00.000000+00:00) sorts lexicographically in
+    chronological order, which the timestamp range queries rely on.
+    """
+    if not isinstance(value, str) or len(value) > MAX_TIMESTAMP_LENGTH:
+        raise EventValidationError('Invalid timestamp. Expected an ISO8601 string')
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise EventValidationError('Invalid timestamp. Expected an ISO8601 string') from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+
+def stored_epoch(value: Any) -> Optional[float]:
+    """
+    Epoch seconds of a stored timestamp, or None if it doesn't parse
+
+    Logs stored before timestamps were validated can hold anything (the
+    generated shortcut sent a literal "{{current_date}}"); readers skip
+    those instead of failing.
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def utc_now_timestamp() -> str:
+    """Current time in the same fixed-width format as normalize_timestamp"""
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+@dataclass(slots=True)
+class AppEvent:
+    """
+    A validated app usage event
+
+    Only these fields are ever persisted, so unknown payload keys are
+    dropped at the edge.
+    """
+    user_id: str
+    app_name: AppName
+    event_type: EventType
+    timestamp: Optional[str] = None
+
+    @classmethod
+    def from_payload(cls, data: Any) -> 'AppEvent':
+        """
+        Validate a webhook payload and build an event
+
+        Shortcuts generated by /api/shortcuts send "app_id" instead of
+        "app_name"; both are accepted. They also send an unexpanded
+        "{{current_date}}" placeholder as the timestamp, so a device
+        timestamp that isn't ISO8601 is dropped and the server's receive
+        time is used instead of rejecting the event.
+
+        Args:
+            data: Decoded JSON payload
+
+        Returns:
+            AppEvent: Parsed event (timestamp is None if not provided or unparseable)
+
+        Raises:
+            EventValidationError: If the payload is malformed
+        """
+        if not isinstance(data, dict):
+            raise EventValidationError('Event must be a JSON object')
+
+        if 'app_name' not in data and 'app_id' in data:
+            data = {**data, 'app_name': data['app_id']}
+        missing = [field for field in REQUIRED_FIELDS if field not in data]
+        if missing:
+            raise EventValidationError(f"Missing required fields: {', '.join(missing)}")
+
+        user_id = data.get('user_id')
+        if not isinstance(user_id, str) or not user_id.strip():
+            raise EventValidationError('Invalid user_id')
+        user_id = user_id.strip()
+        if len(user_id) > MAX_USER_ID_LENGTH or '/' in user_id or not user_id.isprintable():
+            raise EventValidationError('Invalid user_id')
+
+        timestamp = data.get('timestamp')
+        if timestamp:
+            try:
+                timestamp = normalize_timestamp(timestamp)
+            except EventValidationError:
+                timestamp = None
+
+        return cls(
+            user_id=user_id,
+            app_name=parse_app_name(data['app_name']),
+            event_type=parse_event_type(data.get('event_type')),
+            timestamp=timestamp or None,
+        )
+
+    def to_document(self) -> Dict[str, Any]:
+        """Firestore document fields for this event"""
+        doc = {
+            'user_id': self.user_id,
+            'app_name': self.app_name.value,
+            'event_type': self.event_type.value,
+        }
+        if self.timestamp is not None:
+            doc['timestamp'] = self.timestamp
+        return doc
@@ -1,22 +1,33 @@
 """
 AI Analysis endpoint for analyzing app usage patterns
 """
+import logging
+import os
+
 from flask import Blueprint, request, jsonify
 from middleware.auth_middleware import require_auth
-from firebase.firestore_helper import FirestoreHelper
+from models.event import EventValidationError, normalize_timestamp
+from services.analysis import build_analysis
+from services.analysis_loader import load_analysis_inputs
+from services.pubsub import publish_to_user
+from services.single_flight import SingleFlight
+from services.write_behind import analysis_writes
 
 analyze_bp = Blueprint('analyze', __name__)
+logger = logging.getLogger(__name__)
+# Identical analyses within this window share one result and one saved document
+analysis_flight = SingleFlight(result_ttl=float(os.getenv('ANALYZE_DEDUP_SECONDS', 10)))
 firestore = None  # 遅延初期化
 
 def get_firestore():
-    """Firestoreヘルパーの遅延初期化"""
+    """ストレージバックエンドの遅延初期化（STORAGE_BACKENDで切り替え）"""
     global firestore
     if firestore is None:
         try:
-            from firebase.firestore_helper import FirestoreHelper
-            firestore = FirestoreHelper()
+            from database.storage import get_storage
+            firestore = get_storage()
         except Exception as e:
-            print(f"Warning: Firestore initialization failed: {e}")
+            logger.warning('Storage initialization failed: %s', e)
             firestore = None
     return firestore
 
@@ -46,33 +57,23 @@ def analyze_logs():
         start_date = time_range.get('start')
         end_date = time_range.get('end')
 
-        # Fetch logs from Firestore
-        fs = get_firestore()
-        if fs:
-            logs = fs.get_logs(
-                user_id=user_id,
-                start_date=start_date,
-                end_date=end_date,
-                limit=100
-            )
-        else:
-            # Firestoreが利用できない場合
-            logs = []
-
-        # TODO: Implement AI analysis with OpenAI API
-        # For now, return basic analysis
-        analysis_result = {
-            'suspicious_activity': False,
-            'summary': f'Analyzed {len(logs)} events. No unusual activity detected.',
-            'details': [],
-            'log_count': len(logs)
-        }
+        # 保存時と同じ形式に揃えてから検索する
+        try:
+            if start_date:
+                start_date = normalize_timestamp(start_date)
+            if end_date:
+                end_date = normalize_timestamp(end_date)
+        except EventValidationError as e:
+            return jsonify({
+                'error': 'Invalid time_range',
+                'message': str(e)
+            }), 400
 
-        # Save analysis result to Firestore
-        if fs:
-            analysis_id = fs.save_analysis(user_id, analysis_result)
-        else:
-            analysis_id = "firestore_unavailable"
+        # 同じユーザー・期間の分析は実行中のものに相乗りし、直後の重複リクエストも保存し直さない
+        analysis_result, analysis_id = analysis_flight.do(
+            (user_id, start_date, end_date),
+            lambda: _run_analysis(get_firestore(), user_id, start_date, end_date)
+        )
 
         return jsonify({
             'status': 'success',
@@ -85,3 +86,31 @@ def analyze_logs():
             'error': 'Internal server error',
             'message': str(e)
         }), 500
+
+
+def _run_analysis(fs, user_id: str, start_date, end_date):
+    """Load inputs, analyze, queue the save and publish; returns (analysis, analysis_id)"""
+    # ログ・セッション・ベースライン・前回の分析・設定は並行して読み込む
+    inputs = load_analysis_inputs(fs, user_id, start_date, end_date)
+    analysis_result = build_analysis(
+        inputs.logs,
+        inputs.baseline,
+        sessions=inputs.sessions,
+        previous=inputs.previous,
+        settings=inputs.settings
+    )
+
+    # 保存は書き込みキューに任せ、IDだけ先に決めて応答する
+    if fs:
+        analysis_id = fs.new_analysis_id()
+        analysis_writes.submit(fs.save_analysis, user_id, dict(analysis_result), analysis_id)
+    else:
+        analysis_id = "firestore_unavailable"
+
+    publish_to_user(user_id, 'analysis', {
+        'id': analysis_id,
+        'suspicious_activity': analysis_result['suspicious_activity'],
+        'summary': analysis_result['summary'],
+        'log_count': analysis_result['log_count'],
+    })
+    return analysis_result, analysis_id
@@ -0,0 +1,56 @@
+"""
+Detections endpoint for retrieving rule-engine hits
+"""
+import logging
+from flask import Blueprint, request, jsonify
+from middleware.auth_middleware import require_auth
+
+detections_bp = Blueprint('detections', __name__)
+logger = logging.getLogger(__name__)
+firestore = None  # 遅延初期化
+
+def get_firestore():
+    """ストレージバックエンドの遅延初期化（STORAGE_BACKENDで切り替え）"""
+    global firestore
+    if firestore is None:
+        try:
+            from database.storage import get_storage
+            firestore = get_storage()
+        except Exception as e:
+            logger.warning('Storage initialization failed: %s', e)
+            firestore = None
+    return firestore
+
+@detections_bp.route('/detections', methods=['GET'])
+@require_auth
+def get_detections():
+    """
+    Retrieve suspicious-activity detections for authenticated user
+
+    Detections are written by the streaming rule engine as events arrive
+    at /api/webhook (quiet-hours use, bursts of opens, app hopping).
+
+    Query parameters:
+    - limit: integer (optional) - number of records to return (default: 50)
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token>
+    """
+    try:
+        user_id = request.user_id
+        limit = int(request.args.get('limit', 50))
+
+        fs = get_firestore()
+        detections = fs.get_detections(user_id, limit=limit) if fs else []
+
+        return jsonify({
+            'status': 'success',
+            'detections': detections,
+            'count': len(detections)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
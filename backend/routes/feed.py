@@ -0,0 +1,91 @@
+"""
+Feed endpoint merging the logs of linked accounts
+"""
+import logging
+from flask import Blueprint, request, jsonify
+from middleware.auth_middleware import require_auth
+from models.event import EventValidationError, normalize_timestamp
+from services.feed import FeedError, feed_page, feed_user_ids
+
+feed_bp = Blueprint('feed', __name__)
+logger = logging.getLogger(__name__)
+firestore = None  # 遅延初期化
+
+def get_firestore():
+    """ストレージバックエンドの遅延初期化（STORAGE_BACKENDで切り替え）"""
+    global firestore
+    if firestore is None:
+        try:
+            from database.storage import get_storage
+            firestore = get_storage()
+        except Exception as e:
+            logger.warning('Storage initialization failed: %s', e)
+            firestore = None
+    return firestore
+
+@feed_bp.route('/feed', methods=['GET'])
+@require_auth
+def get_feed():
+    """
+    Retrieve the authenticated user's logs merged with those of every user
+    who shares with them (user_settings.shared_with), newest first
+
+    Query parameters:
+    - limit: integer (optional) - number of records to return (default: 50)
+    - cursor: next_cursor of the previous page (optional)
+    - start_date: ISO8601 string (optional)
+    - end_date: ISO8601 string (optional)
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token>
+    """
+    try:
+        user_id = request.user_id
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        cursor = request.args.get('cursor')
+
+        try:
+            limit = int(request.args.get('limit', 50))
+            if start_date:
+                start_date = normalize_timestamp(start_date)
+            if end_date:
+                end_date = normalize_timestamp(end_date)
+        except (EventValidationError, ValueError) as e:
+            return jsonify({
+                'error': 'Invalid query parameter',
+                'message': str(e)
+            }), 400
+
+        fs = get_firestore()
+        if fs:
+            user_ids = feed_user_ids(fs, user_id)
+            try:
+                logs, next_cursor = feed_page(
+                    fs, user_ids,
+                    limit=limit,
+                    cursor=cursor,
+                    start_date=start_date,
+                    end_date=end_date
+                )
+            except FeedError as e:
+                return jsonify({
+                    'error': 'Invalid query parameter',
+                    'message': str(e)
+                }), 400
+        else:
+            user_ids, logs, next_cursor = [user_id], [], None
+
+        return jsonify({
+            'status': 'success',
+            'logs': logs,
+            'count': len(logs),
+            'users': user_ids,
+            'next_cursor': next_cursor
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
@@ -1,22 +1,26 @@
 """
 Logs endpoint for retrieving app usage history
 """
-from flask import Blueprint, request, jsonify
+import logging
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from middleware.auth_middleware import require_auth
-from firebase.firestore_helper import FirestoreHelper
+from models.event import EventValidationError, normalize_timestamp, parse_app_name
+from services.archive import get_logs_with_archive
+from services.export import EXPORT_FORMATS, ExportError, export_chunks
 
 logs_bp = Blueprint('logs', __name__)
+logger = logging.getLogger(__name__)
 firestore = None  # 遅延初期化
 
 def get_firestore():
-    """Firestoreヘルパーの遅延初期化"""
+    """ストレージバックエンドの遅延初期化（STORAGE_BACKENDで切り替え）"""
     global firestore
     if firestore is None:
         try:
-            from firebase.firestore_helper import FirestoreHelper
-            firestore = FirestoreHelper()
+            from database.storage import get_storage
+            firestore = get_storage()
         except Exception as e:
-            print(f"Warning: Firestore initialization failed: {e}")
+            logger.warning('Storage initialization failed: %s', e)
             firestore = None
     return firestore
 
@@ -45,10 +49,26 @@ def get_logs():
         app_name = request.args.get('app_name')
         limit = int(request.args.get('limit', 100))
 
+        # 保存時と同じ形式に揃えてから検索する
+        try:
+            if start_date:
+                start_date = normalize_timestamp(start_date)
+            if end_date:
+                end_date = normalize_timestamp(end_date)
+            if app_name:
+                app_name = parse_app_name(app_name).value
+        except EventValidationError as e:
+            return jsonify({
+                'error': 'Invalid query parameter',
+                'message': str(e)
+            }), 400
+
         # Fetch logs from Firestore
         fs = get_firestore()
         if fs:
-            logs = fs.get_logs(
+            # 圧縮済みの古い期間はアーカイブから補完
+            logs = get_logs_with_archive(
+                fs,
                 user_id=user_id,
                 start_date=start_date,
                 end_date=end_date,
@@ -70,3 +90,82 @@ def get_logs():
             'error': 'Internal server error',
             'message': str(e)
         }), 500
+
+
+@logs_bp.route('/logs/export', methods=['GET'])
+@require_auth
+def export_logs():
+    """
+    Stream the authenticated user's full log history (oldest first)
+
+    Query parameters:
+    - format: ndjson (default) | csv | parquet
+    - start_date: ISO8601 string (optional)
+    - end_date: ISO8601 string (optional)
+    - cursor: "<timestamp>|<id>" of the last record already received
+      (optional) - resumes an interrupted export right after it
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token>
+    """
+    try:
+        user_id = request.user_id
+        fmt = request.args.get('format', 'ndjson').lower()
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        cursor = request.args.get('cursor')
+
+        try:
+            if start_date:
+                start_date = normalize_timestamp(start_date)
+            if end_date:
+                end_date = normalize_timestamp(end_date)
+        except EventValidationError as e:
+            return jsonify({
+                'error': 'Invalid query parameter',
+                'message': str(e)
+            }), 400
+
+        fs = get_firestore()
+        if not fs:
+            return jsonify({
+                'error': 'Storage unavailable',
+                'message': 'Export requires a storage backend'
+            }), 503
+
+        try:
+            chunks = export_chunks(
+                fs, user_id, fmt,
+                start_date=start_date,
+                end_date=end_date,
+                cursor=cursor,
+                header=not cursor
+            )
+            # Pull the first chunk now so format/dependency errors become a
+            # proper 400 instead of a broken stream
+            first = next(chunks, b'')
+        except ExportError as e:
+            return jsonify({
+                'error': 'Invalid export request',
+                'message': str(e)
+            }), 400
+
+        # Keep the request context (and its cost accounting scope) open
+        # while the rest of the export streams
+        @stream_with_context
+        def generate():
+            if first:
+                yield first
+            yield from chunks
+
+        mimetype, extension = EXPORT_FORMATS[fmt]
+        return Response(generate(), mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename="miivvy_logs.{extension}"',
+            'Cache-Control': 'no-store',
+        })
+
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
@@ -0,0 +1,79 @@
+"""
+Internal metrics endpoint for operators
+"""
+from flask import Blueprint, jsonify, request
+from middleware import compression, structured_logging
+from middleware.auth_middleware import require_admin
+from middleware.rate_limit import webhook_limiter
+from routes.analyze import analysis_flight
+from services import cost_accounting, traffic_capture
+from services.sessions import sessionizer
+from services.settings_cache import settings_cache
+from services.timeline import timeline_cache
+from services.warmup import cert_refresher, warmup
+from services.write_behind import analysis_writes
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@require_admin
+def get_metrics():
+    """
+    GET /api/metrics
+
+    Process-local counters for this instance (admin only)
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token> (requires "admin" claim)
+    """
+    from database.storage import get_storage
+
+    # Only the CoalescingStorage wrapper has a flight
+    storage_flight = getattr(get_storage(), 'flight', None)
+    return jsonify({
+        'status': 'success',
+        'rate_limit': webhook_limiter.metrics(),
+        'compression': compression.metrics(),
+        'settings_cache': dict(settings_cache.stats),
+        'sessions': sessionizer.metrics(),
+        'timeline_cache': timeline_cache.metrics(),
+        'single_flight': {
+            'storage_reads': dict(storage_flight.stats) if storage_flight else None,
+            'analyses': dict(analysis_flight.stats),
+        },
+        'warmup': warmup.status(),
+        'auth_cert_refresh': cert_refresher.status(),
+        'logging': structured_logging.metrics(),
+        'traffic_capture': traffic_capture.metrics(),
+        'analysis_writes': analysis_writes.metrics(),
+    }), 200
+
+
+@metrics_bp.route('/metrics/firestore', methods=['GET'])
+@require_admin
+def get_firestore_costs():
+    """
+    GET /api/metrics/firestore?top=20
+
+    Firestore reads, writes, deletes and queries issued by this instance,
+    per route and for the most expensive users (admin only)
+
+    Query parameters:
+    - top: integer (optional) - number of users to list (default: 20)
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token> (requires "admin" claim)
+    """
+    try:
+        top = max(0, min(int(request.args.get('top', 20)), 1000))
+    except ValueError:
+        return jsonify({
+            'error': 'Invalid parameter',
+            'message': 'top must be an integer'
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'firestore': cost_accounting.summary(top)
+    }), 200
@@ -0,0 +1,85 @@
+"""
+Sessions endpoint for retrieving paired app usage sessions
+"""
+import logging
+from flask import Blueprint, request, jsonify
+from middleware.auth_middleware import require_auth
+from models.event import EventValidationError, normalize_timestamp, parse_app_name
+
+sessions_bp = Blueprint('sessions', __name__)
+logger = logging.getLogger(__name__)
+firestore = None  # 遅延初期化
+
+def get_firestore():
+    """ストレージバックエンドの遅延初期化（STORAGE_BACKENDで切り替え）"""
+    global firestore
+    if firestore is None:
+        try:
+            from database.storage import get_storage
+            firestore = get_storage()
+        except Exception as e:
+            logger.warning('Storage initialization failed: %s', e)
+            firestore = None
+    return firestore
+
+@sessions_bp.route('/sessions', methods=['GET'])
+@require_auth
+def get_sessions():
+    """
+    Retrieve app usage sessions for authenticated user, newest first
+
+    Sessions are paired from opened/closed events as they arrive at
+    /api/webhook (see services.sessions); a session still open isn't
+    listed until it ends.
+
+    Query parameters:
+    - start_date: ISO8601 string (optional) - sessions starting at or after
+    - end_date: ISO8601 string (optional) - sessions starting at or before
+    - app_name: string (optional) - filter by specific app
+    - limit: integer (optional) - number of records to return (default: 100)
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token>
+    """
+    try:
+        user_id = request.user_id
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        app_name = request.args.get('app_name')
+        limit = int(request.args.get('limit', 100))
+
+        # 保存時と同じ形式に揃えてから検索する
+        try:
+            if start_date:
+                start_date = normalize_timestamp(start_date)
+            if end_date:
+                end_date = normalize_timestamp(end_date)
+            if app_name:
+                app_name = parse_app_name(app_name).value
+        except EventValidationError as e:
+            return jsonify({
+                'error': 'Invalid query parameter',
+                'message': str(e)
+            }), 400
+
+        fs = get_firestore()
+        sessions = fs.get_sessions(
+            user_id,
+            start_date=start_date,
+            end_date=end_date,
+            app_name=app_name,
+            limit=limit
+        ) if fs else []
+
+        return jsonify({
+            'status': 'success',
+            'sessions': sessions,
+            'count': len(sessions),
+            'total_seconds': round(sum(s['duration_seconds'] or 0 for s in sessions), 3)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
@@ -0,0 +1,184 @@
+"""
+User settings endpoint (per-app recording switches, quiet hours, linked accounts)
+"""
+import logging
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import Blueprint, request, jsonify
+from middleware.auth_middleware import require_auth
+from models.event import EventValidationError, parse_app_name
+
+settings_bp = Blueprint('settings', __name__)
+logger = logging.getLogger(__name__)
+firestore = None  # 遅延初期化
+
+SETTINGS_FIELDS = ('recording', 'quiet_hours', 'timezone', 'shared_with')
+
+# Users one account can share its logs with
+MAX_SHARED_WITH = 20
+
+
+class SettingsValidationError(ValueError):
+    """Raised when a settings payload is invalid"""
+
+
+def get_firestore():
+    """ストレージバックエンドの遅延初期化（STORAGE_BACKENDで切り替え）"""
+    global firestore
+    if firestore is None:
+        try:
+            from database.storage import get_storage
+            firestore = get_storage()
+        except Exception as e:
+            logger.warning('Storage initialization failed: %s', e)
+            firestore = None
+    return firestore
+
+
+def _valid_clock(value) -> bool:
+    if not isinstance(value, str) or ':' not in value:
+        return False
+    hours, _, minutes = value.partition(':')
+    return hours.isdigit() and minutes.isdigit() and int(hours) < 24 and int(minutes) < 60
+
+
+def parse_settings(body, current: dict, user_id: Optional[str] = None) -> dict:
+    """
+    Validate a settings update
+
+    Recording switches are merged into the current ones, so a client can
+    send only the apps it changes.
+
+    Raises:
+        SettingsValidationError: If the payload is invalid
+    """
+    if not isinstance(body, dict) or not body:
+        raise SettingsValidationError('Expected a JSON object with settings to update')
+    unknown = [key for key in body if key not in SETTINGS_FIELDS]
+    if unknown:
+        raise SettingsValidationError(f"Unknown settings: {', '.join(unknown)}")
+
+    update = {}
+    if 'recording' in body:
+        recording = body['recording']
+        if not isinstance(recording, dict):
+            raise SettingsValidationError('recording must be an object of app name -> boolean')
+        merged = dict(current.get('recording') or {})
+        for app_name, enabled in recording.items():
+            try:
+                app = parse_app_name(app_name)
+            except EventValidationError as e:
+                raise SettingsValidationError(str(e)) from None
+            if not isinstance(enabled, bool):
+                raise SettingsValidationError(f'recording.{app.value} must be true or false')
+            merged[app.value] = enabled
+        update['recording'] = merged
+
+    if 'quiet_hours' in body:
+        quiet_hours = body['quiet_hours']
+        if quiet_hours is not None and not (
+            isinstance(quiet_hours, dict)
+            and _valid_clock(quiet_hours.get('start'))
+            and _valid_clock(quiet_hours.get('end'))
+        ):
+            raise SettingsValidationError('quiet_hours must be null or {"start": "HH:MM", "end": "HH:MM"}')
+        update['quiet_hours'] = quiet_hours
+
+    if 'timezone' in body:
+        try:
+            ZoneInfo(body['timezone'])
+        except (ZoneInfoNotFoundError, ValueError, TypeError):
+            raise SettingsValidationError('timezone must be an IANA time zone name') from None
+        update['timezone'] = body['timezone']
+
+    if 'shared_with' in body:
+        shared_with = body['shared_with']
+        if not isinstance(shared_with, list) or not all(
+            isinstance(viewer, str) and viewer and viewer != user_id for viewer in shared_with
+        ):
+            raise SettingsValidationError('shared_with must be a list of other users\' IDs')
+        shared_with = list(dict.fromkeys(shared_with))
+        if len(shared_with) > MAX_SHARED_WITH:
+            raise SettingsValidationError(f'shared_with can list at most {MAX_SHARED_WITH} users')
+        update['shared_with'] = shared_with
+
+    return update
+
+
+@settings_bp.route('/settings', methods=['GET'])
+@require_auth
+def get_settings():
+    """
+    Retrieve the authenticated user's settings
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token>
+    """
+    try:
+        fs = get_firestore()
+        settings = (fs.get_user_settings(request.user_id) if fs else None) or {}
+        return jsonify({
+            'status': 'success',
+            'settings': settings
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+
+@settings_bp.route('/settings', methods=['PUT'])
+@require_auth
+def update_settings():
+    """
+    Update the authenticated user's settings
+
+    Expected payload (every field optional):
+    {
+        "recording": {"line": true, "tiktok": false},
+        "quiet_hours": {"start": "23:00", "end": "07:00"} | null,
+        "timezone": "Asia/Tokyo",
+        "shared_with": ["<partner user_id>"]
+    }
+
+    Events of apps with recording off are dropped at /api/webhook. The
+    change applies immediately on this instance and within
+    SETTINGS_CACHE_TTL_SECONDS everywhere else. Users listed in
+    shared_with see this user's logs in their /api/feed; the list is
+    replaced, not merged.
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token>
+    """
+    try:
+        fs = get_firestore()
+        if not fs:
+            return jsonify({
+                'error': 'Storage unavailable',
+                'message': 'Settings cannot be saved right now'
+            }), 503
+
+        user_id = request.user_id
+        current = fs.get_user_settings(user_id) or {}
+        try:
+            update = parse_settings(request.get_json(silent=True), current, user_id)
+        except SettingsValidationError as e:
+            return jsonify({
+                'error': 'Invalid settings',
+                'message': str(e)
+            }), 400
+
+        fs.save_user_settings(user_id, update)
+        return jsonify({
+            'status': 'success',
+            'settings': fs.get_user_settings(user_id) or {}
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
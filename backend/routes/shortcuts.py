@@ -5,16 +5,65 @@ LINE用のiOSショートカットを自動生成するエンドポイント
 from flask import Blueprint, jsonify, request, send_file
 import plistlib
 import io
+import logging
+import re
 import base64
 from datetime import datetime, timedelta
+from functools import lru_cache
 from firebase.config import get_storage_bucket
 
 shortcuts_bp = Blueprint('shortcuts', __name__)
+logger = logging.getLogger(__name__)
+
+# テンプレート内の差し込み位置（plistに現れない文字列）
+_USER_ID_MARKER = '@@MIIVVY_USER_ID@@'
+_WEBHOOK_URL_MARKER = '@@MIIVVY_WEBHOOK_URL@@'
+_MARKER_PATTERN = re.compile(rb'@@MIIVVY_(USER_ID|WEBHOOK_URL)@@')
+
+# plistlibが拒否する制御文字
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _plist_text(text: str) -> bytes:
+    """plistlib.dumps と同じ規則で<string>の中身をエスケープ"""
+    if _CONTROL_CHARS.search(text) is not None:
+        raise ValueError("strings can't contain control characters; use bytes instead")
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return text.encode('utf-8')
+
+
+@lru_cache(maxsize=1)
+def shortcut_template() -> bytes:
+    """
+    差し込み位置入りのショートカットplist（プロセスごとに1回だけ生成）
+
+    起動時のウォームアップ（services.warmup）からも呼ばれます。
+    """
+    return _build_line_shortcut(_USER_ID_MARKER, _WEBHOOK_URL_MARKER)
+
 
 def generate_line_shortcut(user_id: str, webhook_url: str) -> bytes:
     """
     LINE起動時にWebhookを送信するショートカットを生成
 
+    plistを毎回組み立てず、キャッシュしたテンプレートに値を差し込みます。
+
+    Args:
+        user_id: ユーザーID
+        webhook_url: Webhook送信先URL
+
+    Returns:
+        .shortcutファイルのバイナリデータ
+    """
+    values = {b'USER_ID': _plist_text(user_id), b'WEBHOOK_URL': _plist_text(webhook_url)}
+    return _MARKER_PATTERN.sub(lambda match: values[match.group(1)], shortcut_template())
+
+
+def _build_line_shortcut(user_id: str, webhook_url: str) -> bytes:
+    """
+    LINE起動時にWebhookを送信するショートカットのplistを組み立てる
+
     Args:
         user_id: ユーザーID
         webhook_url: Webhook送信先URL
@@ -387,9 +436,7 @@ def get_shortcut_url(app_id: str, user_id: str):
         })
 
     except Exception as e:
-        import traceback
-        print(f"Error generating shortcut URL: {e}")
-        print(traceback.format_exc())
+        logger.exception('Generating shortcut URL failed', extra={'app_id': app_id})
         return jsonify({
             'error': 'Failed to generate shortcut URL',
             'message': str(e)
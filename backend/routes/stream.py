@@ -0,0 +1,115 @@
+"""
+Server-Sent Events stream of a user's new events and analyses
+"""
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, jsonify, request
+from middleware.auth_middleware import require_auth
+from services.json_provider import dumps
+from services.pubsub import bus, user_topic
+
+stream_bp = Blueprint('stream', __name__)
+
+# Each open stream holds one gunicorn thread, so connections are capped
+# well below the thread count and recycled after a maximum duration.
+MAX_CONNECTIONS = int(os.getenv('STREAM_MAX_CONNECTIONS', 4))
+MAX_CONNECTIONS_PER_USER = int(os.getenv('STREAM_MAX_PER_USER', 2))
+MAX_DURATION_SECONDS = float(os.getenv('STREAM_MAX_DURATION_SECONDS', 300))
+HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+RECONNECT_MILLIS = 3000
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def _acquire_slot(user_id: str) -> bool:
+    with _connections_lock:
+        if sum(_connections.values()) >= MAX_CONNECTIONS:
+            return False
+        if _connections.get(user_id, 0) >= MAX_CONNECTIONS_PER_USER:
+            return False
+        _connections[user_id] = _connections.get(user_id, 0) + 1
+        return True
+
+
+def _release_slot(user_id: str) -> None:
+    with _connections_lock:
+        remaining = _connections.get(user_id, 1) - 1
+        if remaining > 0:
+            _connections[user_id] = remaining
+        else:
+            _connections.pop(user_id, None)
+
+
+def _format_message(message) -> str:
+    data = dumps(message['data'], default=str)
+    return f"id: {message['id']}\nevent: {message['type']}\ndata: {data}\n\n"
+
+
+@stream_bp.route('/stream', methods=['GET'])
+@require_auth
+def stream_events():
+    """
+    GET /api/stream
+
+    Server-Sent Events stream pushing the authenticated user's data as
+    soon as it is ingested, instead of polling /api/logs and /api/analyze.
+
+    Event types:
+    - event: a new app usage event (same fields as /api/logs entries)
+    - analysis: a new analysis result
+    - detection: a detection rule fired on a new event (services.rule_engine);
+      fields: id, rule_id, severity, message, app_name,
+      event_type, event_timestamp and event_id (the triggering event).
+      The same records are listed by /api/detections
+
+    A comment line is sent every STREAM_HEARTBEAT_SECONDS to keep
+    proxies from closing the connection; the server ends the stream after
+    STREAM_MAX_DURATION_SECONDS and the client reconnects.
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token>
+    """
+    user_id = request.user_id
+
+    if not _acquire_slot(user_id):
+        response = jsonify({
+            'error': 'Too many streams',
+            'message': 'Stream capacity reached. Please retry later'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(RECONNECT_MILLIS // 1000)
+        return response
+
+    subscription = bus.subscribe(user_topic(user_id))
+    released = threading.Event()
+
+    def release():
+        # Called by the WSGI server when the response is closed, even if
+        # the client went away before the generator started
+        if not released.is_set():
+            released.set()
+            bus.unsubscribe(subscription)
+            _release_slot(user_id)
+
+    def generate():
+        deadline = time.monotonic() + MAX_DURATION_SECONDS
+        yield f'retry: {RECONNECT_MILLIS}\n\n'
+        while not subscription.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = subscription.get(timeout=min(HEARTBEAT_SECONDS, remaining))
+            if message is None:
+                yield ': heartbeat\n\n'
+            else:
+                yield _format_message(message)
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.call_on_close(release)
+    return response
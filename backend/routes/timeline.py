@@ -0,0 +1,97 @@
+"""
+Timeline endpoint for usage charts over arbitrary time ranges
+"""
+import logging
+import time
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from middleware.auth_middleware import require_auth
+from models.event import EventValidationError, normalize_timestamp, parse_app_name
+from services.timeline import DEFAULT_BUCKETS, TimelineError, timeline_cache
+
+timeline_bp = Blueprint('timeline', __name__)
+logger = logging.getLogger(__name__)
+firestore = None  # 遅延初期化
+
+# Range used when start_date is omitted
+DEFAULT_RANGE_SECONDS = 7 * 86400
+
+def get_firestore():
+    """ストレージバックエンドの遅延初期化（STORAGE_BACKENDで切り替え）"""
+    global firestore
+    if firestore is None:
+        try:
+            from database.storage import get_storage
+            firestore = get_storage()
+        except Exception as e:
+            logger.warning('Storage initialization failed: %s', e)
+            firestore = None
+    return firestore
+
+@timeline_bp.route('/timeline', methods=['GET'])
+@require_auth
+def get_timeline():
+    """
+    Usage of the authenticated user over a time range, in fixed buckets
+
+    The response has one value per bucket however many events fall in the
+    range (see services.timeline). Bucket i starts at
+    start + i * bucket_seconds.
+
+    Query parameters:
+    - start_date: ISO8601 string (optional, default: 7 days before end_date)
+    - end_date: ISO8601 string (optional, default: now)
+    - buckets: integer (optional) - number of buckets (default: 60)
+    - metric: events (default) | opens | usage (foreground seconds)
+    - app_name: string (optional) - filter by specific app
+
+    Headers:
+    - Authorization: Bearer <firebase_id_token>
+    """
+    try:
+        user_id = request.user_id
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        app_name = request.args.get('app_name')
+        metric = request.args.get('metric', 'events').lower()
+
+        try:
+            buckets = int(request.args.get('buckets', DEFAULT_BUCKETS))
+            end = datetime.fromisoformat(normalize_timestamp(end_date)).timestamp() if end_date else time.time()
+            start = (
+                datetime.fromisoformat(normalize_timestamp(start_date)).timestamp()
+                if start_date else end - DEFAULT_RANGE_SECONDS
+            )
+            if app_name:
+                app_name = parse_app_name(app_name).value
+        except (EventValidationError, ValueError) as e:
+            return jsonify({
+                'error': 'Invalid query parameter',
+                'message': str(e)
+            }), 400
+
+        fs = get_firestore()
+        if not fs:
+            return jsonify({
+                'error': 'Storage unavailable',
+                'message': 'Timelines require a storage backend'
+            }), 503
+
+        try:
+            timeline = timeline_cache.get(fs, user_id, start, end, buckets, metric, app_name)
+        except TimelineError as e:
+            return jsonify({
+                'error': 'Invalid query parameter',
+                'message': str(e)
+            }), 400
+
+        return jsonify({
+            'status': 'success',
+            'timeline': timeline
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
@@ -1,21 +1,36 @@
 """
 Webhook endpoint for receiving app usage events from iOS Shortcuts
 """
+import logging
 from flask import Blueprint, request, jsonify
-from datetime import datetime, timezone
+from middleware.compression import PayloadTooLarge, UnsupportedEncoding, read_json_body
+from middleware.rate_limit import client_ip, rate_limited_response, webhook_limiter
+from models.event import (
+    AppEvent, EventValidationError, MAX_BATCH_BYTES, MAX_BATCH_EVENTS,
+    MAX_EVENT_BYTES, REQUIRED_FIELDS, utc_now_timestamp
+)
+from services import cost_accounting, traffic_capture
+from services.idempotency import IDEMPOTENCY_HEADER, recent_events, resolve_document_id
+from services.baseline import tracker as baseline_tracker
+from services.pubsub import publish_to_user
+from services.sessions import sessionizer
+from services.settings_cache import settings_cache
+from services.rule_engine import detect
 
 webhook_bp = Blueprint('webhook', __name__)
+traffic_capture.init_traffic_capture(webhook_bp)
+logger = logging.getLogger(__name__)
 firestore = None  # 遅延初期化
 
 def get_firestore():
-    """Firestoreヘルパーの遅延初期化"""
+    """ストレージバックエンドの遅延初期化（STORAGE_BACKENDで切り替え）"""
     global firestore
     if firestore is None:
         try:
-            from firebase.firestore_helper import FirestoreHelper
-            firestore = FirestoreHelper()
+            from database.storage import get_storage
+            firestore = get_storage()
         except Exception as e:
-            print(f"Warning: Firestore initialization failed: {e}")
+            logger.warning('Storage initialization failed: %s', e)
             firestore = None
     return firestore
 
@@ -27,35 +42,91 @@ def receive_event():
     Expected payload:
     {
         "user_id": "string",
-        "app_name": "string",
+        "app_name": "line|instagram|x|facebook|tiktok|discord",
         "event_type": "opened|closed|notification",
         "timestamp": "ISO8601 string" (optional)
     }
+
+    A missing or non-ISO8601 timestamp is replaced with the receive time.
+    Unknown keys are ignored and never stored. Events of apps the user
+    switched recording off for (user_settings.recording) are acknowledged
+    with "ignored": true and never stored.
+
+    Headers:
+    - Idempotency-Key: string (optional) - retries with the same key are
+      stored once. Without it, events carrying a timestamp are
+      deduplicated on (user_id, app_name, event_type, timestamp).
+    - Content-Encoding: gzip (optional) - compressed body; the size limit
+      applies to the decompressed body
+
+    Requests are rate limited per client IP and per user_id; over-limit
+    requests get 429 with a Retry-After header.
     """
     try:
-        data = request.get_json()
+        # IP単位のレート制限（ペイロードを読む前に弾く）
+        retry_after = webhook_limiter.check('ip', client_ip())
+        if retry_after:
+            return rate_limited_response(retry_after)
 
-        # Validate required fields
-        required_fields = ['user_id', 'app_name', 'event_type']
-        if not all(field in data for field in required_fields):
-            return jsonify({
-                'error': 'Missing required fields',
-                'required': required_fields
-            }), 400
+        try:
+            payload = read_json_body(MAX_EVENT_BYTES)
+        except PayloadTooLarge:
+            return _payload_too_large(MAX_EVENT_BYTES)
+        except UnsupportedEncoding as e:
+            return _unsupported_encoding(str(e))
+        traffic_capture.observe('e', payload)
+
+        try:
+            event = AppEvent.from_payload(payload)
+        except EventValidationError as e:
+            return _invalid_event(str(e))
+
+        # ユーザー単位のレート制限
+        retry_after = webhook_limiter.check('user', event.user_id)
+        if retry_after:
+            return rate_limited_response(retry_after)
+        cost_accounting.attribute_to(event.user_id)
+
+        # 記録をオフにしたアプリのイベントは書き込む前に破棄
+        if not settings_cache.records(event.user_id, event.app_name.value):
+            return _recording_disabled_response()
+
+        # Resolve the deterministic document ID before the server timestamp
+        # is filled in, so retries of the same event map to the same ID
+        data = event.to_document()
+        doc_id = resolve_document_id(
+            event.user_id, data, request.headers.get(IDEMPOTENCY_HEADER)
+        )
+
+        # 直近に受信済みのイベントは書き込まずに返す
+        if doc_id and not recent_events.claim(doc_id):
+            return _duplicate_response(doc_id)
 
         # Add server timestamp if not provided
         if 'timestamp' not in data:
-            data['timestamp'] = datetime.now(timezone.utc).isoformat()
+            data['timestamp'] = utc_now_timestamp()
 
         # Save to Firestore
         fs = get_firestore()
-        if fs:
+        if fs and doc_id:
+            try:
+                created = fs.save_log_once(data, doc_id)
+            except Exception:
+                recent_events.release(doc_id)
+                raise
+            if not created:
+                return _duplicate_response(doc_id)
+            event_id = doc_id
+        elif fs:
             event_id = fs.save_log(data)
         else:
             # Firestoreが利用できない場合はログのみ
-            print(f"Event received (Firestore unavailable): {data}")
+            logger.info('Event received (storage unavailable)', extra={'event': data})
             event_id = "firestore_unavailable"
 
+        publish_to_user(event.user_id, 'event', _stream_payload(event_id, data))
+        _process_stored_event(fs, event_id, data)
+
         return jsonify({
             'status': 'success',
             'message': 'Event received and saved',
@@ -63,7 +134,209 @@ def receive_event():
         }), 201
 
     except Exception as e:
+        logger.exception('Storing event failed')
         return jsonify({
             'error': 'Internal server error',
             'message': str(e)
         }), 500
+
+
+@webhook_bp.route('/webhook/batch', methods=['POST'])
+def receive_events_batch():
+    """
+    Receive several app usage events in one request
+
+    Expected payload:
+    {
+        "events": [<event>, ...]  (same shape as /webhook, max 100)
+    }
+
+    A user's events in one batch may not exceed the per-user burst
+    (WEBHOOK_USER_BURST); larger batches get 400 since they could never
+    pass the rate limit.
+
+    The batch is validated as a whole: if any event is invalid nothing is
+    stored and the offending indexes are returned. Events of apps with
+    recording switched off get "ignored": true in their result.
+
+    Headers:
+    - Idempotency-Key: string (optional) - event i of the batch uses
+      "<key>:<i>" as its key, so a retried batch is stored once.
+    - Content-Encoding: gzip (optional) - compressed body
+    """
+    try:
+        retry_after = webhook_limiter.check('ip', client_ip())
+        if retry_after:
+            return rate_limited_response(retry_after)
+
+        try:
+            body = read_json_body(MAX_BATCH_BYTES)
+        except PayloadTooLarge:
+            return _payload_too_large(MAX_BATCH_BYTES)
+        except UnsupportedEncoding as e:
+            return _unsupported_encoding(str(e))
+        traffic_capture.observe('b', body)
+
+        payloads = body.get('events') if isinstance(body, dict) else None
+        if not isinstance(payloads, list) or not payloads:
+            return _invalid_event('Expected a non-empty "events" array')
+        if len(payloads) > MAX_BATCH_EVENTS:
+            return _invalid_event(f'At most {MAX_BATCH_EVENTS} events per batch')
+
+        events = []
+        errors = []
+        for index, payload in enumerate(payloads):
+            try:
+                events.append(AppEvent.from_payload(payload))
+            except EventValidationError as e:
+                errors.append({'index': index, 'message': str(e)})
+        if errors:
+            return jsonify({
+                'error': 'Invalid events',
+                'errors': errors,
+                'required': REQUIRED_FIELDS
+            }), 400
+
+        # ユーザー単位のレート制限（イベント数をコストとして消費）
+        per_user = {}
+        for event in events:
+            per_user[event.user_id] = per_user.get(event.user_id, 0) + 1
+        # バーストを超える件数は待っても通らないため、429ではなく400で返す
+        user_burst = webhook_limiter.capacity('user')
+        if user_burst is not None and max(per_user.values()) > user_burst:
+            return _invalid_event(f'At most {int(user_burst)} events per user per batch')
+        for user_id, count in per_user.items():
+            retry_after = webhook_limiter.check('user', user_id, cost=count)
+            if retry_after:
+                return rate_limited_response(retry_after)
+        if len(per_user) == 1:
+            cost_accounting.attribute_to(events[0].user_id)
+
+        header_key = request.headers.get(IDEMPOTENCY_HEADER)
+        received_at = utc_now_timestamp()
+        results = [None] * len(events)
+        pending = []
+        claimed = []
+        for index, event in enumerate(events):
+            if not settings_cache.records(event.user_id, event.app_name.value):
+                results[index] = {'event_id': None, 'duplicate': False, 'ignored': True}
+                continue
+            data = event.to_document()
+            doc_id = resolve_document_id(event.user_id, data, header_key, index)
+            if doc_id and not recent_events.claim(doc_id):
+                results[index] = {'event_id': doc_id, 'duplicate': True}
+                continue
+            if doc_id:
+                claimed.append(doc_id)
+            if 'timestamp' not in data:
+                data['timestamp'] = received_at
+            pending.append((index, doc_id, data))
+
+        fs = get_firestore()
+        if fs and pending:
+            try:
+                saved = fs.save_logs([(doc_id, data) for _, doc_id, data in pending])
+            except Exception:
+                for doc_id in claimed:
+                    recent_events.release(doc_id)
+                raise
+            for (index, _, data), (event_id, created) in zip(pending, saved):
+                results[index] = {'event_id': event_id, 'duplicate': not created}
+                if created:
+                    publish_to_user(data['user_id'], 'event', _stream_payload(event_id, data))
+                    _process_stored_event(fs, event_id, data)
+        else:
+            for index, doc_id, data in pending:
+                if not fs:
+                    logger.info('Event received (storage unavailable)', extra={'event': data})
+                results[index] = {'event_id': doc_id or 'firestore_unavailable', 'duplicate': False}
+                publish_to_user(data['user_id'], 'event', _stream_payload(results[index]['event_id'], data))
+                _process_stored_event(fs, results[index]['event_id'], data)
+
+        stored = sum(1 for result in results if not result['duplicate'] and not result.get('ignored'))
+        return jsonify({
+            'status': 'success',
+            'message': f'{stored} events saved',
+            'results': results
+        }), 201 if stored else 200
+
+    except Exception as e:
+        logger.exception('Storing event batch failed')
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+
+def _process_stored_event(fs, event_id: str, data: dict) -> None:
+    """Run detection rules, pair sessions and update the baseline for a stored event; never fails the ingest"""
+    try:
+        detect(fs, event_id, data)
+    except Exception as e:
+        logger.warning('Detection failed: %s', e, extra={'event_id': event_id})
+
+    if fs:
+        sessions = []
+        try:
+            sessions = sessionizer.record(fs, data)
+        except Exception as e:
+            logger.warning('Session pairing failed: %s', e, extra={'event_id': event_id})
+        try:
+            baseline_tracker.record(fs, data, sessions)
+        except Exception as e:
+            logger.warning('Baseline update failed: %s', e, extra={'event_id': event_id})
+
+
+def _stream_payload(event_id: str, data: dict) -> dict:
+    """Live stream representation of a stored event"""
+    return {
+        'id': event_id,
+        'user_id': data['user_id'],
+        'app_name': data['app_name'],
+        'event_type': data['event_type'],
+        'timestamp': data['timestamp'],
+    }
+
+
+def _invalid_event(message: str):
+    """Response for a payload that failed validation"""
+    return jsonify({
+        'error': 'Invalid event',
+        'message': message,
+        'required': REQUIRED_FIELDS
+    }), 400
+
+
+def _payload_too_large(limit: int):
+    """Response for a body over the size limit"""
+    return jsonify({
+        'error': 'Payload too large',
+        'message': f'Request body must be at most {limit} bytes'
+    }), 413
+
+
+def _unsupported_encoding(encoding: str):
+    """Response for a request body in an encoding we can't decode"""
+    return jsonify({
+        'error': 'Unsupported Content-Encoding',
+        'message': f'Content-Encoding "{encoding}" is not supported. Use gzip or send the body uncompressed'
+    }), 415
+
+
+def _recording_disabled_response():
+    """Response for an event of an app the user stopped recording"""
+    return jsonify({
+        'status': 'success',
+        'message': 'Recording is disabled for this app; event ignored',
+        'ignored': True
+    }), 200
+
+
+def _duplicate_response(event_id: str):
+    """Response for an event that was already stored"""
+    return jsonify({
+        'status': 'success',
+        'message': 'Duplicate event ignored',
+        'event_id': event_id,
+        'duplicate': True
+    }), 200
@@ -0,0 +1 @@
+"""Command-line tools package initialization"""
@@ -0,0 +1,231 @@
+"""
+Recompute analyses for every active user in parallel
+
+Usage (from backend/):
+    uv run python -m scripts.analyze_users
+    uv run python -m scripts.analyze_users --days 7 --workers 8 --shard-size 100
+    uv run python -m scripts.analyze_users --checkpoint analyze.ckpt --resume
+
+Users with logs in the last --active-days are split into shards of
+--shard-size users and analyzed by a pool of --workers processes. Each
+worker opens its own storage connection, walks each user's logs in large
+pages (continuing into archived months) and saves the whole shard's
+analyses with batched writes. Like /api/analyze, each analysis also uses
+the user's sessions, baseline, previous analysis and settings; a user
+whose inputs can't be loaded is reported as failed and retried with
+--resume.
+
+With --checkpoint every finished shard is appended to the checkpoint file.
+--resume skips the users already recorded there and reuses the original
+run's time window, so a crashed run is restarted with the same command.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.analysis import build_analysis
+from services.analysis_loader import SESSION_LIMIT
+from services.archive import iter_archived_logs, reaches_archive
+from services.baseline import load_baseline
+
+_storage = None  # Per worker process
+
+
+def _init_worker() -> None:
+    global _storage
+    from database.storage import create_storage
+    _storage = create_storage()
+
+
+def analyze_shard(user_ids: List[str], start_date: str, end_date: str, page_size: int) -> Dict[str, Any]:
+    """
+    Analyze one shard of users and save the results in one batch
+
+    Returns:
+        Dictionary with the analyzed ('done') and failed user IDs, the
+        number of logs read and the shard's wall time
+    """
+    started = time.monotonic()
+    if _storage is None:
+        _init_worker()
+
+    entries = []
+    failed = []
+    log_count = 0
+    for user_id in user_ids:
+        try:
+            logs = list(_storage.iter_logs(
+                user_id, start_date=start_date, end_date=end_date, page_size=page_size
+            ))
+            # 圧縮済みの古い期間はアーカイブから補完
+            if reaches_archive(start_date):
+                logs.extend(iter_archived_logs(_storage, user_id, start_date, end_date))
+            sessions = _storage.get_sessions(
+                user_id, start_date=start_date, end_date=end_date, limit=SESSION_LIMIT
+            )
+            baseline = load_baseline(_storage, user_id)
+            previous = _storage.get_latest_analysis(user_id)
+            settings = _storage.get_user_settings(user_id)
+        except Exception as e:
+            failed.append((user_id, str(e)))
+            continue
+        log_count += len(logs)
+        entries.append((user_id, build_analysis(
+            logs, baseline, sessions=sessions, previous=previous, settings=settings
+        )))
+
+    if entries:
+        _storage.save_analyses(entries)
+
+    return {
+        'done': [user_id for user_id, _ in entries],
+        'failed': failed,
+        'logs': log_count,
+        'seconds': time.monotonic() - started,
+    }
+
+
+def load_checkpoint(path: str) -> Tuple[Optional[Dict[str, str]], Set[str]]:
+    """Run parameters and finished users recorded in a checkpoint file"""
+    run = None
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return run, done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # Torn last line from a crash
+            if 'run' in record:
+                run = record['run']
+            done.update(record.get('done', []))
+    return run, done
+
+
+def _append(f, record: Dict[str, Any]) -> None:
+    f.write(json.dumps(record) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Recompute Miivvy analyses for all active users')
+    parser.add_argument('--days', type=int, default=7, help='analyze the logs of the last N days')
+    parser.add_argument('--active-days', type=int, help='users with logs in the last N days (default: --days)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes (1 runs in-process)')
+    parser.add_argument('--shard-size', type=int, default=100, help='users per task and per write batch')
+    parser.add_argument('--page-size', type=int, default=1000, help='logs fetched per storage query')
+    parser.add_argument('--max-users', type=int, help='only analyze the first N users')
+    parser.add_argument('--checkpoint', help='record finished shards in this file')
+    parser.add_argument('--resume', action='store_true', help='skip users recorded in --checkpoint')
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.checkpoint:
+        parser.error('--resume requires --checkpoint')
+    if args.workers < 1 or args.shard_size < 1:
+        parser.error('--workers and --shard-size must be at least 1')
+
+    from database.storage import get_storage
+
+    run, done = load_checkpoint(args.checkpoint) if args.resume else (None, set())
+    new_run = run is None
+    if new_run:
+        now = datetime.now(timezone.utc)
+        run = {
+            'start_date': (now - timedelta(days=args.days)).isoformat(timespec='microseconds'),
+            'end_date': now.isoformat(timespec='microseconds'),
+            'active_since': (now - timedelta(days=args.active_days or args.days)).isoformat(timespec='microseconds'),
+        }
+
+    users = get_storage().get_active_user_ids(run['active_since'])
+    if args.max_users:
+        users = users[:args.max_users]
+    pending = [user_id for user_id in users if user_id not in done]
+    shards = [pending[i:i + args.shard_size] for i in range(0, len(pending), args.shard_size)]
+    print(
+        f'{len(users)} active users, {len(users) - len(pending)} already done, '
+        f'{len(shards)} shards on {args.workers} workers',
+        file=sys.stderr
+    )
+
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = open(args.checkpoint, 'a' if args.resume else 'w', encoding='utf-8')
+        if new_run:
+            _append(checkpoint, {'run': run})
+
+    started = time.monotonic()
+    analyzed = log_count = 0
+    failed: List[Tuple[str, str]] = []
+    shard_seconds: List[float] = []
+
+    def record(result: Dict[str, Any]) -> None:
+        nonlocal analyzed, log_count
+        analyzed += len(result['done'])
+        log_count += result['logs']
+        failed.extend(result['failed'])
+        shard_seconds.append(result['seconds'])
+        if checkpoint:
+            _append(checkpoint, {'done': result['done']})
+        elapsed = time.monotonic() - started
+        print(
+            f'[{analyzed}/{len(pending)}] {analyzed / elapsed:.1f} users/s, {log_count / elapsed:.0f} logs/s',
+            file=sys.stderr
+        )
+
+    args_for = (run['start_date'], run['end_date'], args.page_size)
+    try:
+        if args.workers == 1:
+            for shard in shards:
+                try:
+                    record(analyze_shard(shard, *args_for))
+                except Exception as e:
+                    failed.extend((user_id, str(e)) for user_id in shard)
+        else:
+            # spawn: gRPC channels and SQLite connections must not cross a fork
+            with ProcessPoolExecutor(
+                max_workers=args.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            ) as pool:
+                futures = {pool.submit(analyze_shard, shard, *args_for): shard for shard in shards}
+                for future in as_completed(futures):
+                    try:
+                        record(future.result())
+                    except Exception as e:
+                        failed.extend((user_id, str(e)) for user_id in futures[future])
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    elapsed = time.monotonic() - started
+    print(
+        f'analyzed {analyzed} users ({log_count} logs) in {elapsed:.1f}s: '
+        f'{analyzed / elapsed if elapsed else 0:.1f} users/s, {log_count / elapsed if elapsed else 0:.0f} logs/s, '
+        f'shard p50 {_percentile(shard_seconds, 50):.2f}s p95 {_percentile(shard_seconds, 95):.2f}s',
+        file=sys.stderr
+    )
+    for user_id, message in failed[:20]:
+        print(f'failed: {user_id}: {message}', file=sys.stderr)
+    if failed:
+        print(f'{len(failed)} users failed; rerun with --resume to retry them', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
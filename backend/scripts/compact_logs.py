@@ -0,0 +1,66 @@
+"""
+Compact raw logs older than the retention age into monthly archives
+
+Usage (from backend/):
+    uv run python -m scripts.compact_logs
+    uv run python -m scripts.compact_logs --older-than-days 180 --max-users 100
+    uv run python -m scripts.compact_logs --user <uid> --dry-run
+
+Run it periodically (e.g. nightly from Cloud Scheduler). Segments go to
+Firebase Storage, or to ARCHIVE_DIR with ARCHIVE_BACKEND=local.
+"""
+import argparse
+import os
+import sys
+import time
+
+from services.compaction import compact_user, retention_cutoff, users_with_logs_before
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Compact old Miivvy logs into archives')
+    parser.add_argument(
+        '--older-than-days', type=int, default=int(os.getenv('LOG_RETENTION_DAYS', '90')),
+        help='compact logs older than this many days (default: LOG_RETENTION_DAYS or 90)'
+    )
+    parser.add_argument('--user', help='only compact this user')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be compacted')
+    parser.add_argument('--max-users', type=int, help='stop after this many users')
+    parser.add_argument('--page-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    if args.older_than_days < 1:
+        parser.error('--older-than-days must be at least 1')
+    if args.dry_run and not args.user:
+        # Nothing is deleted in a dry run, so users can't be enumerated
+        parser.error('--dry-run requires --user')
+
+    from database.storage import get_storage
+
+    storage = get_storage()
+    cutoff = retention_cutoff(args.older_than_days)
+    users = [args.user] if args.user else users_with_logs_before(storage, cutoff)
+
+    started = time.monotonic()
+    total_users = total_logs = 0
+    for user_id in users:
+        stats = compact_user(
+            storage, user_id, cutoff, dry_run=args.dry_run, page_size=args.page_size
+        )
+        total_users += 1
+        total_logs += stats['logs']
+        verb = 'would compact' if args.dry_run else 'compacted'
+        print(f"{user_id}: {verb} {stats['logs']} logs in {stats['months']} months", file=sys.stderr)
+        if args.max_users and total_users >= args.max_users:
+            break
+
+    elapsed = time.monotonic() - started
+    print(
+        f'{total_logs} logs from {total_users} users older than {cutoff} in {elapsed:.1f}s',
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
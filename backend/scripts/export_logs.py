@@ -0,0 +1,100 @@
+"""
+Export a user's log history to a file
+
+Usage (from backend/):
+    uv run python -m scripts.export_logs --user <uid> --format ndjson --output logs.ndjson
+    uv run python -m scripts.export_logs --user <uid> --format csv --output logs.csv --resume
+    uv run python -m scripts.export_logs --user <uid> --format parquet --output logs.parquet
+
+--resume continues an interrupted NDJSON/CSV export by reading the last
+record already in the output file. For any format, --cursor
+"<timestamp>|<id>" starts right after that record (use a new output file
+for Parquet).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+from services.export import EXPORT_FORMATS, ExportError, encode_cursor, export_chunks
+
+
+def _last_line(path: str) -> str:
+    """Last non-empty line of a text file, read from the end"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') < 2:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = [line for line in data.decode('utf-8').splitlines() if line.strip()]
+    return lines[-1] if lines else ''
+
+
+def resume_cursor(path: str, fmt: str):
+    """Cursor after the last record in an existing NDJSON or CSV export"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    line = _last_line(path)
+    if fmt == 'ndjson':
+        return encode_cursor(json.loads(line))
+    row = next(csv.reader([line]))
+    if row and row[0] == 'id':
+        return None
+    # Columns follow services.export.EXPORT_COLUMNS
+    return encode_cursor({'id': row[0], 'timestamp': row[4]})
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Export a user\'s Miivvy log history')
+    parser.add_argument('--user', required=True, help='user ID to export')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson')
+    parser.add_argument('--output', required=True, help='output file path')
+    parser.add_argument('--start-date', help='ISO8601 lower bound (inclusive)')
+    parser.add_argument('--end-date', help='ISO8601 upper bound (inclusive)')
+    parser.add_argument('--cursor', help='resume after "<timestamp>|<id>"')
+    parser.add_argument('--resume', action='store_true', help='append to an existing NDJSON/CSV output')
+    parser.add_argument('--page-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    from database.storage import get_storage
+    from models.event import normalize_timestamp
+
+    cursor = args.cursor
+    append = False
+    if args.resume:
+        if args.format == 'parquet':
+            parser.error('--resume is not supported for parquet; use --cursor with a new output file')
+        cursor = resume_cursor(args.output, args.format) or cursor
+        append = cursor is not None
+
+    try:
+        chunks = export_chunks(
+            get_storage(),
+            args.user,
+            args.format,
+            start_date=normalize_timestamp(args.start_date) if args.start_date else None,
+            end_date=normalize_timestamp(args.end_date) if args.end_date else None,
+            cursor=cursor,
+            page_size=args.page_size,
+            header=not append,
+        )
+        written = 0
+        with open(args.output, 'ab' if append else 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+    except (ExportError, ValueError) as e:
+        print(f'Export failed: {e}', file=sys.stderr)
+        return 1
+
+    print(f'Wrote {written} bytes to {args.output}' + (f' (resumed after {cursor})' if append else ''), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Move logs from the flat `logs` collection to per-user subcollections
+
+Usage (from backend/):
+    LOGS_LAYOUT=user uv run python -m scripts.migrate_logs_layout
+
+Deploy with LOGS_LAYOUT=user (and the default LOGS_READ_LEGACY=1) first,
+so new events already go to users/{user_id}/logs and reads merge both
+layouts, then run this until it reports nothing left to move. After that
+LOGS_READ_LEGACY=0 drops the extra query per read.
+"""
+import argparse
+import sys
+import time
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Move Miivvy logs to the per-user layout')
+    parser.add_argument('--page-size', type=int, default=250, help='logs per batch (max 250)')
+    parser.add_argument('--max-logs', type=int, help='stop after moving about this many logs')
+    args = parser.parse_args(argv)
+
+    from firebase.firestore_helper import FirestoreHelper
+
+    helper = FirestoreHelper(logs_layout='user')
+    started = time.monotonic()
+    moved = 0
+    while not args.max_logs or moved < args.max_logs:
+        count = helper.move_legacy_logs(args.page_size)
+        if not count:
+            break
+        moved += count
+        elapsed = time.monotonic() - started
+        print(f'{moved} logs moved ({moved / elapsed:.0f}/s)', file=sys.stderr)
+
+    print(f'done: {moved} logs moved in {time.monotonic() - started:.1f}s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
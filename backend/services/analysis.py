@@ -0,0 +1,128 @@
+"""
+Usage analysis shared by /api/analyze and the batch runner
+"""
+from typing import Any, Dict, List, Mapping, Optional
+
+from models.event import stored_epoch
+from services.baseline import hour_of_week
+from services.settings_cache import SettingsSnapshot
+
+# Decayed opens needed before the baseline is trusted
+BASELINE_MIN_WEIGHT = 20.0
+
+# An hour of the week with less than a quarter of an even share is unusual
+RARE_HOUR_SHARE = 0.25 / (7 * 24)
+
+# Apps making up less than this share of the usual opens are unfamiliar
+RARE_APP_SHARE = 0.02
+
+# Opens at unusual hours needed to flag the period
+MIN_UNUSUAL_OPENS = 3
+
+MAX_DETAILS = 20
+
+
+def build_analysis(
+    logs: List[Dict[str, Any]],
+    baseline: Optional[Dict[str, Any]] = None,
+    sessions: Optional[List[Dict[str, Any]]] = None,
+    previous: Optional[Dict[str, Any]] = None,
+    settings: Optional[Mapping[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Analyze a user's app usage logs
+
+    Opens are compared with the user's baseline profile (see
+    services.baseline.load_baseline) once it has enough history.
+
+    Args:
+        logs: Logs to analyze
+        baseline: Decayed baseline profile, or None
+        sessions: The period's sessions (services.sessions); the result
+            sums foreground time per app from them
+        previous: The user's previous analysis; the result notes whether
+            the verdict changed since
+        settings: The user's settings; apps whose recording is switched
+            off are left out
+
+    Returns:
+        Analysis result dictionary
+    """
+    if settings:
+        disabled_apps = SettingsSnapshot(dict(settings)).disabled_apps
+        if disabled_apps:
+            logs = [log for log in logs if log.get('app_name') not in disabled_apps]
+            if sessions:
+                sessions = [session for session in sessions if session['app_name'] not in disabled_apps]
+
+    # TODO: Implement AI analysis with OpenAI API
+    details = []
+    if baseline and baseline['weight'] >= BASELINE_MIN_WEIGHT:
+        details = _compare_with_baseline(logs, baseline)
+
+    unusual_opens = sum(1 for detail in details if detail['type'] == 'unusual_hour')
+    unfamiliar_apps = [detail['app_name'] for detail in details if detail['type'] == 'unfamiliar_app']
+    suspicious = unusual_opens >= MIN_UNUSUAL_OPENS or bool(unfamiliar_apps)
+
+    if suspicious:
+        summary = (
+            f'Analyzed {len(logs)} events. {unusual_opens} opens at unusual hours, '
+            f'{len(unfamiliar_apps)} unfamiliar apps.'
+        )
+    else:
+        summary = f'Analyzed {len(logs)} events. No unusual activity detected.'
+
+    result = {
+        'suspicious_activity': suspicious,
+        'summary': summary,
+        'details': details[:MAX_DETAILS],
+        'log_count': len(logs),
+        'baseline_used': bool(baseline) and baseline['weight'] >= BASELINE_MIN_WEIGHT
+    }
+    if sessions is not None:
+        result['usage'] = _usage_by_app(sessions)
+    if previous:
+        result['previous_analysis_id'] = previous.get('id')
+        result['status_changed'] = previous.get('suspicious_activity') != suspicious
+    return result
+
+
+def _compare_with_baseline(logs: List[Dict[str, Any]], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    hour_shares = baseline['hour_of_week']
+    app_mix = baseline['app_mix']
+
+    unfamiliar: Dict[str, int] = {}
+    unusual_hours = []
+    for log in logs:
+        if log.get('event_type') != 'opened':
+            continue
+        app_name = log.get('app_name')
+        if app_mix.get(app_name, 0.0) < RARE_APP_SHARE:
+            unfamiliar[app_name] = unfamiliar.get(app_name, 0) + 1
+        at = stored_epoch(log.get('timestamp'))
+        if at is None:
+            continue
+        if hour_shares[hour_of_week(at)] < RARE_HOUR_SHARE:
+            unusual_hours.append({
+                'type': 'unusual_hour',
+                'timestamp': log['timestamp'],
+                'app_name': app_name,
+            })
+
+    details = [
+        {'type': 'unfamiliar_app', 'app_name': app_name, 'count': count}
+        for app_name, count in sorted(unfamiliar.items(), key=lambda item: -item[1])
+    ]
+    return details + unusual_hours
+
+
+def _usage_by_app(sessions: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Sessions and known foreground seconds per app"""
+    usage: Dict[str, Dict[str, Any]] = {}
+    for session in sessions:
+        app_usage = usage.setdefault(session['app_name'], {'sessions': 0, 'seconds': 0.0})
+        app_usage['sessions'] += 1
+        app_usage['seconds'] += session['duration_seconds'] or 0.0
+    for app_usage in usage.values():
+        app_usage['seconds'] = round(app_usage['seconds'], 3)
+    return usage
@@ -0,0 +1,106 @@
+"""
+Concurrent loading of everything /api/analyze reads
+
+An analysis needs the logs and sessions for the period, the user's
+baseline, their previous analysis and their settings. These reads don't
+depend on each other, so load_analysis_inputs issues them together on a
+bounded thread pool and the request waits for the slowest one instead of
+the sum of all of them. Each read runs in a copy of the request's context, so its
+Firestore operations are billed to the request (cost_accounting) and its
+log lines carry the request's correlation ID.
+
+The logs are required: if their query fails, the error is raised. The
+other inputs only refine the analysis; a failed read is logged and
+loaded as None (settings as empty).
+"""
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from services.archive import get_logs_with_archive
+from services.baseline import load_baseline
+from services.settings_cache import settings_cache
+
+logger = logging.getLogger(__name__)
+
+# Reads in flight across all requests; each analysis issues five
+FANOUT_WORKERS = int(os.getenv('ANALYZE_FANOUT_WORKERS', 16))
+
+LOG_LIMIT = 100
+SESSION_LIMIT = 500
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='analysis-load')
+
+
+class AnalysisInputs:
+    """What one analysis is computed from"""
+
+    __slots__ = ('logs', 'sessions', 'baseline', 'previous', 'settings')
+
+    def __init__(
+        self,
+        logs: List[Dict[str, Any]],
+        sessions: Optional[List[Dict[str, Any]]] = None,
+        baseline: Optional[Dict[str, Any]] = None,
+        previous: Optional[Dict[str, Any]] = None,
+        settings: Optional[Mapping[str, Any]] = None
+    ):
+        self.logs = logs
+        self.sessions = sessions
+        self.baseline = baseline
+        self.previous = previous
+        self.settings = settings or {}
+
+
+def _submit(load: Callable[..., Any], *args: Any, **kwargs: Any):
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, load, *args, **kwargs)
+
+
+def _optional(name: str, future, user_id: str) -> Any:
+    try:
+        return future.result()
+    except Exception as e:
+        logger.warning('Loading %s for analysis of %s failed: %s', name, user_id, e)
+        return None
+
+
+def load_analysis_inputs(fs, user_id: str, start_date: Optional[str], end_date: Optional[str]) -> AnalysisInputs:
+    """
+    Load an analysis' inputs concurrently
+
+    Args:
+        fs: Storage backend, or None (nothing to load)
+        user_id: User ID
+        start_date: Start of the period (ISO 8601), or None
+        end_date: End of the period (ISO 8601), or None
+
+    Returns:
+        AnalysisInputs
+    """
+    if fs is None:
+        return AnalysisInputs([])
+
+    # 圧縮済みの古い期間はアーカイブから補完
+    logs = _submit(
+        get_logs_with_archive, fs,
+        user_id=user_id, start_date=start_date, end_date=end_date, limit=LOG_LIMIT
+    )
+    sessions = _submit(
+        fs.get_sessions, user_id, start_date=start_date, end_date=end_date, limit=SESSION_LIMIT
+    )
+    baseline = _submit(load_baseline, fs, user_id)
+    previous = _submit(fs.get_latest_analysis, user_id)
+    settings = _submit(settings_cache.get_settings, user_id)
+
+    return AnalysisInputs(
+        # Optional reads are collected first so a failed log query doesn't
+        # leave them running unobserved
+        sessions=_optional('sessions', sessions, user_id),
+        baseline=_optional('baseline', baseline, user_id),
+        previous=_optional('previous analysis', previous, user_id),
+        settings=_optional('settings', settings, user_id),
+        logs=logs.result(),
+    )
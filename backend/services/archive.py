@@ -0,0 +1,241 @@
+"""
+Compressed monthly archives of compacted logs
+
+The compaction job (services.compaction) moves raw logs older than the
+retention age into one gzip-compressed NDJSON segment per user and month:
+
+    archives/logs/{user_id}/{YYYY-MM}.ndjson.gz
+
+Segments live in Firebase Storage (ARCHIVE_BACKEND=bucket, the default) or
+under ARCHIVE_DIR on the local filesystem (ARCHIVE_BACKEND=local, for
+tests and self-hosting). A summary rollup per month stays in the
+database, and reads that run past the live logs fall back to the
+segments listed there.
+"""
+import gzip
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.json_provider import dumps_bytes, loads
+
+SEGMENT_PREFIX = 'archives/logs'
+
+# Compaction only moves logs older than this (scripts.compact_logs defaults to it)
+RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 90))
+
+
+def segment_path(user_id: str, month: str) -> str:
+    return f'{SEGMENT_PREFIX}/{user_id}/{month}.ndjson.gz'
+
+
+def encode_segment(logs: List[Dict[str, Any]]) -> bytes:
+    """Gzip-compressed NDJSON, one log per line"""
+    lines = b''.join(dumps_bytes(log, default=str) + b'\n' for log in logs)
+    return gzip.compress(lines, compresslevel=6)
+
+
+def decode_segment(data: bytes) -> List[Dict[str, Any]]:
+    return [loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines() if line]
+
+
+class ArchiveStore(ABC):
+    """Interface for segment blob storage"""
+
+    @abstractmethod
+    def read(self, path: str) -> Optional[bytes]:
+        """Contents of the segment at path, or None if it doesn't exist"""
+
+    @abstractmethod
+    def write(self, path: str, data: bytes) -> None:
+        """Create or replace the segment at path"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete every segment under prefix and return how many there were"""
+
+
+class BucketArchiveStore(ArchiveStore):
+    """Segments in the Firebase Storage bucket"""
+
+    def __init__(self):
+        from firebase.config import get_storage_bucket
+        self.bucket = get_storage_bucket()
+
+    def read(self, path):
+        blob = self.bucket.blob(path)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+
+    def write(self, path, data):
+        self.bucket.blob(path).upload_from_string(data, content_type='application/gzip')
+
+    def delete_prefix(self, prefix):
+        blobs = list(self.bucket.list_blobs(prefix=prefix))
+        for blob in blobs:
+            blob.delete()
+        return len(blobs)
+
+
+class LocalArchiveStore(ArchiveStore):
+    """Segments on the local filesystem"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _full_path(self, path: str) -> str:
+        return os.path.join(self.root, *path.split('/'))
+
+    def read(self, path):
+        try:
+            with open(self._full_path(path), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, path, data):
+        full_path = self._full_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Write then rename so readers never see a partial segment
+        tmp_path = full_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+
+    def delete_prefix(self, prefix):
+        directory = self._full_path(prefix)
+        deleted = 0
+        for current, _, files in os.walk(directory, topdown=False):
+            for name in files:
+                os.remove(os.path.join(current, name))
+                deleted += 1
+            os.rmdir(current)
+        return deleted
+
+
+_archive_store: Optional[ArchiveStore] = None
+
+
+def get_archive_store() -> ArchiveStore:
+    """Process-wide archive store selected by ARCHIVE_BACKEND"""
+    global _archive_store
+    if _archive_store is None:
+        if os.getenv('ARCHIVE_BACKEND', 'bucket').lower() == 'local':
+            _archive_store = LocalArchiveStore(os.getenv('ARCHIVE_DIR', './archives'))
+        else:
+            _archive_store = BucketArchiveStore()
+    return _archive_store
+
+
+def delete_user_archives(user_id: str, archive: Optional[ArchiveStore] = None) -> int:
+    """Delete every archived segment of a user (GDPR deletion)"""
+    archive = archive or get_archive_store()
+    return archive.delete_prefix(f'{SEGMENT_PREFIX}/{user_id}/')
+
+
+def _month_overlaps(rollup: Dict[str, Any], start_date: Optional[str], end_date: Optional[str]) -> bool:
+    if start_date and rollup['last_timestamp'] < start_date:
+        return False
+    if end_date and rollup['first_timestamp'] > end_date:
+        return False
+    return True
+
+
+def overlapping_rollups(
+    storage, user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """A user's monthly rollups that overlap the range, oldest first"""
+    return [r for r in storage.get_log_rollups(user_id) if _month_overlaps(r, start_date, end_date)]
+
+
+def reaches_archive(start_date: Optional[str]) -> bool:
+    """Whether a range starting at start_date can include compacted logs"""
+    if not start_date:
+        return True
+    cutoff = datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)
+    return start_date < cutoff.isoformat(timespec='microseconds')
+
+
+def _in_range(log: Dict[str, Any], start_date, end_date, app_name) -> bool:
+    if start_date and log['timestamp'] < start_date:
+        return False
+    if end_date and log['timestamp'] > end_date:
+        return False
+    if app_name and log.get('app_name') != app_name:
+        return False
+    return True
+
+
+def iter_archived_logs(
+    storage,
+    user_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    app_name: Optional[str] = None,
+    after: Optional[Tuple[str, str]] = None,
+    descending: bool = False,
+    archive: Optional[ArchiveStore] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Walk a user's archived logs ordered by (timestamp, id)
+
+    Only segments whose rollup overlaps the range are read, one month at
+    a time.
+    """
+    rollups = overlapping_rollups(storage, user_id, start_date, end_date)
+    if not rollups:
+        return
+    archive = archive or get_archive_store()
+    if descending:
+        rollups.reverse()
+
+    for rollup in rollups:
+        data = archive.read(rollup['archive_path'])
+        if data is None:
+            continue
+        logs = [log for log in decode_segment(data) if _in_range(log, start_date, end_date, app_name)]
+        logs.sort(key=lambda log: (log['timestamp'], log['id']), reverse=descending)
+        for log in logs:
+            key = (log['timestamp'], log['id'])
+            if after and (key >= after if descending else key <= after):
+                continue
+            yield log
+
+
+def get_logs_with_archive(
+    storage,
+    user_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    app_name: Optional[str] = None,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    get_logs that transparently continues into archived months
+
+    The archive is only consulted when the live logs can't fill the page
+    and the range starts before the retention cutoff, so reads of recent
+    history never query the rollups.
+    """
+    logs = storage.get_logs(
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+        app_name=app_name,
+        limit=limit
+    )
+    if len(logs) >= limit or not reaches_archive(start_date):
+        return logs
+
+    # Archived logs are older than anything still live
+    oldest = logs[-1]['timestamp'] if logs else None
+    seen = {log['id'] for log in logs}
+    for log in iter_archived_logs(storage, user_id, start_date, end_date, app_name, descending=True):
+        if len(logs) >= limit:
+            break
+        if log['id'] in seen or (oldest and log['timestamp'] > oldest):
+            continue
+        logs.append(log)
+    return logs
@@ -0,0 +1,236 @@
+"""
+Per-user behavioral baseline profiles
+
+A baseline models the owner's normal usage, so analysis can spot activity
+that doesn't look like them by reading one small document instead of
+weeks of logs. It is stored next to user_settings and holds:
+
+- hour_of_week: opens per UTC hour of the week ("0" = Monday 00:00-01:00)
+- apps: opens per app (the app mix)
+- session_seconds: closed sessions per length bucket
+- totals: events, opens, sessions and summed session length
+
+Counts decay exponentially with a half-life of BASELINE_HALF_LIFE_DAYS.
+The decay is applied forward: an event at time t adds
+2 ** ((t - EPOCH) / half_life) instead of 1, so older contributions shrink
+relative to newer ones without ever being rewritten. Event times come from
+the client, so they are capped at MAX_CLOCK_SKEW_SECONDS past the current
+time; a future-dated event would otherwise outweigh the whole profile for
+good. Stored counters only
+grow, which lets every instance add its deltas with atomic increments
+(no read-modify-write, no lost updates); load_baseline divides by the
+same factor for "now". With the minimum 7-day half-life the factor stays
+within float range for roughly 20 years after EPOCH.
+
+Ingest feeds events, and the sessions services.sessions finished with
+them, to BaselineTracker, which buffers each user's deltas and flushes
+them after BASELINE_FLUSH_EVENTS events or BASELINE_FLUSH_SECONDS seconds.
+Sessions whose end is unknown (timed out) don't count.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+
+HALF_LIFE_DAYS = max(7.0, float(os.getenv('BASELINE_HALF_LIFE_DAYS', 14)))
+
+# Upper bounds (seconds) of the session length buckets; longer sessions go to 'inf'
+SESSION_BUCKETS = (30, 60, 300, 900, 1800, 3600)
+
+HOURS_PER_WEEK = 7 * 24
+
+# How far ahead of the server clock a device timestamp may be
+MAX_CLOCK_SKEW_SECONDS = 300
+
+
+def decay_weight(at: float, half_life_days: float = HALF_LIFE_DAYS) -> float:
+    """Forward-decay weight of something that happened at epoch seconds `at`"""
+    return 2.0 ** ((at - EPOCH) / (half_life_days * 86400))
+
+
+def event_time(timestamp: str, now: Optional[float] = None) -> float:
+    """Epoch seconds of a stored timestamp, capped at the allowed clock skew"""
+    limit = (time.time() if now is None else now) + MAX_CLOCK_SKEW_SECONDS
+    return min(datetime.fromisoformat(timestamp).timestamp(), limit)
+
+
+def hour_of_week(at: float) -> int:
+    moment = datetime.fromtimestamp(at, timezone.utc)
+    return moment.weekday() * 24 + moment.hour
+
+
+def session_bucket(seconds: float) -> str:
+    for bound in SESSION_BUCKETS:
+        if seconds <= bound:
+            return str(bound)
+    return 'inf'
+
+
+class _PendingDeltas:
+    """Counters buffered for one user since the last flush"""
+
+    __slots__ = ('counters', 'events', 'since')
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[str, float]] = {}
+        self.events = 0
+        self.since = time.monotonic()
+
+    def add(self, group: str, key: str, amount: float) -> None:
+        values = self.counters.setdefault(group, {})
+        values[key] = values.get(key, 0.0) + amount
+
+
+class BaselineTracker:
+    """Accumulates baseline deltas from ingested events"""
+
+    def __init__(self, flush_events: int = 20, flush_seconds: float = 60.0):
+        """
+        Args:
+            flush_events: Flush a user's deltas after this many events
+            flush_seconds: Flush any deltas older than this
+        """
+        self.flush_events = flush_events
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _PendingDeltas] = {}
+        self._last_sweep = time.monotonic()
+        self._storage = None
+
+    def _deltas(self, user_id: str) -> _PendingDeltas:
+        deltas = self._pending.get(user_id)
+        if deltas is None:
+            deltas = self._pending[user_id] = _PendingDeltas()
+        return deltas
+
+    def record(self, storage, event: Dict[str, Any], sessions: Iterable[Dict[str, Any]] = ()) -> None:
+        """
+        Add an ingested event to its user's baseline
+
+        Args:
+            storage: Storage backend the deltas are flushed to
+            event: Stored log fields
+            sessions: Sessions the event finished (Sessionizer.record)
+        """
+        at = event_time(event['timestamp'])
+        weight = decay_weight(at)
+        user_id = event['user_id']
+        app_name = event['app_name']
+        event_type = event['event_type']
+        now = time.monotonic()
+
+        with self._lock:
+            self._storage = storage
+            deltas = self._deltas(user_id)
+            deltas.events += 1
+            deltas.add('totals', 'events', weight)
+
+            if event_type == 'opened':
+                deltas.add('totals', 'opens', weight)
+                deltas.add('hour_of_week', str(hour_of_week(at)), weight)
+                deltas.add('apps', app_name, weight)
+
+            for session in sessions:
+                seconds = session['duration_seconds']
+                if seconds is None:
+                    continue
+                session_deltas = self._deltas(session['user_id'])
+                session_weight = decay_weight(event_time(session['end']))
+                session_deltas.add('totals', 'sessions', session_weight)
+                session_deltas.add('totals', 'session_seconds', session_weight * seconds)
+                session_deltas.add('session_seconds', session_bucket(seconds), session_weight)
+
+            due = self._take_due(user_id, now)
+
+        self._write(storage, due)
+
+    def _take_due(self, user_id: str, now: float) -> List[Tuple[str, _PendingDeltas]]:
+        """Remove and return the deltas that should be flushed (lock held)"""
+        due = []
+        deltas = self._pending[user_id]
+        if deltas.events >= self.flush_events or now - deltas.since >= self.flush_seconds:
+            due.append((user_id, self._pending.pop(user_id)))
+
+        # Users that went quiet are flushed by whoever ingests next
+        if now - self._last_sweep >= self.flush_seconds:
+            self._last_sweep = now
+            for other_id in [uid for uid, d in self._pending.items() if now - d.since >= self.flush_seconds]:
+                due.append((other_id, self._pending.pop(other_id)))
+        return due
+
+    @staticmethod
+    def _write(storage, due: List[Tuple[str, _PendingDeltas]]) -> None:
+        for user_id, deltas in due:
+            try:
+                storage.increment_user_baseline(user_id, deltas.counters)
+            except Exception as e:
+                logger.warning('Baseline update failed: %s', e, extra={'user_id': user_id})
+
+    def flush(self) -> None:
+        """Write every buffered delta (called at shutdown)"""
+        with self._lock:
+            due = list(self._pending.items())
+            self._pending.clear()
+            storage = self._storage
+        if storage is not None:
+            self._write(storage, due)
+
+
+tracker = BaselineTracker(
+    flush_events=int(os.getenv('BASELINE_FLUSH_EVENTS', 20)),
+    flush_seconds=float(os.getenv('BASELINE_FLUSH_SECONDS', 60)),
+)
+atexit.register(tracker.flush)
+
+
+def load_baseline(storage, user_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Read a user's baseline, decayed to now
+
+    Args:
+        storage: Storage backend
+        user_id: User ID
+        now: Epoch seconds to decay to (default: current time)
+
+    Returns:
+        Dictionary with 'weight' (decayed opens), 'hour_of_week' (168
+        shares), 'app_mix' and 'session_lengths' (shares per bucket),
+        'mean_session_seconds' and 'updated_at', or None if there is no
+        baseline yet
+    """
+    raw = storage.get_user_baseline(user_id)
+    if not raw:
+        return None
+
+    scale = 1.0 / decay_weight(time.time() if now is None else now)
+    totals = {key: value * scale for key, value in raw.get('totals', {}).items()}
+    hours = raw.get('hour_of_week', {})
+    hour_counts = [hours.get(str(hour), 0.0) * scale for hour in range(HOURS_PER_WEEK)]
+
+    return {
+        'weight': totals.get('opens', 0.0),
+        'hour_of_week': _shares(dict(enumerate(hour_counts)), list(range(HOURS_PER_WEEK))),
+        'app_mix': _shares({app: count * scale for app, count in raw.get('apps', {}).items()}),
+        'session_lengths': _shares(
+            {key: count * scale for key, count in raw.get('session_seconds', {}).items()}
+        ),
+        'mean_session_seconds': (
+            totals['session_seconds'] / totals['sessions'] if totals.get('sessions') else None
+        ),
+        'updated_at': raw.get('updated_at'),
+    }
+
+
+def _shares(counts: Dict[Any, float], keys: Optional[List[Any]] = None):
+    """Normalize counts to shares (a list in `keys` order if given)"""
+    total = sum(counts.values())
+    if keys is not None:
+        return [counts.get(key, 0.0) / total if total else 0.0 for key in keys]
+    return {key: count / total for key, count in counts.items()} if total else {}
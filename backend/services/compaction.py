@@ -0,0 +1,121 @@
+"""
+Retention compaction of raw logs
+
+Logs older than the retention age are packed into one compressed segment
+per user and month (see services.archive), a summary rollup for the month
+is saved, and the original log documents are deleted in bulk. Each month
+is processed in that order -- segment, rollup, delete -- so a run that
+crashes part way never loses data: re-running it merges the leftover live
+logs into the existing segment by ID.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.archive import (
+    ArchiveStore, decode_segment, encode_segment, get_archive_store, segment_path
+)
+
+
+def retention_cutoff(older_than_days: int, now: Optional[datetime] = None) -> str:
+    """Timestamp before which logs are compacted, in the stored ISO8601 format"""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=older_than_days)).isoformat(timespec='microseconds')
+
+
+def _months(logs: Iterator[Dict[str, Any]]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Group logs ordered by timestamp into (YYYY-MM, logs) runs"""
+    month = None
+    group: List[Dict[str, Any]] = []
+    for log in logs:
+        log_month = log['timestamp'][:7]
+        if log_month != month and group:
+            yield month, group
+            group = []
+        month = log_month
+        group.append(log)
+    if group:
+        yield month, group
+
+
+def build_rollup(logs: List[Dict[str, Any]], archive_path: str) -> Dict[str, Any]:
+    """Summary of a month of logs kept in the database after compaction"""
+    return {
+        'count': len(logs),
+        'by_app': dict(Counter(log.get('app_name') for log in logs)),
+        'by_event_type': dict(Counter(log.get('event_type') for log in logs)),
+        'by_day': dict(Counter(log['timestamp'][:10] for log in logs)),
+        'first_timestamp': logs[0]['timestamp'],
+        'last_timestamp': logs[-1]['timestamp'],
+        'archive_path': archive_path,
+        'compacted_at': datetime.now(timezone.utc).isoformat(timespec='microseconds'),
+    }
+
+
+def compact_user(
+    storage,
+    user_id: str,
+    cutoff: str,
+    archive: Optional[ArchiveStore] = None,
+    dry_run: bool = False,
+    page_size: int = 500
+) -> Dict[str, Any]:
+    """
+    Compact one user's logs older than cutoff
+
+    Args:
+        storage: Storage backend
+        user_id: User ID
+        cutoff: Logs with timestamp < cutoff are compacted (ISO8601 string)
+        archive: Segment store (defaults to get_archive_store())
+        dry_run: Only count what would be compacted
+        page_size: Logs fetched per storage query
+
+    Returns:
+        Dictionary with the number of months and logs compacted
+    """
+    archive = archive or get_archive_store()
+    stats = {'user_id': user_id, 'months': 0, 'logs': 0}
+
+    # iter_logs bounds are inclusive; the cutoff itself is kept live
+    logs = (
+        log for log in storage.iter_logs(user_id, end_date=cutoff, page_size=page_size)
+        if log['timestamp'] < cutoff
+    )
+    for month, month_logs in _months(logs):
+        stats['months'] += 1
+        stats['logs'] += len(month_logs)
+        if dry_run:
+            continue
+
+        path = segment_path(user_id, month)
+        existing = archive.read(path)
+        if existing is not None:
+            merged = {log['id']: log for log in decode_segment(existing)}
+            merged.update((log['id'], log) for log in month_logs)
+            segment = sorted(merged.values(), key=lambda log: (log['timestamp'], log['id']))
+        else:
+            segment = month_logs
+
+        archive.write(path, encode_segment(segment))
+        storage.save_log_rollup(user_id, month, build_rollup(segment, path))
+        storage.delete_logs(user_id, [log['id'] for log in month_logs])
+
+    return stats
+
+
+def users_with_logs_before(storage, cutoff: str) -> Iterator[str]:
+    """
+    Yield users that still have logs older than cutoff
+
+    Uses the single oldest remaining log, so the caller must compact each
+    yielded user before asking for the next one. A user that comes back
+    again (nothing was deleted) ends the scan instead of looping.
+    """
+    seen = set()
+    while True:
+        log = storage.get_oldest_log(before=cutoff)
+        if log is None or log['user_id'] in seen:
+            return
+        seen.add(log['user_id'])
+        yield log['user_id']
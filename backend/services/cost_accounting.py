@@ -0,0 +1,248 @@
+"""
+Firestore operation accounting per route and per user
+
+Firestore bills per document read, write and delete, so FirestoreHelper
+reports every operation it issues through record(). Operations are
+added to the current scope: each request gets one (see
+init_cost_accounting), attributed to its route and the authenticated
+user (or the user an unauthenticated route names with attribute_to);
+work outside a request (scripts, background flushes) lands in the
+"(background)" route. Work a request hands to another thread that may
+outlive it (write-behind) runs in deferred_scope, which keeps the
+request's route and user. Finished scopes are folded into CostLedger, which
+/api/metrics summarizes.
+
+Queries are charged at least one read even when they return nothing,
+which is how Firestore bills them.
+
+With FIRESTORE_COST_HEADER=1 every response carries its own counts in an
+X-Firestore-Cost header (reads, writes, deletes, queries).
+"""
+import contextvars
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from flask import g, has_request_context, request
+
+OPERATIONS = ('reads', 'writes', 'deletes', 'queries')
+
+BACKGROUND_ROUTE = '(background)'
+
+COST_HEADER = 'X-Firestore-Cost'
+
+ACCOUNTING_ENABLED = os.getenv('FIRESTORE_COST_ACCOUNTING', '1') != '0'
+HEADER_ENABLED = os.getenv('FIRESTORE_COST_HEADER', '0') == '1'
+
+
+class OperationCounts:
+    """Thread-safe counters for one scope"""
+
+    __slots__ = ('_lock', 'counts')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(OPERATIONS, 0)
+
+    def add(self, reads: int = 0, writes: int = 0, deletes: int = 0, queries: int = 0) -> None:
+        with self._lock:
+            self.counts['reads'] += reads
+            self.counts['writes'] += writes
+            self.counts['deletes'] += deletes
+            self.counts['queries'] += queries
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+class CostLedger:
+    """Process-wide totals per route and per user"""
+
+    def __init__(self, max_users: int = 10000):
+        """
+        Args:
+            max_users: Users tracked individually; the least recently
+                active are folded into 'other_users'
+        """
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, int]] = {}
+        self._users: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._other_users = self._new_totals()
+
+    @staticmethod
+    def _new_totals() -> Dict[str, int]:
+        totals = dict.fromkeys(OPERATIONS, 0)
+        totals['requests'] = 0
+        return totals
+
+    @staticmethod
+    def _add(totals: Dict[str, int], counts: Dict[str, int], requests: int) -> None:
+        for operation in OPERATIONS:
+            totals[operation] += counts.get(operation, 0)
+        totals['requests'] += requests
+
+    def add(self, route: str, user_id: Optional[str], counts: Dict[str, int], requests: int = 1) -> None:
+        """Add one request's (or a background operation's, requests=0) counts"""
+        with self._lock:
+            totals = self._routes.get(route)
+            if totals is None:
+                totals = self._routes[route] = self._new_totals()
+            self._add(totals, counts, requests)
+
+            if user_id is None:
+                return
+            totals = self._users.get(user_id)
+            if totals is None:
+                totals = self._users[user_id] = self._new_totals()
+                if len(self._users) > self.max_users:
+                    _, evicted = self._users.popitem(last=False)
+                    for key, value in evicted.items():
+                        self._other_users[key] += value
+            else:
+                self._users.move_to_end(user_id)
+            self._add(totals, counts, requests)
+
+    def summary(self, top: int = 20) -> Dict[str, object]:
+        """
+        Totals, routes by billed operations and the top users
+
+        Returns:
+            Dictionary with 'totals', 'routes' and 'top_users' (both
+            sorted by reads + writes + deletes, most expensive first) and
+            'other_users' (users no longer tracked individually)
+        """
+        with self._lock:
+            routes = {route: dict(totals) for route, totals in self._routes.items()}
+            users = [(user_id, dict(totals)) for user_id, totals in self._users.items()]
+            other_users = dict(self._other_users)
+
+        def billed(totals):
+            return totals['reads'] + totals['writes'] + totals['deletes']
+
+        totals = self._new_totals()
+        for counts in routes.values():
+            for key in totals:
+                totals[key] += counts[key]
+        users.sort(key=lambda item: billed(item[1]), reverse=True)
+        return {
+            'enabled': ACCOUNTING_ENABLED,
+            'totals': totals,
+            'routes': dict(sorted(routes.items(), key=lambda item: billed(item[1]), reverse=True)),
+            'top_users': [{'user_id': user_id, **counts} for user_id, counts in users[:top]],
+            'other_users': other_users,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._users.clear()
+            self._other_users = self._new_totals()
+
+
+ledger = CostLedger(max_users=int(os.getenv('FIRESTORE_COST_MAX_USERS', 10000)))
+
+_scope: contextvars.ContextVar[Optional[OperationCounts]] = contextvars.ContextVar(
+    'firestore_cost_scope', default=None
+)
+
+
+def record(reads: int = 0, writes: int = 0, deletes: int = 0, queries: int = 0) -> None:
+    """Account Firestore operations to the current scope"""
+    if not ACCOUNTING_ENABLED:
+        return
+    scope = _scope.get()
+    if scope is not None:
+        scope.add(reads, writes, deletes, queries)
+    else:
+        ledger.add(BACKGROUND_ROUTE, None, {
+            'reads': reads, 'writes': writes, 'deletes': deletes, 'queries': queries,
+        }, requests=0)
+
+
+def record_query(documents: int) -> None:
+    """Account one query that returned documents results"""
+    record(reads=max(1, documents), queries=1)
+
+
+def attribute_to(user_id: str) -> None:
+    """Attribute the current request's operations to user_id (unauthenticated routes)"""
+    g.cost_user_id = user_id
+
+
+def current_attribution() -> Tuple[str, Optional[str]]:
+    """(route, user_id) the current request's operations are billed to"""
+    if not has_request_context():
+        return BACKGROUND_ROUTE, None
+    rule = request.url_rule
+    route = f'{request.method} {rule.rule}' if rule is not None else f'{request.method} (unmatched)'
+    return route, getattr(request, 'user_id', None) or g.get('cost_user_id')
+
+
+@contextmanager
+def deferred_scope(route: str, user_id: Optional[str]) -> Iterator[None]:
+    """
+    Account operations to route and user_id without counting a request
+
+    For work that finishes after its request was torn down; pass the
+    values of current_attribution() taken inside the request.
+    """
+    scope = OperationCounts()
+    token = _scope.set(scope)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+        if ACCOUNTING_ENABLED:
+            ledger.add(route, user_id, scope.snapshot(), requests=0)
+
+
+def current_counts() -> Optional[Dict[str, int]]:
+    scope = _scope.get()
+    return scope.snapshot() if scope is not None else None
+
+
+def format_header(counts: Dict[str, int]) -> str:
+    return ', '.join(f'{operation}={counts[operation]}' for operation in OPERATIONS)
+
+
+def _start_scope() -> None:
+    g.cost_scope = OperationCounts()
+    g.cost_scope_token = _scope.set(g.cost_scope)
+
+
+def _add_header(response):
+    counts = current_counts()
+    if HEADER_ENABLED and counts is not None:
+        response.headers[COST_HEADER] = format_header(counts)
+    return response
+
+
+def _finish_scope(exc=None) -> None:
+    scope = g.pop('cost_scope', None)
+    token = g.pop('cost_scope_token', None)
+    if scope is None:
+        return
+    try:
+        _scope.reset(token)
+    except ValueError:
+        # Torn down from another context (e.g. a streamed response)
+        _scope.set(None)
+    route, user_id = current_attribution()
+    ledger.add(route, user_id, scope.snapshot())
+
+
+def init_cost_accounting(app) -> None:
+    """Open an accounting scope per request and fold it into the ledger at teardown"""
+    if not ACCOUNTING_ENABLED:
+        return
+    app.before_request(_start_scope)
+    app.after_request(_add_header)
+    app.teardown_request(_finish_scope)
+
+
+def summary(top: int = 20) -> Dict[str, object]:
+    return ledger.summary(top)
@@ -0,0 +1,207 @@
+"""
+Streaming export of a user's log history
+
+Logs are walked with keyset pagination (StorageBackend.iter_logs) and
+encoded page by page, so memory use stays constant regardless of how much
+history is exported. Months already moved to the archive by the
+compaction job (services.archive) are streamed first.
+
+Exports are resumable: every exported record carries its timestamp and
+id, and "<timestamp>|<id>" of the last record received is the cursor to
+continue from.
+
+Parquet output needs the optional pyarrow dependency
+(uv sync --extra export).
+"""
+import csv
+import io
+import itertools
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from services.archive import iter_archived_logs
+from services.json_provider import dumps_bytes
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+EXPORT_COLUMNS = ['id', 'user_id', 'app_name', 'event_type', 'timestamp', 'created_at']
+
+# Flush encoded output once this many bytes are buffered
+CHUNK_BYTES = 64 * 1024
+
+
+class ExportError(ValueError):
+    """Raised for invalid export parameters"""
+
+
+def encode_cursor(log: Dict[str, Any]) -> str:
+    """Cursor pointing just past log"""
+    return f"{log['timestamp']}|{log['id']}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Parse a "<timestamp>|<id>" cursor"""
+    if not cursor:
+        return None
+    timestamp, sep, doc_id = cursor.rpartition('|')
+    if not sep or not timestamp or not doc_id:
+        raise ExportError('Invalid cursor. Expected "<timestamp>|<id>"')
+    return timestamp, doc_id
+
+
+def _row(log: Dict[str, Any]) -> Dict[str, Any]:
+    return {column: log.get(column) for column in EXPORT_COLUMNS}
+
+
+def _text_row(log: Dict[str, Any]) -> Dict[str, Any]:
+    """_row with every value as text, for the CSV and Parquet encoders"""
+    row = {}
+    for column in EXPORT_COLUMNS:
+        value = log.get(column)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        row[column] = None if value is None else str(value)
+    return row
+
+
+def ndjson_chunks(logs: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Encode logs as newline-delimited JSON"""
+    buffer = []
+    size = 0
+    for log in logs:
+        line = dumps_bytes(_row(log), default=str) + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def csv_chunks(logs: Iterable[Dict[str, Any]], header: bool = True) -> Iterator[bytes]:
+    """Encode logs as CSV"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+    if header:
+        writer.writeheader()
+    for log in logs:
+        writer.writerow(_text_row(log))
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_chunks(logs: Iterable[Dict[str, Any]], row_group_size: int = 10000) -> Iterator[bytes]:
+    """
+    Encode logs as Parquet, one row group at a time
+
+    Each row group is flushed to the output as soon as it is full, so only
+    row_group_size rows are ever buffered.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError('Parquet export requires pyarrow (uv sync --extra export)') from None
+
+    schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+
+    def flush(rows):
+        columns = {column: [row[column] for row in rows] for column in EXPORT_COLUMNS}
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    rows = []
+    try:
+        for log in logs:
+            rows.append(_text_row(log))
+            if len(rows) >= row_group_size:
+                flush(rows)
+                rows = []
+                yield sink.drain()
+        if rows:
+            flush(rows)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(
+    storage,
+    user_id: str,
+    fmt: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page_size: int = 500,
+    header: bool = True
+) -> Iterator[bytes]:
+    """
+    Stream a user's logs (oldest first) in the requested format
+
+    Args:
+        storage: Storage backend
+        user_id: User ID
+        fmt: One of EXPORT_FORMATS
+        start_date: Start date (ISO8601 string)
+        end_date: End date (ISO8601 string)
+        cursor: Resume after this "<timestamp>|<id>" cursor
+        page_size: Logs fetched per storage query
+        header: Write the CSV header row
+
+    Returns:
+        Iterator of encoded byte chunks
+
+    Raises:
+        ExportError: If the format or cursor is invalid
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported format. Expected one of: {', '.join(EXPORT_FORMATS)}")
+    after = decode_cursor(cursor)
+
+    # Compacted months are older than every live log, so they come first
+    logs = itertools.chain(
+        iter_archived_logs(storage, user_id, start_date=start_date, end_date=end_date, after=after),
+        storage.iter_logs(
+            user_id, start_date=start_date, end_date=end_date, after=after, page_size=page_size
+        )
+    )
+    if fmt == 'ndjson':
+        return ndjson_chunks(logs)
+    if fmt == 'csv':
+        return csv_chunks(logs, header=header)
+    return parquet_chunks(logs)
@@ -0,0 +1,112 @@
+"""
+Merged activity feed of linked accounts
+
+A user who lists partners in their settings' shared_with lets those
+partners see their logs. feed_page gives a viewer one newest-first page
+of their own logs and those of every user sharing with them.
+
+Each user's logs are an ordered stream read page by page with keyset
+queries (get_logs_page). The first page of every stream is fetched
+concurrently; heapq.merge then merges the streams lazily by
+(timestamp, id) and the feed stops as soon as the requested page is full.
+Per-user pages are sized to the viewer's share of the page, so a quiet
+partner costs one small query and only an account that dominates the
+page has further pages read. A page costs about `limit` reads, not one
+full page per linked user.
+
+Pages continue from a "<timestamp>|<id>" cursor, like the export. The
+feed covers live logs only; compacted months are left out.
+"""
+import contextvars
+import heapq
+import itertools
+import math
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.export import ExportError, decode_cursor, encode_cursor
+
+FANOUT_WORKERS = int(os.getenv('FEED_FANOUT_WORKERS', 16))
+
+# Users merged into one feed: the viewer and up to 20 linked accounts
+MAX_FEED_USERS = int(os.getenv('FEED_MAX_USERS', 21))
+
+# Smallest per-user page, so a busy partner isn't fetched a few logs at a time
+MIN_PAGE_SIZE = 10
+
+MAX_LIMIT = 500
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='feed-load')
+
+
+class FeedError(ValueError):
+    """Raised for invalid feed parameters"""
+
+
+def feed_user_ids(storage, viewer_id: str) -> List[str]:
+    """The viewer followed by everyone sharing their logs with them"""
+    linked = [user_id for user_id in storage.get_users_sharing_with(viewer_id) if user_id != viewer_id]
+    return [viewer_id] + linked[:MAX_FEED_USERS - 1]
+
+
+def _user_stream(storage, user_id: str, first_page: Future, page_size: int,
+                 start_date: Optional[str], end_date: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """One user's logs newest first, reading the next page only when needed"""
+    page = first_page.result()
+    while True:
+        yield from page
+        if len(page) < page_size:
+            return
+        after = (page[-1]['timestamp'], page[-1]['id'])
+        page = storage.get_logs_page(user_id, start_date, end_date, after, page_size, descending=True)
+
+
+def feed_page(
+    storage,
+    user_ids: List[str],
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of the merged feed of user_ids, newest first
+
+    Args:
+        storage: Storage backend
+        user_ids: Users whose logs are merged (see feed_user_ids)
+        limit: Page size
+        cursor: "<timestamp>|<id>" of the last log of the previous page
+        start_date: Oldest timestamp to include (ISO8601 string)
+        end_date: Newest timestamp to include (ISO8601 string)
+
+    Returns:
+        (logs, cursor of the next page or None if this is the last one)
+
+    Raises:
+        FeedError: If the limit or cursor is invalid
+    """
+    if not 1 <= limit <= MAX_LIMIT:
+        raise FeedError(f'limit must be between 1 and {MAX_LIMIT}')
+    try:
+        after = decode_cursor(cursor)
+    except ExportError as e:
+        raise FeedError(str(e)) from None
+
+    # One log past the page tells whether there is a next page
+    wanted = limit + 1
+    page_size = max(MIN_PAGE_SIZE, math.ceil(wanted / len(user_ids)))
+    streams = []
+    for user_id in user_ids:
+        context = contextvars.copy_context()
+        first_page = _executor.submit(
+            context.run, storage.get_logs_page, user_id, start_date, end_date, after, page_size, True
+        )
+        streams.append(_user_stream(storage, user_id, first_page, page_size, start_date, end_date))
+
+    merged = heapq.merge(*streams, key=lambda log: (log['timestamp'], log['id']), reverse=True)
+    logs = list(itertools.islice(merged, wanted))
+    if len(logs) > limit:
+        return logs[:limit], encode_cursor(logs[limit - 1])
+    return logs, None
@@ -0,0 +1,113 @@
+"""
+Idempotent ingestion support for the webhook
+
+iOS Shortcuts retries requests on flaky networks, so the same event can
+arrive several times. Each event is mapped to a deterministic document ID
+derived from either the client's Idempotency-Key header or the event's
+natural key (user_id, app_name, event_type, timestamp). Recently seen IDs
+are kept in a bounded in-memory index so retries hitting the same
+instance are dropped without touching Firestore; the deterministic ID
+catches the rest at write time.
+"""
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from services.ttl_cache import TTLCache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# Longest header value we accept; anything bigger is not a sane key
+MAX_KEY_LENGTH = 256
+
+
+def derive_key(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Derive an idempotency key from the event's natural key
+
+    Only events carrying a client timestamp can be deduplicated this way;
+    a server-assigned timestamp differs on every retry.
+
+    Args:
+        data: Webhook payload
+
+    Returns:
+        str or None: Natural key, or None if the event has no timestamp
+    """
+    timestamp = data.get('timestamp')
+    if not timestamp:
+        return None
+    return '\x1f'.join(
+        str(data.get(field, '')) for field in ('app_name', 'event_type', 'timestamp')
+    )
+
+
+def document_id(user_id: str, key: str) -> str:
+    """
+    Build the deterministic Firestore document ID for an idempotency key
+
+    Keys are namespaced by user so two users sending the same header value
+    never collide.
+    """
+    digest = hashlib.sha256(f'{user_id}\x1e{key}'.encode('utf-8')).hexdigest()
+    return digest[:40]
+
+
+def resolve_document_id(
+    user_id: str,
+    data: Dict[str, Any],
+    header_value: Optional[str],
+    index: Optional[int] = None
+) -> Optional[str]:
+    """
+    Resolve the document ID for an incoming event
+
+    Args:
+        user_id: User ID from the payload
+        data: Webhook payload
+        header_value: Raw Idempotency-Key header value, if any
+        index: Position of the event in a batch sharing one header value
+
+    Returns:
+        str or None: Deterministic document ID, or None if the event
+        cannot be deduplicated
+    """
+    # The index is appended after truncation so long keys stay distinct per event
+    key = (header_value or '').strip()[:MAX_KEY_LENGTH]
+    if key and index is not None:
+        key = f'{key}:{index}'
+    key = key or derive_key(data)
+    if not key:
+        return None
+    return document_id(user_id, key)
+
+
+class IdempotencyIndex:
+    """
+    Bounded, TTL-based index of recently ingested event document IDs
+    """
+
+    def __init__(self, maxsize: int = 50000, ttl: float = 3600.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def claim(self, doc_id: str) -> bool:
+        """
+        Atomically claim a document ID for writing
+
+        Returns:
+            bool: True if the caller should write the event, False if the
+            ID was already claimed recently (duplicate)
+        """
+        return self._cache.add(doc_id)
+
+    def release(self, doc_id: str) -> None:
+        """
+        Release a claim after a failed write so a retry can go through
+        """
+        self._cache.pop(doc_id)
+
+
+recent_events = IdempotencyIndex(
+    maxsize=int(os.getenv('IDEMPOTENCY_INDEX_SIZE', 50000)),
+    ttl=float(os.getenv('IDEMPOTENCY_TTL_SECONDS', 3600)),
+)
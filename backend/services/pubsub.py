@@ -0,0 +1,116 @@
+"""
+In-process publish/subscribe fan-out for live updates
+
+Publishers (webhook, analysis) push small messages to a per-user topic;
+each subscriber (an open /api/stream connection) owns a bounded queue, so
+a slow client can only ever hold maxsize messages — the oldest are
+dropped and counted. LocalPubSub only fans out within one instance; a
+shared backend (e.g. Redis or Cloud Pub/Sub) can implement the same
+publish/subscribe/unsubscribe interface.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Set
+
+
+class Subscription:
+    """A subscriber's bounded message queue"""
+
+    def __init__(self, topic: str, maxsize: int = 100):
+        self.topic = topic
+        self.dropped = 0
+        self.closed = False
+        self._queue: deque = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+
+    def push(self, message: Dict[str, Any]) -> None:
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(message)
+            self._cond.notify()
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait up to timeout seconds for the next message
+
+        Returns:
+            dict or None: Next message, or None on timeout / close
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._queue and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._queue:
+                return self._queue.popleft()
+            return None
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class LocalPubSub:
+    """Topic -> subscribers registry within this process"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def publish(self, topic: str, message: Dict[str, Any]) -> int:
+        """
+        Deliver message to every subscriber of topic
+
+        Returns:
+            int: Number of subscribers the message was delivered to
+        """
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        if not subscribers:
+            return 0
+        message = dict(message, id=next(self._ids))
+        for subscription in subscribers:
+            subscription.push(message)
+        return len(subscribers)
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic, self.queue_size)
+        with self._lock:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.close()
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.topic]
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return sum(len(subscribers) for subscribers in self._topics.values())
+
+
+def user_topic(user_id: str) -> str:
+    return f'user:{user_id}'
+
+
+def publish_to_user(user_id: str, message_type: str, data: Dict[str, Any]) -> int:
+    """Publish a typed message to a user's live stream (no-op without subscribers)"""
+    return bus.publish(user_topic(user_id), {'type': message_type, 'data': data})
+
+
+bus = LocalPubSub(queue_size=int(os.getenv('STREAM_QUEUE_SIZE', 100)))
@@ -0,0 +1,350 @@
+"""
+Streaming detection rules evaluated on every ingested event
+
+Each user has a small in-memory state (recent open times, last hit per
+rule, cached quiet hours) and every rule is evaluated in constant time
+against that state, so suspicious events are flagged the moment they are
+ingested without re-reading log history.
+
+Rules are declarative dicts (DEFAULT_RULES, or a JSON list in the file
+named by DETECTION_RULES_FILE):
+
+    {"id": "quiet_hours_open", "type": "quiet_hours", "event_types": ["opened"],
+     "severity": "high", "cooldown_seconds": 900}
+    {"id": "rapid_reopen", "type": "burst", "event_types": ["opened"],
+     "count": 5, "window_seconds": 300, "severity": "medium"}
+    {"id": "app_hopping", "type": "app_switch", "event_types": ["opened"],
+     "distinct_apps": 3, "window_seconds": 120, "severity": "medium"}
+
+Quiet hours come from user_settings:
+    {"quiet_hours": {"start": "23:00", "end": "07:00"}, "timezone": "Asia/Tokyo"}
+"""
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from services.settings_cache import settings_cache
+from services.ttl_cache import TTLCache
+
+DEFAULT_TIMEZONE = os.getenv('DEFAULT_TIMEZONE', 'Asia/Tokyo')
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        'id': 'quiet_hours_open',
+        'type': 'quiet_hours',
+        'event_types': ['opened'],
+        'severity': 'high',
+        'cooldown_seconds': 900,
+    },
+    {
+        'id': 'rapid_reopen',
+        'type': 'burst',
+        'event_types': ['opened'],
+        'count': 5,
+        'window_seconds': 300,
+        'severity': 'medium',
+        'cooldown_seconds': 900,
+    },
+    {
+        'id': 'app_hopping',
+        'type': 'app_switch',
+        'event_types': ['opened'],
+        'distinct_apps': 3,
+        'window_seconds': 120,
+        'severity': 'medium',
+        'cooldown_seconds': 900,
+    },
+]
+
+
+class UserState:
+    """Compact per-user sliding-window state"""
+
+    __slots__ = ('lock', 'recent', 'last_hit', 'quiet_hours', 'tz', 'settings', 'settings_loaded_at')
+
+    def __init__(self, history: int):
+        self.lock = threading.Lock()
+        # (epoch seconds, app_name) of recent matching events, newest last
+        self.recent: deque = deque(maxlen=history)
+        # (rule_id, app_name) -> epoch seconds of the last hit
+        self.last_hit: Dict[Tuple[str, str], float] = {}
+        self.quiet_hours: Optional[Tuple[int, int]] = None
+        self.tz = timezone.utc
+        self.settings = None
+        self.settings_loaded_at = float('-inf')
+
+
+def _parse_clock(value: str) -> int:
+    hours, minutes = value.split(':', 1)
+    return int(hours) * 60 + int(minutes)
+
+
+def _resolve_timezone(name: Optional[str]):
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+class Rule(ABC):
+    """Base class for declarative rules"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.id = config['id']
+        self.severity = config.get('severity', 'medium')
+        self.event_types = set(config.get('event_types', ['opened']))
+        self.cooldown = float(config.get('cooldown_seconds', 0))
+        # Whether the cooldown is tracked per app or across all apps
+        self.per_app = bool(config.get('per_app', self.default_per_app))
+
+    default_per_app = False
+
+    @property
+    def history(self) -> int:
+        """How many recent events this rule needs in UserState.recent"""
+        return 1
+
+    @abstractmethod
+    def matches(self, state: UserState, at: float, app_name: str) -> Optional[str]:
+        """Return a human-readable message if the rule fires, else None"""
+
+
+class QuietHoursRule(Rule):
+    """Fires when an app is used inside the user's quiet hours"""
+
+    default_per_app = True
+
+    def matches(self, state, at, app_name):
+        if state.quiet_hours is None:
+            return None
+        start, end = state.quiet_hours
+        local = datetime.fromtimestamp(at, state.tz)
+        minute = local.hour * 60 + local.minute
+        inside = start <= minute < end if start < end else (minute >= start or minute < end)
+        if inside:
+            return f'{app_name} was used at {local:%H:%M} during quiet hours'
+        return None
+
+
+class BurstRule(Rule):
+    """Fires when count matching events happen within window_seconds"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.count = int(config.get('count', 5))
+        self.window = float(config.get('window_seconds', 300))
+
+    @property
+    def history(self):
+        return self.count
+
+    def matches(self, state, at, app_name):
+        if len(state.recent) < self.count:
+            return None
+        oldest = state.recent[-self.count][0]
+        if 0 <= at - oldest <= self.window:
+            return f'{self.count} app opens within {int(self.window)} seconds'
+        return None
+
+
+class AppSwitchRule(Rule):
+    """Fires when distinct_apps different apps are opened within window_seconds"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.distinct_apps = int(config.get('distinct_apps', 3))
+        self.window = float(config.get('window_seconds', 120))
+
+    @property
+    def history(self):
+        # Enough entries to see distinct_apps apps even with some repeats
+        return self.distinct_apps * 2
+
+    def matches(self, state, at, app_name):
+        apps = set()
+        for seen_at, seen_app in state.recent:
+            if 0 <= at - seen_at <= self.window:
+                apps.add(seen_app)
+        if len(apps) >= self.distinct_apps:
+            return f'{len(apps)} different apps opened within {int(self.window)} seconds'
+        return None
+
+
+RULE_TYPES = {
+    'quiet_hours': QuietHoursRule,
+    'burst': BurstRule,
+    'app_switch': AppSwitchRule,
+}
+
+
+def build_rules(configs: List[Dict[str, Any]]) -> List[Rule]:
+    """Instantiate rule objects from declarative configs"""
+    rules = []
+    for config in configs:
+        rule_type = RULE_TYPES.get(config.get('type'))
+        if rule_type is None:
+            raise ValueError(f"Unknown rule type: {config.get('type')}")
+        rules.append(rule_type(config))
+    return rules
+
+
+def load_rule_configs() -> List[Dict[str, Any]]:
+    """Rules from DETECTION_RULES_FILE, or DEFAULT_RULES"""
+    path = os.getenv('DETECTION_RULES_FILE')
+    if path:
+        with open(path) as f:
+            return json.load(f)
+    return DEFAULT_RULES
+
+
+class RuleEngine:
+    """Evaluates rules against per-user state for each incoming event"""
+
+    def __init__(
+        self,
+        rules: List[Rule],
+        settings_loader: Callable[[str], Optional[Dict[str, Any]]],
+        max_users: int = 10000,
+        state_ttl: float = 6 * 3600,
+        settings_ttl: float = 300
+    ):
+        """
+        Args:
+            rules: Compiled rules
+            settings_loader: Returns a user's settings dict (or None); an
+                unchanged settings object is not re-parsed
+            max_users: Maximum number of user states kept in memory
+            state_ttl: Seconds an idle user's state is kept
+            settings_ttl: Seconds before settings_loader is called again
+        """
+        self.rules = rules
+        self.settings_loader = settings_loader
+        self.settings_ttl = settings_ttl
+        self._history = max([rule.history for rule in rules] + [1])
+        self._states = TTLCache(maxsize=max_users, ttl=state_ttl)
+        self._create_lock = threading.Lock()
+
+    def _state(self, user_id: str) -> UserState:
+        state = self._states.get(user_id)
+        if state is None:
+            with self._create_lock:
+                state = self._states.get(user_id)
+                if state is None:
+                    state = UserState(self._history)
+                    self._states.set(user_id, state)
+                return state
+        # Refresh the TTL on every event so active users stay resident
+        self._states.set(user_id, state)
+        return state
+
+    def _refresh_settings(self, user_id: str, state: UserState) -> None:
+        now = time.monotonic()
+        if now - state.settings_loaded_at < self.settings_ttl:
+            return
+        state.settings_loaded_at = now
+        try:
+            settings = self.settings_loader(user_id)
+        except Exception:
+            return
+        if settings is not None and settings is state.settings:
+            return  # Same snapshot as last time, nothing to re-parse
+        state.settings = settings
+        settings = settings or {}
+        quiet_hours = settings.get('quiet_hours') or {}
+        try:
+            state.quiet_hours = (
+                (_parse_clock(quiet_hours['start']), _parse_clock(quiet_hours['end']))
+                if quiet_hours.get('start') and quiet_hours.get('end') else None
+            )
+        except (ValueError, TypeError):
+            state.quiet_hours = None
+        state.tz = _resolve_timezone(settings.get('timezone'))
+
+    def evaluate(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Update the user's state with event and return rule hits
+
+        Args:
+            event: Stored log fields (user_id, app_name, event_type, timestamp)
+
+        Returns:
+            List of detection dictionaries (empty if nothing fired)
+        """
+        try:
+            at = datetime.fromisoformat(event['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return []
+
+        user_id = event['user_id']
+        app_name = event.get('app_name', '')
+        event_type = event.get('event_type')
+        state = self._state(user_id)
+        hits = []
+
+        with state.lock:
+            self._refresh_settings(user_id, state)
+            if event_type == 'opened':
+                state.recent.append((at, app_name))
+
+            for rule in self.rules:
+                if event_type not in rule.event_types:
+                    continue
+                message = rule.matches(state, at, app_name)
+                if message is None:
+                    continue
+                key = (rule.id, app_name if rule.per_app else '*')
+                last = state.last_hit.get(key)
+                if last is not None and abs(at - last) < rule.cooldown:
+                    continue
+                state.last_hit[key] = at
+                hits.append({
+                    'rule_id': rule.id,
+                    'severity': rule.severity,
+                    'message': message,
+                    'app_name': app_name,
+                    'event_type': event_type,
+                    'event_timestamp': event['timestamp'],
+                })
+
+        return hits
+
+
+# Settings come from the same cached snapshot the webhook uses, so they are
+# looked up on every event (a dict lookup) and picked up as soon as
+# save_user_settings invalidates them
+engine = RuleEngine(
+    build_rules(load_rule_configs()),
+    settings_loader=settings_cache.get_settings,
+    max_users=int(os.getenv('DETECTION_MAX_USERS', 10000)),
+    settings_ttl=0,
+)
+
+
+def detect(storage, event_id: str, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Run the rule engine for a stored event and persist any hits
+
+    Args:
+        storage: Storage backend (or None if unavailable)
+        event_id: ID of the stored event
+        event: Stored log fields
+
+    Returns:
+        List of saved detections (with their IDs)
+    """
+    from services.pubsub import publish_to_user
+
+    detections = []
+    for hit in engine.evaluate(event):
+        hit['event_id'] = event_id
+        if storage:
+            hit['id'] = storage.save_detection(event['user_id'], dict(hit))
+        publish_to_user(event['user_id'], 'detection', hit)
+        detections.append(hit)
+    return detections
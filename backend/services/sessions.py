@@ -0,0 +1,219 @@
+"""
+App usage sessions materialized from opened/closed events
+
+Ingest feeds every stored event to Sessionizer, which pairs each user's
+"opened" with the event that ends it and writes one compact session
+record, so timelines and analysis read sessions instead of re-pairing raw
+logs. iOS has one foreground app at a time, so a session ends with:
+
+- closed: a "closed" event of the same app
+- superseded: an "opened" event of another app (or the same app again),
+  when the close never arrived
+- timeout: nothing within SESSION_TIMEOUT_SECONDS, or the instance shut
+  down first; the end is unknown, so end and duration_seconds are None
+
+"closed" events without a matching open (e.g. the open went to another
+instance) and events older than the open they would pair with are
+ignored. "notification" events don't affect sessions.
+
+Finished sessions are buffered and written in batches of
+SESSION_FLUSH_SIZE, or after SESSION_FLUSH_SECONDS, under a document ID
+derived from (user, app, start), so a rewrite replaces instead of
+duplicating. Each record holds:
+    {user_id, app_name, start, end, duration_seconds, end_reason}
+"""
+import atexit
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SESSION_TIMEOUT_SECONDS = float(os.getenv('SESSION_TIMEOUT_SECONDS', 6 * 3600))
+
+END_REASONS = ('closed', 'superseded', 'timeout')
+
+
+def session_id(user_id: str, app_name: str, start: str) -> str:
+    """Deterministic 20-character document ID of a session"""
+    digest = hashlib.sha256(f'{user_id}\x00{app_name}\x00{start}'.encode('utf-8')).hexdigest()
+    return digest[:20]
+
+
+class _OpenSession:
+    """A user's foreground app awaiting the event that ends it"""
+
+    __slots__ = ('app_name', 'start', 'at', 'seen')
+
+    def __init__(self, app_name: str, start: str, at: float, seen: float):
+        self.app_name = app_name
+        self.start = start
+        self.at = at
+        self.seen = seen
+
+
+class Sessionizer:
+    """Pairs ingested events into sessions and writes them in batches"""
+
+    def __init__(
+        self,
+        timeout: float = SESSION_TIMEOUT_SECONDS,
+        flush_size: int = 50,
+        flush_seconds: float = 30.0,
+        max_open_users: int = 100000
+    ):
+        """
+        Args:
+            timeout: Seconds an open session waits for the event ending it
+            flush_size: Write buffered sessions once this many are pending
+            flush_seconds: Write buffered sessions older than this
+            max_open_users: Users with an open session kept in memory; the
+                least recently seen are timed out beyond that
+        """
+        self.timeout = timeout
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.max_open_users = max_open_users
+        self._lock = threading.Lock()
+        self._open: "OrderedDict[str, _OpenSession]" = OrderedDict()
+        self._buffer: List[Tuple[str, Dict[str, Any]]] = []
+        self._buffer_since = time.monotonic()
+        self._last_sweep = time.monotonic()
+        self._storage = None
+        self.stats = {'sessions': 0, 'timeouts': 0, 'orphan_closes': 0, 'out_of_order': 0, 'errors': 0}
+
+    def record(self, storage, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Feed a stored event to its user's session state
+
+        Args:
+            storage: Storage backend sessions are written to
+            event: Stored log fields
+
+        Returns:
+            Sessions finished by this call (of any user, since timed out
+            sessions are swept here too)
+        """
+        event_type = event['event_type']
+        if event_type not in ('opened', 'closed'):
+            return []
+        user_id = event['user_id']
+        app_name = event['app_name']
+        timestamp = event['timestamp']
+        at = datetime.fromisoformat(timestamp).timestamp()
+        now = time.monotonic()
+
+        finished = []
+        with self._lock:
+            self._storage = storage
+            current = self._open.get(user_id)
+            if current is not None and at < current.at:
+                self.stats['out_of_order'] += 1
+            elif event_type == 'opened':
+                if current is not None:
+                    reason = 'superseded' if at - current.at <= self.timeout else 'timeout'
+                    finished.append(self._finish(user_id, current, timestamp, at, reason))
+                self._open[user_id] = _OpenSession(app_name, timestamp, at, now)
+                self._open.move_to_end(user_id)
+                while len(self._open) > self.max_open_users:
+                    evicted_id, evicted = self._open.popitem(last=False)
+                    finished.append(self._finish(evicted_id, evicted, None, None, 'timeout'))
+            elif current is not None and current.app_name == app_name and at > current.at:
+                del self._open[user_id]
+                reason = 'closed' if at - current.at <= self.timeout else 'timeout'
+                finished.append(self._finish(user_id, current, timestamp, at, reason))
+            else:
+                self.stats['orphan_closes'] += 1
+
+            if now - self._last_sweep >= self.flush_seconds:
+                self._last_sweep = now
+                finished.extend(self._sweep(now))
+            due = self._take_due(now)
+
+        self._write(storage, due)
+        return finished
+
+    def _finish(self, user_id: str, session: _OpenSession, end: Optional[str],
+                at: Optional[float], reason: str) -> Dict[str, Any]:
+        """Build a finished session record and buffer it (lock held)"""
+        if reason == 'timeout':
+            end = at = None
+            self.stats['timeouts'] += 1
+        record = {
+            'user_id': user_id,
+            'app_name': session.app_name,
+            'start': session.start,
+            'end': end,
+            'duration_seconds': round(at - session.at, 3) if at is not None else None,
+            'end_reason': reason,
+        }
+        if not self._buffer:
+            self._buffer_since = time.monotonic()
+        self._buffer.append((session_id(user_id, session.app_name, session.start), record))
+        self.stats['sessions'] += 1
+        return record
+
+    def _sweep(self, now: float) -> List[Dict[str, Any]]:
+        """Time out sessions nothing happened to for too long (lock held)"""
+        finished = []
+        while self._open:
+            user_id, session = next(iter(self._open.items()))
+            if now - session.seen < self.timeout:
+                break
+            del self._open[user_id]
+            finished.append(self._finish(user_id, session, None, None, 'timeout'))
+        return finished
+
+    def _take_due(self, now: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """Remove and return the buffered sessions if they should be written (lock held)"""
+        if not self._buffer:
+            return []
+        if len(self._buffer) < self.flush_size and now - self._buffer_since < self.flush_seconds:
+            return []
+        due, self._buffer = self._buffer, []
+        return due
+
+    def _write(self, storage, due: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if not due:
+            return
+        try:
+            storage.save_sessions(due)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.warning('Saving %d sessions failed: %s', len(due), e)
+
+    def flush(self, close_open: bool = False) -> None:
+        """
+        Write every buffered session
+
+        Args:
+            close_open: Also time out the sessions still open (at shutdown,
+                when their ends can no longer arrive here)
+        """
+        with self._lock:
+            if close_open:
+                while self._open:
+                    user_id, session = self._open.popitem(last=False)
+                    self._finish(user_id, session, None, None, 'timeout')
+            due, self._buffer = self._buffer, []
+            storage = self._storage
+        if storage is not None:
+            self._write(storage, due)
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, 'open': len(self._open), 'buffered': len(self._buffer)}
+
+
+sessionizer = Sessionizer(
+    timeout=SESSION_TIMEOUT_SECONDS,
+    flush_size=int(os.getenv('SESSION_FLUSH_SIZE', 50)),
+    flush_seconds=float(os.getenv('SESSION_FLUSH_SECONDS', 30)),
+)
+atexit.register(sessionizer.flush, close_open=True)
@@ -0,0 +1,122 @@
+"""
+Cached per-user settings snapshots for the ingest path
+
+Every webhook event needs the user's settings (per-app recording switches,
+quiet hours), but reading user_settings per event would double the
+Firestore operations of ingest. SettingsCache keeps an immutable snapshot
+per user in a bounded TTL cache; users without settings are cached too,
+so a steady stream of events costs one read per user per TTL.
+save_user_settings invalidates the user's snapshot on this instance;
+other instances pick the change up within SETTINGS_CACHE_TTL_SECONDS.
+
+Recording switches live in user_settings as a map of app name to bool:
+    {"recording": {"line": true, "tiktok": false}}
+Apps that aren't listed are recorded.
+"""
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, Mapping, Optional
+
+from services.ttl_cache import TTLCache
+
+
+class SettingsSnapshot:
+    """Read-only view of one user's settings"""
+
+    __slots__ = ('settings', 'disabled_apps')
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        self.settings: Mapping[str, Any] = MappingProxyType(dict(settings or {}))
+        recording = self.settings.get('recording')
+        self.disabled_apps: FrozenSet[str] = frozenset(
+            app for app, enabled in recording.items() if enabled is False
+        ) if isinstance(recording, dict) else frozenset()
+
+    def records(self, app_name: str) -> bool:
+        """Whether events of app_name should be stored"""
+        return app_name not in self.disabled_apps
+
+
+_EMPTY = SettingsSnapshot()
+
+
+class SettingsCache:
+    """Bounded TTL cache of SettingsSnapshot per user"""
+
+    def __init__(
+        self,
+        loader: Callable[[str], Optional[Dict[str, Any]]],
+        max_users: int = 10000,
+        ttl: float = 300.0
+    ):
+        """
+        Args:
+            loader: Returns a user's settings dict (or None)
+            max_users: Maximum number of snapshots kept
+            ttl: Seconds before a snapshot is re-read
+        """
+        self.loader = loader
+        self._snapshots = TTLCache(maxsize=max_users, ttl=ttl)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0}
+        # Bumped by invalidate; a load that raced an invalidation isn't cached
+        self._generation = 0
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, user_id: str) -> SettingsSnapshot:
+        """
+        Return the user's snapshot, loading it on a miss
+
+        Load failures fail open: an empty snapshot (record everything, no
+        quiet hours) is returned and not cached, so the next event retries.
+        """
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is not None:
+            self._count('hits')
+            return snapshot
+
+        self._count('misses')
+        generation = self._generation
+        try:
+            settings = self.loader(user_id)
+        except Exception:
+            self._count('errors')
+            return _EMPTY
+        snapshot = SettingsSnapshot(settings) if settings else _EMPTY
+        with self._lock:
+            if generation == self._generation:
+                self._snapshots.set(user_id, snapshot)
+        return snapshot
+
+    def get_settings(self, user_id: str) -> Mapping[str, Any]:
+        """The user's settings as a read-only mapping"""
+        return self.get(user_id).settings
+
+    def records(self, user_id: str, app_name: str) -> bool:
+        """Whether the user records events of app_name"""
+        return self.get(user_id).records(app_name)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop the user's snapshot so the next lookup re-reads it"""
+        with self._lock:
+            self._generation += 1
+            self._snapshots.pop(user_id)
+
+    def clear(self) -> None:
+        self._snapshots.clear()
+
+
+def _load_settings(user_id: str) -> Optional[Dict[str, Any]]:
+    from database.storage import get_storage
+    return get_storage().get_user_settings(user_id)
+
+
+settings_cache = SettingsCache(
+    loader=_load_settings,
+    max_users=int(os.getenv('SETTINGS_CACHE_MAX_USERS', 10000)),
+    ttl=float(os.getenv('SETTINGS_CACHE_TTL_SECONDS', 300)),
+)
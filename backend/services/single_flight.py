@@ -0,0 +1,107 @@
+"""
+Single-flight coalescing of concurrent identical calls
+
+Opening the app fires several requests for the same user at once, and a
+pull-to-refresh can send the same analysis twice. SingleFlight runs a
+call once per key at a time: callers that arrive while it is in flight
+wait for it and share its result (or exception) instead of repeating the
+work. With result_ttl, a finished result is also reused for that many
+seconds, which collapses near-duplicate requests that don't overlap.
+"""
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from services.ttl_cache import TTLCache
+
+_MISSING = object()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its result"""
+
+    def __init__(self, result_ttl: float = 0.0, max_results: int = 10000):
+        """
+        Args:
+            result_ttl: Seconds a finished result keeps being reused (0 = only in flight)
+            max_results: Max finished results kept
+        """
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._results = TTLCache(maxsize=max_results, ttl=result_ttl) if result_ttl > 0 else None
+        self.stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Return fn(), sharing one execution with concurrent callers of key
+
+        The caller that runs fn gets its result as is; callers that share
+        it get a deep copy, so nobody can mutate another caller's value.
+
+        Raises:
+            Whatever fn raised, in every caller that shared the call
+        """
+        if self._results is not None:
+            cached = self._results.get(key, _MISSING)
+            if cached is not _MISSING:
+                with self._lock:
+                    self.stats['shared'] += 1
+                return copy.deepcopy(cached)
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['shared'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats['calls'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            raise
+
+        with self._lock:
+            del self._calls[key]
+            waiters = call.waiters
+        if waiters or self._results is not None:
+            # A pristine copy for sharers; the leader's caller owns result
+            pristine = copy.deepcopy(result)
+            call.result = pristine
+            if self._results is not None:
+                self._results.set(key, pristine)
+        call.done.set()
+        return result
+
+    def forget(self, key: Hashable) -> None:
+        """Drop a finished result so the next call runs again"""
+        if self._results is not None:
+            self._results.pop(key)
+
+    def clear(self) -> None:
+        """Drop every finished result"""
+        if self._results is not None:
+            self._results.clear()
@@ -0,0 +1,270 @@
+"""
+Downsampled usage timelines for charts
+
+build_timeline turns any time range into a fixed number of buckets, so a
+chart of a month costs the client one small response instead of every
+raw event. Bucket widths are round durations (1 minute, 15 minutes, 1
+hour, ... or whole UTC days) aligned to multiples of themselves, the
+smallest that covers the range in the requested number of buckets; the
+returned range is the requested one widened to that grid.
+
+Metrics:
+- events: stored events per bucket
+- opens: "opened" events per bucket
+- usage: foreground seconds per bucket, from sessions (services.sessions);
+  sessions crossing a bucket edge are split between the buckets
+
+Live logs are streamed page by page and bucketed by arithmetic on their
+timestamps. For compacted months, daily buckets of the events metric
+(without an app filter) come straight from the rollups' by_day counts;
+anything finer reads the archived segments.
+
+TimelineCache keeps results per (user, range, resolution, metric, app)
+for TIMELINE_CACHE_TTL_SECONDS. Ranges that ended before the retention
+age only hold compacted logs, which no longer change, and are kept for
+TIMELINE_ARCHIVED_CACHE_TTL_SECONDS.
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.event import stored_epoch
+from services.archive import iter_archived_logs, overlapping_rollups
+from services.sessions import SESSION_TIMEOUT_SECONDS
+from services.ttl_cache import TTLCache
+
+METRICS = ('events', 'opens', 'usage')
+
+DEFAULT_BUCKETS = 60
+MAX_BUCKETS = int(os.getenv('TIMELINE_MAX_BUCKETS', 500))
+
+DAY_SECONDS = 86400
+
+# Bucket widths below a day; each divides a day, so buckets never straddle midnight
+ROUND_WIDTHS = (
+    1, 2, 5, 10, 15, 30,
+    60, 120, 300, 600, 900, 1800,
+    3600, 7200, 10800, 14400, 21600, 43200,
+)
+
+RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 90))
+
+# Sessions read per usage timeline
+SESSION_LIMIT = 10000
+
+PAGE_SIZE = 1000
+
+
+class TimelineError(Exception):
+    """Invalid timeline request"""
+
+
+def align_range(start: float, end: float, buckets: int) -> Tuple[float, int]:
+    """
+    Smallest round bucket width whose aligned grid covers [start, end)
+
+    Returns:
+        (aligned start, bucket width in seconds)
+    """
+    def covers(width: int) -> bool:
+        return math.floor(start / width) * width + width * buckets >= end
+
+    width = next((width for width in ROUND_WIDTHS if covers(width)), None)
+    if width is None:
+        width = max(1, math.ceil((end - start) / buckets / DAY_SECONDS)) * DAY_SECONDS
+        while not covers(width):
+            width += DAY_SECONDS
+    return math.floor(start / width) * width, width
+
+
+def _iso(at: float) -> str:
+    return datetime.fromtimestamp(at, timezone.utc).isoformat(timespec='microseconds')
+
+
+class _Buckets:
+    """Fixed-width bucket values starting at start"""
+
+    __slots__ = ('start', 'width', 'end', 'values')
+
+    def __init__(self, start: float, width: int, count: int):
+        self.start = start
+        self.width = width
+        self.end = start + width * count
+        self.values: List[float] = [0] * count
+
+    def add(self, at: float, amount: float = 1) -> None:
+        if self.start <= at < self.end:
+            self.values[int((at - self.start) // self.width)] += amount
+
+    def spread(self, begin: float, finish: float) -> None:
+        """Add the seconds of [begin, finish) to the buckets they fall in"""
+        begin = max(begin, self.start)
+        finish = min(finish, self.end)
+        while begin < finish:
+            index = int((begin - self.start) // self.width)
+            edge = min(finish, self.start + (index + 1) * self.width)
+            self.values[index] += edge - begin
+            begin = edge
+
+
+def build_timeline(
+    storage,
+    user_id: str,
+    start: float,
+    width: int,
+    buckets: int,
+    metric: str = 'events',
+    app_name: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Compute a timeline over an aligned range (see align_range)
+
+    Args:
+        storage: Storage backend
+        user_id: User ID
+        start: Aligned start (epoch seconds)
+        width: Bucket width in seconds
+        buckets: Number of buckets
+        metric: One of METRICS
+        app_name: Only count this app
+
+    Returns:
+        Dictionary with 'start', 'end', 'bucket_seconds', 'metric',
+        'app_name', 'values' (one per bucket), 'total' and 'sources' (how
+        many live logs, archived logs, rollup days and sessions were read)
+    """
+    result = _Buckets(start, width, buckets)
+    start_date = _iso(start)
+    end_date = _iso(result.end)
+    sources = {'live': 0, 'archived': 0, 'rollup_days': 0, 'sessions': 0}
+
+    if metric == 'usage':
+        # Sessions that started up to a timeout earlier can still reach into the range
+        sessions = storage.get_sessions(
+            user_id,
+            start_date=_iso(start - SESSION_TIMEOUT_SECONDS),
+            end_date=end_date,
+            app_name=app_name,
+            limit=SESSION_LIMIT
+        )
+        for session in sessions:
+            if session['duration_seconds'] is None:
+                continue
+            began = stored_epoch(session['start'])
+            if began is None:
+                continue
+            result.spread(began, began + session['duration_seconds'])
+            sources['sessions'] += 1
+        values = [round(value, 3) for value in result.values]
+    else:
+        event_type = 'opened' if metric == 'opens' else None
+        for log in storage.iter_logs(user_id, start_date, end_date, page_size=PAGE_SIZE):
+            sources['live'] += 1
+            if (app_name and log.get('app_name') != app_name) or (event_type and log.get('event_type') != event_type):
+                continue
+            at = stored_epoch(log.get('timestamp'))
+            if at is not None:
+                result.add(at)
+        _add_archived(storage, user_id, result, start_date, end_date, event_type, app_name, sources)
+        values = result.values
+
+    return {
+        'start': start_date,
+        'end': end_date,
+        'bucket_seconds': width,
+        'metric': metric,
+        'app_name': app_name,
+        'values': values,
+        'total': round(sum(values), 3),
+        'sources': sources,
+    }
+
+
+def _add_archived(storage, user_id: str, result: _Buckets, start_date: str, end_date: str,
+                  event_type: Optional[str], app_name: Optional[str], sources: Dict[str, int]) -> None:
+    """Bucket compacted logs, from rollups when the buckets are whole days"""
+    if event_type is None and app_name is None and result.width % DAY_SECONDS == 0:
+        for rollup in overlapping_rollups(storage, user_id, start_date, end_date):
+            for day, count in rollup.get('by_day', {}).items():
+                sources['rollup_days'] += 1
+                result.add(datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp(), count)
+        return
+
+    for log in iter_archived_logs(storage, user_id, start_date, end_date, app_name):
+        sources['archived'] += 1
+        if event_type and log.get('event_type') != event_type:
+            continue
+        at = stored_epoch(log.get('timestamp'))
+        if at is not None:
+            result.add(at)
+
+
+class TimelineCache:
+    """Bounded TTL cache of computed timelines"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0, archived_ttl: float = 3600.0):
+        """
+        Args:
+            max_entries: Maximum number of timelines kept
+            ttl: Seconds a timeline is reused
+            archived_ttl: Seconds a timeline of a fully compacted range is reused
+        """
+        self.ttl = ttl
+        self.archived_ttl = archived_ttl
+        self._timelines = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(
+        self,
+        storage,
+        user_id: str,
+        start: float,
+        end: float,
+        buckets: int = DEFAULT_BUCKETS,
+        metric: str = 'events',
+        app_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Timeline of [start, end) in `buckets` buckets, cached
+
+        Raises:
+            TimelineError: If the range, bucket count or metric is invalid
+        """
+        if metric not in METRICS:
+            raise TimelineError(f'metric must be one of: {", ".join(METRICS)}')
+        if not 1 <= buckets <= MAX_BUCKETS:
+            raise TimelineError(f'buckets must be between 1 and {MAX_BUCKETS}')
+        if end <= start:
+            raise TimelineError('end_date must be after start_date')
+
+        aligned_start, width = align_range(start, end, buckets)
+        key = (user_id, aligned_start, width, buckets, metric, app_name)
+        timeline = self._timelines.get(key)
+        if timeline is not None:
+            self._count('hits')
+            return timeline
+
+        self._count('misses')
+        timeline = build_timeline(storage, user_id, aligned_start, width, buckets, metric, app_name)
+        archived = aligned_start + width * buckets < time.time() - RETENTION_DAYS * DAY_SECONDS
+        self._timelines.set(key, timeline, ttl=self.archived_ttl if archived else self.ttl)
+        return timeline
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+
+timeline_cache = TimelineCache(
+    max_entries=int(os.getenv('TIMELINE_CACHE_MAX_ENTRIES', 10000)),
+    ttl=float(os.getenv('TIMELINE_CACHE_TTL_SECONDS', 60)),
+    archived_ttl=float(os.getenv('TIMELINE_ARCHIVED_CACHE_TTL_SECONDS', 3600)),
+)
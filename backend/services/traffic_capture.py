@@ -0,0 +1,227 @@
+"""
+Opt-in capture of webhook traffic for replay
+
+With TRAFFIC_CAPTURE=1, requests to /api/webhook and /api/webhook/batch
+are recorded, together with their arrival time, status and latency, so
+production load shapes (morning bursts, retry storms, idle users) can be
+replayed against a build with benchmarks.replay.
+
+Nothing identifying is written: user IDs and Idempotency-Keys are
+replaced with keyed hashes (HMAC-SHA256 with TRAFFIC_CAPTURE_SALT), so
+the same user maps to the same pseudonym across a capture but can't be
+recovered from it, and only the event fields the webhook reads are kept.
+Without a salt a random one is generated per process, which means
+pseudonyms don't match across instances or restarts.
+
+Files are append-only, one per process, under TRAFFIC_CAPTURE_DIR:
+    capture-{started}-{pid}.ndjson.gz
+Each flush appends a complete gzip member (multi-member gzip files read
+as one stream), so a file is readable up to its last flush even while
+being written or after a crash. The first line is a header:
+    {"v": 1, "started_at": "...", "started": 1760000000.0}
+and every other line one request:
+    {"t": 12.345, "k": "e"|"b", "b": <body>, "i": <key>, "s": 201, "l": 3.2}
+with t seconds since "started", k the endpoint (single event or batch),
+i the hashed Idempotency-Key (if any), s the status and l the latency in
+milliseconds. Request threads only queue records; a writer thread
+compresses and appends them every TRAFFIC_CAPTURE_FLUSH_SECONDS.
+"""
+import atexit
+import gzip
+import hashlib
+import hmac
+import os
+import queue
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from flask import g, request
+
+from services import json_provider
+
+FORMAT_VERSION = 1
+
+# Endpoint codes used in capture records
+KINDS = {'e': '/api/webhook', 'b': '/api/webhook/batch'}
+
+# Event fields kept in captures (everything else is dropped); generated
+# shortcuts send app_id instead of app_name
+EVENT_FIELDS = ('user_id', 'app_name', 'app_id', 'event_type', 'timestamp')
+
+CAPTURE_ENABLED = os.getenv('TRAFFIC_CAPTURE', '0') == '1'
+CAPTURE_DIR = os.getenv('TRAFFIC_CAPTURE_DIR', './captures')
+SAMPLE_RATE = float(os.getenv('TRAFFIC_CAPTURE_SAMPLE', 1.0))
+FLUSH_SECONDS = float(os.getenv('TRAFFIC_CAPTURE_FLUSH_SECONDS', 5))
+QUEUE_SIZE = int(os.getenv('TRAFFIC_CAPTURE_QUEUE_SIZE', 10000))
+
+
+class Anonymizer:
+    """Maps identifiers to stable keyed-hash pseudonyms"""
+
+    def __init__(self, salt: Optional[str] = None):
+        self._key = (salt or secrets.token_hex(16)).encode('utf-8')
+
+    def pseudonym(self, value: Any, prefix: str = 'u') -> Any:
+        if not isinstance(value, str):
+            return value
+        digest = hmac.new(self._key, value.encode('utf-8'), hashlib.sha256).hexdigest()
+        return f'{prefix}_{digest[:16]}'
+
+    def event(self, payload: Any) -> Any:
+        if not isinstance(payload, dict):
+            return None
+        event = {field: payload[field] for field in EVENT_FIELDS if field in payload}
+        if 'user_id' in event:
+            event['user_id'] = self.pseudonym(event['user_id'])
+        return event
+
+    def body(self, kind: str, body: Any) -> Any:
+        if kind == 'e':
+            return self.event(body)
+        if isinstance(body, dict) and isinstance(body.get('events'), list):
+            return {'events': [self.event(event) for event in body['events']]}
+        return None
+
+
+class TrafficCapture:
+    """Queues captured requests and appends them to a file from a writer thread"""
+
+    def __init__(self, directory: str, anonymizer: Anonymizer, sample_rate: float = 1.0,
+                 flush_seconds: float = 5.0, queue_size: int = 10000):
+        self.directory = directory
+        self.anonymizer = anonymizer
+        self.sample_rate = sample_rate
+        self.flush_seconds = flush_seconds
+        self.started = time.time()
+        self.path = os.path.join(directory, 'capture-{}-{}.ndjson.gz'.format(
+            datetime.fromtimestamp(self.started, timezone.utc).strftime('%Y%m%dT%H%M%S'), os.getpid()
+        ))
+        self.stats = {'captured': 0, 'dropped': 0, 'written': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _start_writer(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._run, name='traffic-capture', daemon=True)
+            self._writer.start()
+
+    def observe(self, kind: str, body: Any) -> None:
+        """Remember the current request's parsed body for finish()"""
+        if self.sample_rate < 1.0 and secrets.randbelow(1_000_000) >= self.sample_rate * 1_000_000:
+            return
+        g.traffic_capture = (kind, time.time(), time.perf_counter(), body)
+
+    def finish(self, response):
+        """after_request hook: queue the observed request with its outcome"""
+        observed = g.pop('traffic_capture', None)
+        if observed is None:
+            return response
+        kind, arrived, started, body = observed
+        record = {
+            't': round(arrived - self.started, 4),
+            'k': kind,
+            'b': self.anonymizer.body(kind, body),
+            's': response.status_code,
+            'l': round((time.perf_counter() - started) * 1000, 3),
+        }
+        key = request.headers.get('Idempotency-Key')
+        if key:
+            record['i'] = self.anonymizer.pseudonym(key, prefix='k')
+        if self._writer is None:
+            self._start_writer()
+        try:
+            self._queue.put_nowait(record)
+            self._count('captured')
+        except queue.Full:
+            self._count('dropped')
+        return response
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        data = b''.join(json_provider.dumps_bytes(record, default=str) + b'\n' for record in records)
+        with open(self.path, 'ab') as f:
+            f.write(gzip.compress(data))
+
+    def _run(self) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._append([{
+                'v': FORMAT_VERSION,
+                'started_at': datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                'started': self.started,
+            }])
+        except OSError:
+            self._count('errors')
+            return
+        while not self._stopped.wait(self.flush_seconds):
+            self.flush()
+
+    def flush(self) -> None:
+        """Append everything queued so far as one gzip member"""
+        records = self._drain()
+        if not records:
+            return
+        try:
+            self._append(records)
+            self._count('written', len(records))
+        except OSError:
+            self._count('errors')
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._writer is not None:
+            self._writer.join()
+            self.flush()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {'enabled': True, 'path': self.path if self._writer else None, **stats}
+
+
+capture: Optional[TrafficCapture] = None
+if CAPTURE_ENABLED:
+    capture = TrafficCapture(
+        CAPTURE_DIR,
+        Anonymizer(os.getenv('TRAFFIC_CAPTURE_SALT')),
+        sample_rate=SAMPLE_RATE,
+        flush_seconds=FLUSH_SECONDS,
+        queue_size=QUEUE_SIZE,
+    )
+
+
+def observe(kind: str, body: Any) -> None:
+    """Mark the current webhook request for capture (no-op unless TRAFFIC_CAPTURE=1)"""
+    if capture is not None:
+        capture.observe(kind, body)
+
+
+def metrics() -> Dict[str, Any]:
+    return capture.metrics() if capture is not None else {'enabled': False}
+
+
+def init_traffic_capture(blueprint) -> None:
+    """Register the capture hook on the webhook blueprint"""
+    if capture is None:
+        return
+    atexit.register(capture.close)
+    blueprint.after_request(capture.finish)
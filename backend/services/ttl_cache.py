@@ -0,0 +1,93 @@
+"""
+Bounded in-memory cache with per-entry time-to-live
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a fixed TTL
+
+    The cache never holds more than ``maxsize`` entries; once full, the
+    least recently used entry is evicted. Expired entries are dropped
+    lazily when they are looked up or pushed out by new entries.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for key, or default if missing or expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store value under key, replacing any existing entry
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def add(self, key: Hashable, value: Any = True, ttl: Optional[float] = None) -> bool:
+        """
+        Store value under key only if no live entry exists
+
+        Returns:
+            bool: True if the entry was added, False if key was already present
+        """
+        now = time.monotonic()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._data.move_to_end(key)
+                return False
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._evict()
+            return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove key and return its value (or default)
+        """
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        return entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _evict(self) -> None:
+        # Caller must hold the lock
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
@@ -0,0 +1,206 @@
+"""
+Instance warmup and readiness
+
+The first request after a cold start used to pay for everything that is
+lazily set up on first use: the Firestore channel, Google's ID token
+signing certs (fetched inside auth.verify_id_token) and the shortcut
+plist. Warmup runs these tasks in parallel, once per process, either on
+startup (WARMUP_ON_STARTUP=1, the default) or on the first call to
+/ready. /ready answers 503 until warmup has finished, so a startup probe
+keeps traffic away from the instance until then.
+
+A failed task doesn't keep the instance unready (the app also starts
+without Firebase credentials); it is reported in the status, and with
+WARMUP_STRICT=1 it does make /ready fail. Tasks still running after
+WARMUP_TIMEOUT_SECONDS are reported as timed out.
+
+Once the certs are loaded, CertRefresher re-fetches them in the
+background before their Cache-Control max-age runs out, so token
+verification never waits for Google.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', '1') == '1'
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT_SECONDS', 30))
+WARMUP_STRICT = os.getenv('WARMUP_STRICT', '0') == '1'
+
+# Refresh certs after this share of their max-age has passed
+CERT_REFRESH_FRACTION = 0.75
+CERT_REFRESH_DEFAULT_SECONDS = float(os.getenv('AUTH_CERT_REFRESH_SECONDS', 3600))
+CERT_REFRESH_RETRY_SECONDS = 60.0
+
+
+class CertRefresher:
+    """Re-fetches the ID token certs before the cached copy expires"""
+
+    def __init__(self, fetch: Callable[..., Optional[int]], default_interval: float):
+        """
+        Args:
+            fetch: Fetches the certs (fetch(force=True)) and returns their
+                max-age in seconds, or None
+            default_interval: Seconds between refreshes when no max-age is known
+        """
+        self.fetch = fetch
+        self.default_interval = default_interval
+        self.stats = {'refreshes': 0, 'errors': 0, 'next_refresh_in': None}
+        self._next_refresh = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def interval_for(self, max_age: Optional[int]) -> float:
+        if not max_age:
+            return self.default_interval
+        return max(CERT_REFRESH_RETRY_SECONDS, max_age * CERT_REFRESH_FRACTION)
+
+    def start(self, max_age: Optional[int]) -> None:
+        """Start refreshing; max_age is that of the certs just fetched"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, args=(self.interval_for(max_age),),
+                name='auth-cert-refresh', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, interval: float) -> None:
+        while True:
+            self._next_refresh = time.monotonic() + interval
+            if self._stop.wait(interval):
+                return
+            try:
+                interval = self.interval_for(self.fetch(force=True))
+                self.stats['refreshes'] += 1
+            except Exception as e:
+                logger.warning('Refreshing ID token certs failed: %s', e)
+                self.stats['errors'] += 1
+                interval = CERT_REFRESH_RETRY_SECONDS
+
+    def status(self) -> Dict[str, Any]:
+        status = dict(self.stats)
+        if self._thread is not None and self._next_refresh is not None:
+            status['next_refresh_in'] = round(max(0.0, self._next_refresh - time.monotonic()), 1)
+        return status
+
+
+class Warmup:
+    """Runs named warmup tasks in parallel, once"""
+
+    def __init__(self, tasks: Dict[str, Callable[[], Any]], timeout: float = 30.0):
+        """
+        Args:
+            tasks: Task name -> callable; the callable's return value is
+                kept as the task's result
+            timeout: Seconds to wait for the tasks before giving up on
+                the stragglers
+        """
+        self.tasks = tasks
+        self.timeout = timeout
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.done = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+        self._duration: Optional[float] = None
+
+    def start(self) -> bool:
+        """Start warmup in a background thread; False if already started"""
+        with self._lock:
+            if self._started:
+                return False
+            self._started = True
+        threading.Thread(target=self.run, name='warmup', daemon=True).start()
+        return True
+
+    def _run_task(self, name: str, task: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        try:
+            result = task()
+            self.results[name] = {'ok': True, 'seconds': round(time.perf_counter() - started, 3)}
+            if result is not None:
+                self.results[name]['result'] = result
+        except Exception as e:
+            self.results[name] = {
+                'ok': False,
+                'seconds': round(time.perf_counter() - started, 3),
+                'error': str(e),
+            }
+
+    def run(self) -> None:
+        """Run every task in parallel and wait for them (up to timeout)"""
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=len(self.tasks) or 1, thread_name_prefix='warmup')
+        futures = [executor.submit(self._run_task, name, task) for name, task in self.tasks.items()]
+        wait(futures, timeout=self.timeout)
+        # Stragglers keep running but don't hold up readiness
+        executor.shutdown(wait=False)
+        for name in self.tasks:
+            self.results.setdefault(name, {'ok': False, 'error': f'timed out after {self.timeout:g}s'})
+        self._duration = round(time.perf_counter() - started, 3)
+        self.done.set()
+
+    @property
+    def ready(self) -> bool:
+        if not self.done.is_set():
+            return False
+        return not WARMUP_STRICT or all(result['ok'] for result in self.results.values())
+
+    def status(self) -> Dict[str, Any]:
+        if not self.done.is_set():
+            state = 'warming_up' if self._started else 'not_started'
+        else:
+            state = 'ready' if self.ready else 'failed'
+        return {
+            'status': state,
+            'seconds': self._duration,
+            'tasks': {name: dict(result) for name, result in self.results.items()},
+        }
+
+
+# ============ Tasks ============
+
+def _warm_storage() -> None:
+    from database.storage import get_storage
+    get_storage().warmup()
+
+
+def _warm_storage_bucket() -> None:
+    from firebase.config import get_storage_bucket
+    get_storage_bucket()
+
+
+def _warm_auth_certs() -> Dict[str, Any]:
+    from firebase.config import prefetch_auth_certs
+    max_age = prefetch_auth_certs()
+    cert_refresher.start(max_age)
+    return {'max_age': max_age}
+
+
+def _warm_shortcut_template() -> None:
+    from routes.shortcuts import shortcut_template
+    shortcut_template()
+
+
+def _refresh_auth_certs(force: bool = True) -> Optional[int]:
+    from firebase.config import prefetch_auth_certs
+    return prefetch_auth_certs(force=force)
+
+
+cert_refresher = CertRefresher(_refresh_auth_certs, CERT_REFRESH_DEFAULT_SECONDS)
+
+warmup = Warmup({
+    'storage': _warm_storage,
+    'storage_bucket': _warm_storage_bucket,
+    'auth_certs': _warm_auth_certs,
+    'shortcut_template': _warm_shortcut_template,
+}, timeout=WARMUP_TIMEOUT)
@@ -0,0 +1,103 @@
+"""
+Write-behind for writes a response doesn't have to wait for
+
+A request that only needs to know a write will happen (its document ID
+is generated up front) hands it to WriteBehind and returns. Writes run
+on a small thread pool in the request's context (log correlation IDs)
+and are billed to the request's route and user through
+cost_accounting.deferred_scope. Failures are logged and counted.
+
+Up to max_pending writes are queued; beyond that submit() runs the write
+on the caller's thread, so a slow or failing backend pushes back on
+requests instead of piling up memory. Queued writes are finished at
+shutdown.
+"""
+import atexit
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from services import cost_accounting
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """Runs writes on a bounded background pool"""
+
+    def __init__(self, name: str, max_workers: int = 2, max_pending: int = 1000):
+        """
+        Args:
+            name: Thread name prefix and log label
+            max_workers: Writes running at the same time
+            max_pending: Writes queued or running before submit() blocks
+                the caller by writing inline
+        """
+        self.name = name
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {'queued': 0, 'inline': 0, 'written': 0, 'failed': 0}
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def _run(self, write: Callable[..., Any], args: tuple, route: str, user_id) -> None:
+        try:
+            with cost_accounting.deferred_scope(route, user_id):
+                write(*args)
+            self._count('written')
+        except Exception:
+            self._count('failed')
+            logger.exception('%s write failed', self.name)
+
+    def submit(self, write: Callable[..., Any], *args: Any) -> None:
+        """Queue write(*args), or run it now if too many writes are pending"""
+        route, user_id = cost_accounting.current_attribution()
+        with self._lock:
+            queue_it = self._pending < self.max_pending
+            if queue_it:
+                self._pending += 1
+                self.stats['queued'] += 1
+            else:
+                self.stats['inline'] += 1
+        if not queue_it:
+            write(*args)
+            self._count('written')
+            return
+
+        context = contextvars.copy_context()
+
+        def task():
+            try:
+                context.run(self._run, write, args, route, user_id)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+        self._executor.submit(task)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, 'pending': self._pending}
+
+    def shutdown(self) -> None:
+        """Finish every queued write"""
+        self._executor.shutdown(wait=True)
+
+
+analysis_writes = WriteBehind(
+    'analysis-write',
+    max_workers=int(os.getenv('ANALYSIS_WRITE_WORKERS', 2)),
+    max_pending=int(os.getenv('ANALYSIS_WRITE_MAX_PENDING', 1000)),
+)
+atexit.register(analysis_writes.shutdown)
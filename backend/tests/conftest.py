@@ -0,0 +1,34 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database, without rate limits
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ['STORAGE_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='miivvy-tests-'), 'miivvy.db')
+os.environ['ARCHIVE_BACKEND'] = 'local'
+os.environ['ARCHIVE_DIR'] = os.path.join(tempfile.mkdtemp(prefix='miivvy-archives-'))
+os.environ['RATE_LIMIT_ENABLED'] = '0'
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def storage():
+    from database.storage import get_storage
+    return get_storage()
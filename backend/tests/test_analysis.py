@@ -0,0 +1,52 @@
+"""
+Analyses and timelines over stored logs, including legacy rows
+"""
+from datetime import datetime, timezone
+
+from services.analysis import build_analysis
+from services.timeline import build_timeline
+
+# Stored by shortcuts before timestamps were validated
+LEGACY_TIMESTAMP = '{{current_date}}'
+# A device-formatted date; it sorts inside ISO8601 ranges, so range queries return it
+LEGACY_IN_RANGE_TIMESTAMP = '2025-01-20 at 13:00'
+
+TRUSTED_BASELINE = {
+    'weight': 100.0,
+    'hour_of_week': [1 / 168] * 168,
+    'app_mix': {'line': 1.0},
+    'session_lengths': {},
+    'mean_session_seconds': None,
+    'updated_at': None,
+}
+
+
+def _log(app_name, timestamp, event_type='opened'):
+    return {'user_id': 'legacy_user', 'app_name': app_name, 'event_type': event_type, 'timestamp': timestamp}
+
+
+def test_analysis_skips_unparseable_timestamps():
+    logs = [
+        _log('line', '2025-01-20T12:00:00.000000+00:00'),
+        _log('tiktok', LEGACY_TIMESTAMP),
+    ]
+
+    analysis = build_analysis(logs, TRUSTED_BASELINE)
+
+    assert analysis['baseline_used']
+    assert analysis['log_count'] == 2
+    assert [detail['app_name'] for detail in analysis['details']] == ['tiktok']
+
+
+def test_timeline_skips_unparseable_timestamps(storage):
+    storage.save_logs([
+        (None, _log('line', '2025-01-20T12:00:00.000000+00:00')),
+        (None, _log('line', LEGACY_IN_RANGE_TIMESTAMP)),
+    ])
+    start = datetime(2025, 1, 19, tzinfo=timezone.utc).timestamp()
+
+    timeline = build_timeline(storage, 'legacy_user', start, 3600, 48)
+
+    assert timeline['sources']['live'] == 2
+    assert timeline['total'] == 1
+    assert timeline['values'][36] == 1
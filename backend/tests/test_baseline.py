@@ -0,0 +1,64 @@
+"""
+Decayed baseline profiles
+"""
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from services.baseline import (
+    EPOCH, HALF_LIFE_DAYS, MAX_CLOCK_SKEW_SECONDS, BaselineTracker, decay_weight, event_time, load_baseline
+)
+
+DAY = 86400
+
+
+def _iso(at):
+    return datetime.fromtimestamp(at, timezone.utc).isoformat(timespec='microseconds')
+
+
+def _opened(user_id, at, app_name='line'):
+    return {'user_id': user_id, 'app_name': app_name, 'event_type': 'opened', 'timestamp': _iso(at)}
+
+
+def test_decay_weight_halves_per_half_life():
+    assert decay_weight(EPOCH) == 1.0
+    assert decay_weight(EPOCH + HALF_LIFE_DAYS * DAY) == pytest.approx(2.0)
+    assert decay_weight(EPOCH - HALF_LIFE_DAYS * DAY) == pytest.approx(0.5)
+
+
+def test_event_time_caps_future_timestamps():
+    now = time.time()
+    assert event_time(_iso(now - 60), now) == pytest.approx(now - 60)
+    assert event_time('2030-01-01T00:00:00+00:00', now) == now + MAX_CLOCK_SKEW_SECONDS
+    assert event_time('9999-12-31T00:00:00+00:00', now) == now + MAX_CLOCK_SKEW_SECONDS
+
+
+def test_load_baseline_without_profile(storage):
+    assert load_baseline(storage, 'no_baseline_user') is None
+
+
+def test_load_baseline_decays_older_events(storage):
+    tracker = BaselineTracker(flush_events=1)
+    now = time.time()
+    tracker.record(storage, _opened('decay_user', now, 'line'))
+    tracker.record(storage, _opened('decay_user', now - HALF_LIFE_DAYS * DAY, 'tiktok'))
+
+    baseline = load_baseline(storage, 'decay_user', now=now)
+
+    assert baseline['weight'] == pytest.approx(1.5)
+    assert baseline['app_mix'] == pytest.approx({'line': 2 / 3, 'tiktok': 1 / 3})
+    assert sum(baseline['hour_of_week']) == pytest.approx(1.0)
+
+
+def test_future_event_does_not_outweigh_profile(storage):
+    tracker = BaselineTracker(flush_events=1)
+    now = time.time()
+    for minutes in range(10):
+        tracker.record(storage, _opened('skew_user', now - minutes * 60, 'line'))
+    tracker.record(storage, {**_opened('skew_user', now, 'x'), 'timestamp': '2030-01-01T00:00:00+00:00'})
+
+    baseline = load_baseline(storage, 'skew_user', now=now)
+
+    assert baseline['weight'] == pytest.approx(11, rel=0.01)
+    assert baseline['app_mix']['x'] < 0.1
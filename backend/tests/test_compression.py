@@ -0,0 +1,108 @@
+"""
+Compressed and size-limited ingest bodies
+"""
+import gzip
+import io
+import json
+
+from models.event import MAX_BATCH_BYTES
+
+# Chunked uploads: no Content-Length, the server marks the input as terminated
+CHUNKED = {'wsgi.input_terminated': True}
+
+
+def _post_chunked(client, path, body, headers=None):
+    return client.post(
+        path,
+        input_stream=io.BytesIO(body),
+        content_type='application/json',
+        headers={'Transfer-Encoding': 'chunked', **(headers or {})},
+        environ_base=CHUNKED,
+    )
+
+
+def _batch(user_id, size, padding=0):
+    return {'events': [
+        {'user_id': user_id, 'app_name': 'line', 'event_type': 'notification',
+         'timestamp': f'2025-01-20T12:00:{i:02d}Z', 'note': 'x' * padding}
+        for i in range(size)
+    ]}
+
+
+def test_chunked_identity_body_is_parsed(client, storage):
+    body = json.dumps(_batch('chunked_user', 3)).encode()
+
+    response = _post_chunked(client, '/api/webhook/batch', body)
+
+    assert response.status_code == 201
+    assert len(storage.get_logs('chunked_user')) == 3
+
+
+def test_chunked_identity_body_over_limit_is_rejected(client, storage):
+    body = json.dumps(_batch('chunked_big_user', 10, padding=MAX_BATCH_BYTES // 10)).encode()
+    assert len(body) > MAX_BATCH_BYTES
+
+    response = _post_chunked(client, '/api/webhook/batch', body)
+
+    assert response.status_code == 413
+    assert storage.get_logs('chunked_big_user') == []
+
+
+def _gzip(data):
+    return gzip.compress(data)
+
+
+def test_gzip_body_is_decompressed(client, storage):
+    body = _gzip(json.dumps({'user_id': 'gzip_user', 'app_name': 'line', 'event_type': 'opened'}).encode())
+
+    response = client.post('/api/webhook', data=body, content_type='application/json',
+                           headers={'Content-Encoding': 'gzip'})
+
+    assert response.status_code == 201
+    assert len(storage.get_logs('gzip_user')) == 1
+
+
+def test_decompression_bomb_is_rejected(client, storage):
+    events = _batch('bomb_user', 1)
+    events['padding'] = ' ' * (50 * MAX_BATCH_BYTES)
+    body = _gzip(json.dumps(events).encode())
+    assert len(body) < MAX_BATCH_BYTES // 10
+
+    response = client.post('/api/webhook/batch', data=body, content_type='application/json',
+                           headers={'Content-Encoding': 'gzip'})
+    chunked = _post_chunked(client, '/api/webhook/batch', body, headers={'Content-Encoding': 'gzip'})
+
+    assert response.status_code == 413
+    assert chunked.status_code == 413
+    assert storage.get_logs('bomb_user') == []
+
+
+def test_compressed_body_over_limit_is_rejected(client):
+    body = b'\x1f\x8b' + b'\0' * MAX_BATCH_BYTES
+
+    response = client.post('/api/webhook/batch', data=body, content_type='application/json',
+                           headers={'Content-Encoding': 'gzip'})
+
+    assert response.status_code == 413
+
+
+def test_corrupt_gzip_and_unknown_encoding(client):
+    corrupt = client.post('/api/webhook', data=b'not gzip', content_type='application/json',
+                          headers={'Content-Encoding': 'gzip'})
+    unknown = client.post('/api/webhook', data=b'{}', content_type='application/json',
+                          headers={'Content-Encoding': 'br'})
+
+    assert corrupt.status_code == 400
+    assert unknown.status_code == 415
+
+
+def test_large_responses_are_gzip_compressed(client):
+    response = client.post('/api/webhook/batch', json=_batch('compressed_user', 60),
+                           headers={'Accept-Encoding': 'gzip'})
+    small = client.post('/api/webhook', headers={'Accept-Encoding': 'gzip'},
+                        json={'user_id': 'compressed_user', 'app_name': 'line', 'event_type': 'opened'})
+
+    assert response.status_code == 201
+    assert response.headers.get('Content-Encoding') == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert 'Content-Encoding' not in small.headers
@@ -0,0 +1,37 @@
+"""
+User data deletion covers compacted log archives and cached settings
+"""
+from services.archive import get_archive_store, segment_path
+from services.compaction import compact_user
+
+
+def test_delete_user_data_removes_archived_segments(storage):
+    user_id = 'deleted_user'
+    storage.save_logs([
+        (None, {'user_id': user_id, 'app_name': 'line', 'event_type': 'opened',
+                'timestamp': f'2024-0{month}-10T12:00:00.000000+00:00'})
+        for month in (1, 2)
+    ])
+    compact_user(storage, user_id, cutoff='2024-06-01T00:00:00+00:00')
+    archive = get_archive_store()
+    assert archive.read(segment_path(user_id, '2024-01')) is not None
+
+    counts = storage.delete_user_data(user_id)
+
+    assert counts['archives'] == 2
+    assert counts['log_rollups'] == 2
+    assert archive.read(segment_path(user_id, '2024-01')) is None
+    assert archive.read(segment_path(user_id, '2024-02')) is None
+
+
+def test_delete_user_data_drops_cached_settings(storage):
+    from services.settings_cache import settings_cache
+
+    user_id = 'deleted_settings_user'
+    storage.save_user_settings(user_id, {'recording': {'line': False}})
+    assert not settings_cache.get(user_id).records('line')
+
+    counts = storage.delete_user_data(user_id)
+
+    assert counts['settings'] == 1
+    assert settings_cache.get(user_id).records('line')
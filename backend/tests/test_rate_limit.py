@@ -0,0 +1,106 @@
+"""
+Token-bucket rate limiting of the webhook
+"""
+import math
+
+import pytest
+
+from middleware import rate_limit
+from middleware.rate_limit import LocalRateLimitBackend, RateLimitBackend, RateLimiter, webhook_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', fake)
+    return fake
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    backend = LocalRateLimitBackend()
+
+    assert [backend.consume('user:a', rate=1.0, capacity=3) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert backend.consume('user:a', rate=1.0, capacity=3) == pytest.approx(1.0)
+
+    clock.now += 2
+    assert backend.consume('user:a', rate=1.0, capacity=3, cost=2) == 0.0
+    assert backend.consume('user:b', rate=1.0, capacity=3) == 0.0
+
+
+def test_cost_over_capacity_can_never_succeed(clock):
+    backend = LocalRateLimitBackend()
+
+    assert math.isinf(backend.consume('user:a', rate=1.0, capacity=3, cost=4))
+    clock.now += 3600
+    assert math.isinf(backend.consume('user:a', rate=1.0, capacity=3, cost=4))
+    assert backend.consume('user:a', rate=1.0, capacity=3, cost=3) == 0.0
+
+
+def test_limiter_counts_and_capacity(clock):
+    limiter = RateLimiter({'user': (1.0, 2), 'ip': (0, 5)})
+
+    assert limiter.check('user', 'a') == 0.0
+    assert limiter.check('user', 'a') == 0.0
+    assert limiter.check('user', 'a') > 0
+    assert limiter.check('ip', '203.0.113.7', cost=100) == 0.0
+    assert limiter.capacity('user') == 2
+    assert limiter.capacity('ip') is None
+
+    metrics = limiter.metrics()
+    assert metrics['allowed']['user'] == 2
+    assert metrics['rejected']['user'] == 1
+
+
+def test_disabled_limiter_allows_everything(clock):
+    limiter = RateLimiter({'user': (1.0, 1)}, enabled=False)
+
+    assert limiter.check('user', 'a', cost=10) == 0.0
+    assert limiter.capacity('user') is None
+
+
+def test_backend_errors_fail_open():
+    class BrokenBackend(RateLimitBackend):
+        def consume(self, key, rate, capacity, cost=1.0):
+            raise ConnectionError('store down')
+
+    limiter = RateLimiter({'user': (1.0, 1)}, backend=BrokenBackend())
+
+    assert limiter.check('user', 'a') == 0.0
+    assert limiter.metrics()['backend_errors'] == 1
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimitBackend()
+
+
+def test_webhook_returns_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(webhook_limiter, 'enabled', True)
+    monkeypatch.setattr(webhook_limiter, 'backend', LocalRateLimitBackend())
+    event = {'user_id': 'limited_user', 'app_name': 'line', 'event_type': 'notification'}
+
+    statuses = [
+        client.post('/api/webhook', json=event).status_code
+        for _ in range(int(webhook_limiter.capacity('user')) + 1)
+    ]
+
+    assert statuses[-1] == 429
+    assert set(statuses[:-1]) == {201}
+    response = client.post('/api/webhook', json=event)
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_unreachable_retry_is_capped_in_response(app):
+    with app.test_request_context():
+        response = rate_limit.rate_limited_response(float('inf'))
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3600'
@@ -0,0 +1,81 @@
+"""
+Streaming detection rules
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from services.rule_engine import DEFAULT_RULES, Rule, RuleEngine, build_rules
+
+
+def _event(user_id, at, app_name='line', event_type='opened'):
+    timestamp = datetime.fromtimestamp(at, timezone.utc).isoformat(timespec='microseconds')
+    return {'user_id': user_id, 'app_name': app_name, 'event_type': event_type, 'timestamp': timestamp}
+
+
+def _engine(settings=None):
+    return RuleEngine(build_rules(DEFAULT_RULES), settings_loader=lambda user_id: settings, settings_ttl=0)
+
+
+# 2025-01-20 (Monday) 12:00 UTC = 21:00 in Asia/Tokyo
+NOON = datetime(2025, 1, 20, 12, tzinfo=timezone.utc).timestamp()
+
+
+def test_quiet_hours_in_user_timezone():
+    engine = _engine({'quiet_hours': {'start': '20:00', 'end': '07:00'}, 'timezone': 'Asia/Tokyo'})
+
+    hits = engine.evaluate(_event('quiet_user', NOON))
+
+    assert [hit['rule_id'] for hit in hits] == ['quiet_hours_open']
+    assert hits[0]['severity'] == 'high'
+    assert '21:00' in hits[0]['message']
+    assert engine.evaluate(_event('quiet_user', NOON - 10 * 3600)) == []
+
+
+def test_burst_fires_once_per_cooldown():
+    engine = _engine()
+    rule_ids = [
+        [hit['rule_id'] for hit in engine.evaluate(_event('burst_user', NOON + i * 10))]
+        for i in range(7)
+    ]
+
+    assert rule_ids == [[], [], [], [], ['rapid_reopen'], [], []]
+
+
+def test_app_hopping_counts_distinct_apps_in_window():
+    engine = _engine()
+    engine.evaluate(_event('hop_user', NOON, 'line'))
+    engine.evaluate(_event('hop_user', NOON + 30, 'x'))
+
+    hits = engine.evaluate(_event('hop_user', NOON + 60, 'tiktok'))
+    assert [hit['rule_id'] for hit in hits] == ['app_hopping']
+
+    engine.evaluate(_event('late_user', NOON, 'line'))
+    engine.evaluate(_event('late_user', NOON + 100, 'x'))
+    assert engine.evaluate(_event('late_user', NOON + 300, 'tiktok')) == []
+
+
+def test_other_event_types_and_bad_timestamps_are_ignored():
+    engine = _engine({'quiet_hours': {'start': '00:00', 'end': '23:59'}})
+
+    assert engine.evaluate(_event('ignored_user', NOON, event_type='notification')) == []
+    assert engine.evaluate({**_event('ignored_user', NOON), 'timestamp': '{{current_date}}'}) == []
+
+
+def test_unknown_rule_type_and_abstract_rule():
+    with pytest.raises(ValueError):
+        build_rules([{'id': 'x', 'type': 'nope'}])
+    with pytest.raises(TypeError):
+        Rule({'id': 'x'})
+
+
+def test_webhook_saves_detections(client, storage):
+    for i in range(5):
+        event = {'user_id': 'detected_user', 'app_name': 'line', 'event_type': 'opened',
+                 'timestamp': f'2025-01-20T12:00:{i:02d}Z'}
+        assert client.post('/api/webhook', json=event).status_code == 201
+
+    detections = storage.get_detections('detected_user')
+
+    assert [detection['rule_id'] for detection in detections] == ['rapid_reopen']
+    assert detections[0]['event_id']
@@ -0,0 +1,102 @@
+"""
+Sessions paired from opened/closed events
+"""
+from services.sessions import Sessionizer, session_id
+
+
+def _event(user_id, app_name, event_type, clock):
+    return {'user_id': user_id, 'app_name': app_name, 'event_type': event_type,
+            'timestamp': f'2025-01-20T{clock}.000000+00:00'}
+
+
+def _reasons(sessions):
+    return [(session['app_name'], session['end_reason'], session['duration_seconds']) for session in sessions]
+
+
+def test_open_then_close_makes_one_session(storage):
+    sessionizer = Sessionizer(flush_size=1)
+
+    assert sessionizer.record(storage, _event('session_user', 'line', 'opened', '12:00:00')) == []
+    finished = sessionizer.record(storage, _event('session_user', 'line', 'closed', '12:05:30'))
+
+    assert _reasons(finished) == [('line', 'closed', 330.0)]
+    stored = storage.get_sessions('session_user')
+    assert _reasons(stored) == [('line', 'closed', 330.0)]
+    assert stored[0]['start'] == '2025-01-20T12:00:00.000000+00:00'
+
+
+def test_opening_another_app_supersedes(storage):
+    sessionizer = Sessionizer(flush_size=100)
+
+    sessionizer.record(storage, _event('switch_user', 'line', 'opened', '12:00:00'))
+    finished = sessionizer.record(storage, _event('switch_user', 'x', 'opened', '12:01:00'))
+
+    assert _reasons(finished) == [('line', 'superseded', 60.0)]
+    assert sessionizer.metrics()['open'] == 1
+
+
+def test_long_gaps_time_out_without_an_end(storage):
+    sessionizer = Sessionizer(timeout=600, flush_size=100)
+
+    sessionizer.record(storage, _event('gap_user', 'line', 'opened', '12:00:00'))
+    finished = sessionizer.record(storage, _event('gap_user', 'line', 'closed', '13:00:00'))
+
+    assert finished[0]['end_reason'] == 'timeout'
+    assert finished[0]['end'] is None and finished[0]['duration_seconds'] is None
+
+
+def test_orphan_closes_late_events_and_notifications_are_ignored(storage):
+    sessionizer = Sessionizer(flush_size=100)
+
+    assert sessionizer.record(storage, _event('odd_user', 'line', 'closed', '12:00:00')) == []
+    sessionizer.record(storage, _event('odd_user', 'line', 'opened', '12:10:00'))
+    assert sessionizer.record(storage, _event('odd_user', 'x', 'opened', '12:05:00')) == []
+    assert sessionizer.record(storage, _event('odd_user', 'line', 'notification', '12:11:00')) == []
+    assert sessionizer.record(storage, _event('odd_user', 'x', 'closed', '12:12:00')) == []
+
+    metrics = sessionizer.metrics()
+    assert metrics['orphan_closes'] == 2
+    assert metrics['out_of_order'] == 1
+    assert metrics['open'] == 1
+
+
+def test_sessions_are_buffered_until_flushed(storage):
+    sessionizer = Sessionizer(flush_size=100)
+    sessionizer.record(storage, _event('buffer_user', 'line', 'opened', '12:00:00'))
+    sessionizer.record(storage, _event('buffer_user', 'line', 'closed', '12:01:00'))
+    sessionizer.record(storage, _event('buffer_user', 'x', 'opened', '12:02:00'))
+    assert storage.get_sessions('buffer_user') == []
+
+    sessionizer.flush(close_open=True)
+
+    assert sorted(_reasons(storage.get_sessions('buffer_user'))) == [
+        ('line', 'closed', 60.0), ('x', 'timeout', None)
+    ]
+
+
+def test_rewritten_session_replaces_the_record(storage):
+    start = '2025-01-20T12:00:00.000000+00:00'
+    assert session_id('u', 'line', start) == session_id('u', 'line', start)
+    assert session_id('u', 'line', start) != session_id('u', 'x', start)
+
+    for _ in range(2):
+        sessionizer = Sessionizer(flush_size=1)
+        sessionizer.record(storage, _event('rewrite_user', 'line', 'opened', '12:00:00'))
+        sessionizer.record(storage, _event('rewrite_user', 'line', 'closed', '12:00:10'))
+
+    assert len(storage.get_sessions('rewrite_user')) == 1
+
+
+def test_webhook_pairs_sessions(client):
+    from services.sessions import sessionizer
+
+    for event_type, clock in (('opened', '08:00:00'), ('closed', '08:02:00')):
+        response = client.post('/api/webhook', json={
+            'user_id': 'webhook_session_user', 'app_name': 'tiktok', 'event_type': event_type,
+            'timestamp': f'2025-01-20T{clock}Z'
+        })
+        assert response.status_code == 201
+    sessionizer.flush()
+
+    from database.storage import get_storage
+    assert _reasons(get_storage().get_sessions('webhook_session_user')) == [('tiktok', 'closed', 120.0)]
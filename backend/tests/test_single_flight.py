@@ -0,0 +1,142 @@
+"""
+Single-flight calls and coalesced storage reads
+"""
+import threading
+import time
+
+import pytest
+
+from database.coalescing import CoalescingStorage
+from services.single_flight import SingleFlight
+
+WAITERS = 4
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def _run_concurrently(flight, call, count):
+    """Start count callers of call; the first one blocks until released"""
+    results, errors = [None] * count, [None] * count
+
+    def run(index):
+        try:
+            results[index] = call()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    threads[0].start()
+    _wait_for(lambda: flight.stats['calls'] == 1)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_for(lambda: flight.stats['shared'] == count - 1)
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return {'logs': [1, 2, 3]}
+
+    threads, results, errors = _run_concurrently(flight, lambda: flight.do('key', load), WAITERS)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert errors == [None] * WAITERS
+    assert all(result == {'logs': [1, 2, 3]} for result in results)
+    assert len({id(result) for result in results}) == WAITERS
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def load():
+        release.wait(5)
+        raise RuntimeError('query failed')
+
+    threads, _, errors = _run_concurrently(flight, lambda: flight.do('key', load), WAITERS)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert flight.do('key', lambda: 'retried') == 'retried'
+
+
+def test_results_are_only_reused_with_a_ttl():
+    counter = iter(range(100))
+
+    assert SingleFlight().do('key', lambda: next(counter)) == 0
+    flight = SingleFlight(result_ttl=60)
+    assert flight.do('key', lambda: next(counter)) == 1
+    assert flight.do('key', lambda: next(counter)) == 1
+
+
+class SlowBackend:
+    def __init__(self):
+        self.release = threading.Event()
+        self.reads = 0
+        self.saved = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def get_logs(self, user_id, limit=100):
+        self.reads += 1
+        self.release.wait(5)
+        return [{'user_id': user_id, 'limit': limit}]
+
+    def get_sessions(self, user_id, app_name=None):
+        self.reads += 1
+        return []
+
+    def save_log(self, log_data):
+        self.saved.append(log_data)
+        return 'id'
+
+
+def test_coalescing_storage_shares_identical_reads():
+    backend = SlowBackend()
+    storage = CoalescingStorage(backend)
+
+    threads, results, _ = _run_concurrently(
+        storage.flight, lambda: storage.get_logs('u', limit=10), WAITERS
+    )
+    other = threading.Thread(target=storage.get_logs, args=('v',), kwargs={'limit': 10})
+    other.start()
+    _wait_for(lambda: backend.reads == 2)
+    backend.release.set()
+    for thread in threads + [other]:
+        thread.join()
+
+    assert backend.reads == 2
+    assert results == [[{'user_id': 'u', 'limit': 10}]] * WAITERS
+
+
+def test_coalescing_storage_passes_writes_and_unhashable_reads_through():
+    backend = SlowBackend()
+    storage = CoalescingStorage(backend)
+
+    assert storage.save_log({'user_id': 'u'}) == 'id'
+    assert backend.saved == [{'user_id': 'u'}]
+    assert storage.get_sessions('u', app_name=['line']) == []
+    assert storage.flight.stats['calls'] == 0
+
+
+@pytest.mark.parametrize('name', ['get_logs', 'get_user_settings'])
+def test_storage_reads_are_coalesced(storage, name):
+    assert isinstance(storage, CoalescingStorage)
+    assert getattr(storage, name).__name__ == name
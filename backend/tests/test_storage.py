@@ -0,0 +1,17 @@
+"""
+SQLite storage timestamps
+"""
+from models.event import normalize_timestamp
+
+
+def test_default_timestamps_match_normalized_format(storage):
+    storage.save_log({'user_id': 'default_ts_user', 'app_name': 'line', 'event_type': 'opened'})
+    earlier = normalize_timestamp('2025-01-20T12:00:00Z')
+    storage.save_log({'user_id': 'default_ts_user', 'app_name': 'x', 'event_type': 'opened', 'timestamp': earlier})
+
+    logs = storage.get_logs('default_ts_user', start_date=earlier)
+
+    assert [log['app_name'] for log in logs] == ['line', 'x']
+    assert len(logs[0]['timestamp']) == len(earlier)
+    assert logs[0]['timestamp'].endswith('+00:00')
+    assert logs[0]['created_at'].endswith('+00:00')
@@ -0,0 +1,69 @@
+"""
+Webhook ingest: shortcut payloads and idempotency keys
+"""
+import plistlib
+
+from routes.shortcuts import generate_line_shortcut
+
+
+def _shortcut_payload(user_id):
+    """The JSON body the generated LINE shortcut posts to the webhook"""
+    shortcut = plistlib.loads(generate_line_shortcut(user_id, 'https://example.com/api/webhook'))
+    request_action = next(
+        action for action in shortcut['WFWorkflowActions']
+        if action['WFWorkflowActionIdentifier'] == 'is.workflow.actions.downloadurl'
+    )
+    items = request_action['WFWorkflowActionParameters']['WFJSONValues']['Value']['WFDictionaryFieldValueItems']
+    return {item['WFKey']['Value']['string']: item['WFValue']['Value']['string'] for item in items}
+
+
+def test_shortcut_payload_is_stored(client, storage):
+    payload = _shortcut_payload('shortcut_user')
+    assert payload['timestamp'] == '{{current_date}}'
+
+    response = client.post('/api/webhook', json=payload)
+
+    assert response.status_code == 201, response.get_json()
+    logs = storage.get_logs('shortcut_user')
+    assert [(log['app_name'], log['event_type']) for log in logs] == [('line', 'opened')]
+    assert logs[0]['timestamp'].endswith('+00:00')
+
+
+def test_long_idempotency_key_keeps_batch_events_apart(client, storage):
+    events = [
+        {'user_id': 'long_key_user', 'app_name': 'line', 'event_type': event_type}
+        for event_type in ('opened', 'notification', 'closed')
+    ]
+    headers = {'Idempotency-Key': 'k' * 300}
+
+    response = client.post('/api/webhook/batch', json={'events': events}, headers=headers)
+
+    results = response.get_json()['results']
+    assert response.status_code == 201
+    assert [result['duplicate'] for result in results] == [False, False, False]
+    assert len({result['event_id'] for result in results}) == 3
+    assert len(storage.get_logs('long_key_user')) == 3
+
+    retry = client.post('/api/webhook/batch', json={'events': events}, headers=headers)
+    assert [result['duplicate'] for result in retry.get_json()['results']] == [True, True, True]
+
+
+def test_batch_larger_than_user_burst_is_rejected(client, storage, monkeypatch):
+    from middleware.rate_limit import webhook_limiter
+    monkeypatch.setattr(webhook_limiter, 'enabled', True)
+    burst = int(webhook_limiter.capacity('user'))
+
+    def batch(user_id, size):
+        return {'events': [
+            {'user_id': user_id, 'app_name': 'line', 'event_type': 'notification',
+             'timestamp': f'2025-01-20T12:00:{second:02d}Z'}
+            for second in range(size)
+        ]}
+
+    response = client.post('/api/webhook/batch', json=batch('burst_user', burst + 10))
+    assert response.status_code == 400
+    assert 'per user' in response.get_json()['message']
+    assert storage.get_logs('burst_user') == []
+
+    response = client.post('/api/webhook/batch', json=batch('burst_user', burst))
+    assert response.status_code == 201